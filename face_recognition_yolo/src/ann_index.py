@@ -0,0 +1,112 @@
+import numpy as np
+
+from face_index import EMB_DIM, FaceIndex
+from prototypes import kmeans_prototypes
+
+# -------------------------------------------------
+# APPROXIMATE NEAREST-NEIGHBOUR INDEX (IVF) FOR LARGE ROSTERS
+# -------------------------------------------------
+# Inverted-file index in plain NumPy: the rows are clustered into `nlist`
+# cells with spherical k-means, and a query only scores the rows of its
+# `nprobe` most similar cells. The interface is FaceIndex's, including
+# best / second-best person per query, so MARGIN_THRESHOLD keeps working;
+# second_sim is the best *other person found in the probed cells*, so it
+# can only be lower than the exact value.
+#
+# Small indexes (fewer than `min_rows` rows) are searched exactly.
+#
+#   index = make_face_index("ivf", face_index, nprobe=8)
+#   best_idx, best_sim, second_sim = index.search(query_embs)
+
+TRAIN_POINTS_PER_LIST = 64   # k-means runs on at most nlist * this many rows
+
+
+class IVFFaceIndex(FaceIndex):
+    """FaceIndex whose search() scores only the rows of the nearest cells."""
+
+    def __init__(self, names, embeddings, nlist=None, nprobe=8, min_rows=2048,
+                 kmeans_iters=10, seed=0):
+        """
+        nlist   : number of cells (default ~ sqrt(rows))
+        nprobe  : cells scored per query (more = better recall, slower)
+        min_rows: below this many rows, search exactly
+        """
+        super().__init__(names, embeddings)
+        self.nprobe = nprobe
+        self.min_rows = min_rows
+
+        n = self.num_rows
+        self.nlist = max(1, min(nlist or int(round(np.sqrt(n))), n)) if n else 0
+        if self.exact_only:
+            return
+
+        # train the coarse quantizer on a random sample of rows
+        rng = np.random.default_rng(seed)
+        n_train = min(n, self.nlist * TRAIN_POINTS_PER_LIST)
+        sample = self.embeddings[np.sort(rng.choice(n, n_train, replace=False))]
+        self.centroids = np.ascontiguousarray(
+            kmeans_prototypes(sample, self.nlist, iters=kmeans_iters), dtype=np.float32)
+
+        # inverted lists: row ids sorted by cell, cell c = rows[starts[c]:starts[c + 1]]
+        assign = np.argmax(self.embeddings @ self.centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable")
+        self.list_rows = order
+        self.list_starts = np.searchsorted(assign[order], np.arange(self.nlist + 1))
+        # rows stored cell by cell, so a probed cell is one contiguous slice
+        self.list_embeddings = np.ascontiguousarray(self.embeddings[order])
+        self.list_person = self.row_person[order]
+
+    @property
+    def exact_only(self):
+        return self.num_rows < self.min_rows or self.nlist <= 1
+
+    def search(self, query_embs):
+        """Same contract as FaceIndex.search(), approximate for large indexes."""
+        q = np.asarray(query_embs, dtype=np.float32).reshape(-1, EMB_DIM)
+        if len(self) == 0 or self.exact_only or self.nprobe >= self.nlist:
+            return super().search(q)
+
+        n_queries = len(q)
+        best_idx = np.full(n_queries, -1, dtype=np.int64)
+        best_sim = np.full(n_queries, -1.0, dtype=np.float32)
+        second_sim = np.full(n_queries, -1.0, dtype=np.float32)
+
+        # nprobe most similar cells per query, for the whole batch at once
+        coarse = q @ self.centroids.T
+        probes = np.argpartition(-coarse, self.nprobe - 1, axis=1)[:, :self.nprobe]
+
+        starts = self.list_starts
+        for i in range(n_queries):
+            cells = [slice(starts[c], starts[c + 1]) for c in probes[i]]
+            persons = np.concatenate([self.list_person[c] for c in cells])
+            if len(persons) == 0:
+                continue
+            sims = np.concatenate([self.list_embeddings[c] @ q[i] for c in cells])
+
+            top = int(np.argmax(sims))
+            best_idx[i] = persons[top]
+            best_sim[i] = sims[top]
+            others = sims[persons != persons[top]]
+            if len(others):
+                second_sim[i] = others.max()
+
+        return best_idx, best_sim, second_sim
+
+
+INDEX_TYPES = {
+    "exact": FaceIndex,
+    "ivf": IVFFaceIndex,
+}
+
+
+def make_face_index(kind, index, **params):
+    """
+    Rebuild a FaceIndex (e.g. the cached face database) as index type `kind`
+    ("exact" or "ivf"); `params` go to the index constructor.
+    """
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown face index type '{kind}', expected one of {sorted(INDEX_TYPES)}.")
+    cls = INDEX_TYPES[kind]
+    if type(index) is cls and not params:
+        return index
+    return cls(index.names, index.embeddings, **params)
@@ -1,10 +1,31 @@
+import time
+_T_IMPORT = time.perf_counter()
+
 import os
 import json
+import argparse
+import threading
 from datetime import datetime
+from collections import namedtuple
 
 import cv2
 import numpy as np
-import tensorflow as tf
+
+from face_db_cache import load_or_build_face_db
+from ann_index import make_face_index
+from incremental_index import IncrementalFaceIndexer
+from pipeline import RecognitionPipeline
+from tracker import FaceTracker
+from smoothing import IdentitySmoother
+from detection import FaceDetector, HaarFaceDetector
+from yolo_detector import YOLO_CFG_PATH, YOLO_WEIGHTS_PATH, YoloFaceDetector
+from unknown_logger import UnknownFaceLogger
+from inference_backends import load_embedder
+from preprocessing import preprocess_faces
+from profiling import FrameProfiler
+
+# TensorFlow / the model / the face database are NOT loaded at import time:
+# see the STARTUP section below. `python src/app.py --help` stays instant.
 
 # -------------------------------------------------
 # PATHS (relative to project root)
@@ -21,141 +42,314 @@ os.makedirs(SCREENSHOT_DIR, exist_ok=True)
 
 MODEL_PATH = os.path.join(MODELS_DIR, "face_cnn_mobilenetv2.h5")
 CLASS_INDICES_PATH = os.path.join(MODELS_DIR, "class_indices.json")
+# cached face database (face_db.npy + face_db.json), next to the model
+FACE_DB_CACHE_PREFIX = os.path.join(MODELS_DIR, "face_db")
 
 # -------------------------------------------------
 # SETTINGS
 # -------------------------------------------------
 IMG_SIZE = 160
 
+# Embedding inference: "keras" (the .h5 model), or an exported file from
+# export_embedding_model.py: "tflite" / "onnx" with EMBED_QUANT fp32/float16/int8
+EMBED_BACKEND = "keras"
+KERAS_MODE = "function"       # "function" (traced tf.function), "call" or "predict"
+EMBED_QUANT = "int8"
+EMBED_THREADS = None          # runtime threads for tflite / onnx (None = default)
+EMBED_EXPORT_PATH = os.path.join(
+    MODELS_DIR, f"face_embedding_{EMBED_QUANT}.{'onnx' if EMBED_BACKEND == 'onnx' else 'tflite'}"
+)
+
 # cosine similarity in [0,1]; closer to 1 → more similar
 # STRONGER threshold for unknown handling
 SIM_THRESHOLD = 0.85          # if best similarity < this => Unknown
 MARGIN_THRESHOLD = 0.10       # best_sim - second_best_sim must be at least this
 
-# OpenCV Haar cascade for face detection
+# Prototypes kept per person in the face database (1 = single mean embedding).
+# With k > 1, matching takes the max similarity over a person's prototypes.
+NUM_PROTOTYPES = 1
+PROTOTYPE_METHOD = "kmeans"   # "kmeans" or "fps" (farthest-point sampling)
+
+# Search structure over the face database (see ann_index.py):
+# "exact" = one matrix multiply over every row, "ivf" = approximate inverted
+# file for large rosters (only IVF_NPROBE of ~sqrt(rows) cells are scored)
+FACE_INDEX = "exact"
+IVF_NPROBE = 8
+
+# Face detector: "haar" (OpenCV cascade) or "yolo" (yolo/yolov3-face.cfg via
+# cv2.dnn on CPU; needs the Darknet weights in yolo/, see yolo_detector.py)
+DETECTOR_BACKEND = "haar"
+YOLO_INPUT_SIZE = 416         # multiple of 32: 320 faster, 608 finds smaller faces
+YOLO_CONF_THRESHOLD = 0.5
+YOLO_NMS_THRESHOLD = 0.4
+
+# Detection speed-ups for the live loop (1.0 / 1 = full frame every time)
+DETECTION_SCALE = 1.0         # run the cascade on a frame resized by this factor
+FULL_SCAN_EVERY_N_FRAMES = 10 # with tracking, scan only around tracks in between
+ROI_PADDING = 0.5             # track box grown by this fraction for the ROI scan
+
+# Face tracking: reuse a track's label instead of re-embedding every frame
+TRACK_FACES = True
+REEMBED_EVERY_N_FRAMES = 15   # re-run the CNN on a track at least this often
+REEMBED_IOU = 0.6             # ... or when the box moved/resized this much
+
+# Identity smoothing per track (see smoothing.py): a label changes only when
+# another label wins SMOOTH_MIN_VOTES of the last SMOOTH_WINDOW embeddings,
+# and a track keeps its name down to SIM_THRESHOLD - SIM_HYSTERESIS
+SMOOTH_IDENTITIES = True
+SMOOTH_WINDOW = 5
+SMOOTH_MIN_VOTES = 3
+SIM_HYSTERESIS = 0.05
+SETTLE_EVERY_N_FRAMES = 2             # re-embed new tracks this often until settled
+CONFIDENT_REEMBED_EVERY_N_FRAMES = 45 # ... and tracks whose votes all agree this rarely
+
+# Unknown-face logging: one saved crop per track per window, written off-thread
+UNKNOWN_LOG_WINDOW_SEC = 10.0
+
+# Per-stage latency profiling (see profiling.py): p50 / p95 over the last
+# PROFILE_WINDOW samples of each stage, drawn on the frame and printed
+# every STATS_EVERY_SEC seconds
+PROFILE_WINDOW = 300
+PROFILE_OVERLAY = True
+
+# OpenCV Haar cascade for face detection (created lazily, see get_face_cascade)
 HAAR_PATH = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
-face_cascade = cv2.CascadeClassifier(HAAR_PATH)
+
+# Values that change the stored embeddings. The detector is only recorded
+# when it is not Haar, so caches stay shared with realtime_haar_face_recognition.py.
+FACE_DB_SETTINGS = {"img_size": IMG_SIZE, "color": "rgb"}
+if DETECTOR_BACKEND != "haar":
+    FACE_DB_SETTINGS["detector"] = f"{DETECTOR_BACKEND}{YOLO_INPUT_SIZE}"
 
 # -------------------------------------------------
-# LOAD CNN MODEL + CREATE EMBEDDING MODEL
+# STARTUP: LAZY LOADING + BACKGROUND WARM-UP
 # -------------------------------------------------
-print("[INFO] Loading CNN face recognition model...")
-base_model = tf.keras.models.load_model(MODEL_PATH)
-
-# Find the 128-unit Dense layer to use as embedding output
-embedding_layer = None
-for layer in reversed(base_model.layers):
-    # In Keras 3, Dense has 'units' instead of reliable 'output_shape' here
-    if isinstance(layer, tf.keras.layers.Dense) and getattr(layer, "units", None) == 128:
-        embedding_layer = layer
-        break
-
-if embedding_layer is None:
-    raise RuntimeError(
-        "Could not find a 128-unit Dense layer for embeddings. "
-        "Make sure train_cnn.py uses Dense(128) before the final output layer."
+# Heavy resources are created on first use (thread-safe) and the time each
+# phase took is recorded in STARTUP_TIMES. main() opens the camera first and
+# loads everything in a background thread while showing a "warming up" overlay.
+
+# the face database cache is keyed by the file that actually computes embeddings
+EMBED_MODEL_FILE = MODEL_PATH if EMBED_BACKEND == "keras" else EMBED_EXPORT_PATH
+
+STARTUP_TIMES = {}
+_STARTUP_LOCK = threading.RLock()
+_resources = {}
+_warmup_done = threading.Event()
+_warmup_error = []
+
+
+def _lazy(name, loader):
+    """Create a resource once, recording how long the loader took."""
+    value = _resources.get(name)
+    if value is not None:
+        return value
+
+    with _STARTUP_LOCK:
+        if name not in _resources:
+            start = time.perf_counter()
+            _resources[name] = loader()
+            STARTUP_TIMES[name] = time.perf_counter() - start
+    return _resources[name]
+
+
+def _load_embedder():
+    print(f"[INFO] Loading face embedding model ({EMBED_BACKEND})...")
+    return load_embedder(
+        EMBED_BACKEND,
+        keras_model_path=MODEL_PATH,
+        export_path=EMBED_EXPORT_PATH,
+        num_threads=EMBED_THREADS,
+        keras_mode=KERAS_MODE,
     )
 
-embedding_model = tf.keras.Model(
-    inputs=base_model.input,
-    outputs=embedding_layer.output
-)
 
-# (Optional) load mapping just for reference / debugging
-with open(CLASS_INDICES_PATH, "r") as f:
-    class_indices = json.load(f)
-idx2class = {v: k for k, v in class_indices.items()}
-print("[INFO] Known classes (from training):", idx2class)
+def _load_class_indices():
+    # (Optional) load mapping just for reference / debugging
+    with open(CLASS_INDICES_PATH, "r") as f:
+        class_indices = json.load(f)
+    idx2class = {v: k for k, v in class_indices.items()}
+    print("[INFO] Known classes (from training):", idx2class)
+    return idx2class
+
+
+def _load_face_db():
+    # Loads models/face_db.npy when the model and dataset are unchanged,
+    # otherwise rebuilds from dataset_faces/train and refreshes the cache.
+    index = load_or_build_face_db(
+        build_face_database,
+        EMBED_MODEL_FILE,
+        DATASET_TRAIN_DIR,
+        FACE_DB_CACHE_PREFIX,
+        settings={**FACE_DB_SETTINGS, "prototypes": NUM_PROTOTYPES, "method": PROTOTYPE_METHOD},
+    )
+    if FACE_INDEX == "ivf":
+        return make_face_index("ivf", index, nprobe=IVF_NPROBE)
+    return index
+
+
+def get_face_cascade():
+    return _lazy("cascade", lambda: cv2.CascadeClassifier(HAAR_PATH))
+
+
+def make_detector_backend(kind=DETECTOR_BACKEND):
+    """Detection backend object; the model itself loads on first use / load()."""
+    if kind == "haar":
+        return HaarFaceDetector(get_face_cascade)
+    if kind == "yolo":
+        return YoloFaceDetector(
+            YOLO_CFG_PATH,
+            YOLO_WEIGHTS_PATH,
+            input_size=YOLO_INPUT_SIZE,
+            conf_threshold=YOLO_CONF_THRESHOLD,
+            nms_threshold=YOLO_NMS_THRESHOLD,
+        )
+    raise ValueError(f"Unknown detector backend '{kind}', expected 'haar' or 'yolo'.")
+
+
+# shared by the live loop and the face database builder
+DETECTOR = make_detector_backend()
+
+
+def get_embedder():
+    return _lazy("model", _load_embedder)
+
+
+def get_class_names():
+    return _lazy("class_indices", _load_class_indices)
+
+
+def get_face_db():
+    return _lazy("face_db", _load_face_db)
+
+
+def warm_up():
+    """Load every heavy resource in order (detector, model, classes, face database)."""
+    try:
+        _lazy("detector", DETECTOR.load)
+        get_embedder()
+        get_class_names()
+        get_face_db()
+        # first inference builds kernels / traces the tf.function
+        start = time.perf_counter()
+        get_embeddings([np.zeros((IMG_SIZE, IMG_SIZE, 3), dtype=np.uint8)])
+        STARTUP_TIMES["first_inference"] = time.perf_counter() - start
+    except Exception as exc:  # reported by the main loop
+        _warmup_error.append(exc)
+    finally:
+        _warmup_done.set()
+
+
+def start_warm_up():
+    """Run warm_up() in a daemon thread; poll is_ready() / warm_up_error()."""
+    thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def is_ready():
+    return _warmup_done.is_set() and not _warmup_error
+
+
+def warm_up_error():
+    return _warmup_error[0] if _warmup_error else None
+
+
+def print_startup_report():
+    print("[STARTUP] Phase timings:")
+    for phase, secs in STARTUP_TIMES.items():
+        print(f"[STARTUP]   {phase:<18} {secs * 1000.0:9.1f} ms")
+
+
+STARTUP_TIMES["imports"] = time.perf_counter() - _T_IMPORT
+
+# capture, detect, preprocess, embed, match, draw and log timings
+PROFILER = FrameProfiler(window=PROFILE_WINDOW)
+
 
 # -------------------------------------------------
 # HELPER FUNCTIONS
 # -------------------------------------------------
 def preprocess_face(face_img):
-    """Resize and normalize cropped face for embedding model."""
-    face_resized = cv2.resize(face_img, (IMG_SIZE, IMG_SIZE))
-    face_resized = face_resized.astype("float32") / 255.0
-    face_resized = np.expand_dims(face_resized, axis=0)  # (1, H, W, 3)
-    return face_resized
+    """Resize, BGR -> RGB and normalize one cropped face -> (1, H, W, 3)."""
+    return preprocess_faces([face_img], IMG_SIZE).copy()
 
 
 def get_embedding(face_img):
     """Get 128-d normalized embedding vector for a face."""
-    inp = preprocess_face(face_img)
-    emb = embedding_model.predict(inp, verbose=0)[0]  # (128,)
-    norm = np.linalg.norm(emb) + 1e-10
-    return emb / norm
+    return get_embeddings([face_img])[0]
+
+
+def get_embeddings(face_imgs):
+    """
+    Batched version of get_embedding().
+    Writes all face crops into one reused (N, H, W, 3) batch buffer
+    (see preprocessing.py) and runs the embedding model once.
+    Returns (N, 128) normalized embeddings.
+    """
+    if len(face_imgs) == 0:
+        return np.zeros((0, 128), dtype="float32")
+
+    with PROFILER.stage("preprocess"):
+        batch = preprocess_faces(face_imgs, IMG_SIZE)
+    with PROFILER.stage("embed"):
+        embs = get_embedder().embed(batch)  # (N, 128)
+    norms = np.linalg.norm(embs, axis=1, keepdims=True) + 1e-10
+    return embs / norms
 
 
 def cosine_similarity(a, b):
     return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b) + 1e-10))
 
 
-def log_unknown_face(face_img, best_sim):
-    ts = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-    img_path = os.path.join(LOG_DIR, f"unknown_{ts}.jpg")
-    cv2.imwrite(img_path, face_img)
+# background writer for logs/unknown_faces (see unknown_logger.py)
+UNKNOWN_LOGGER = UnknownFaceLogger(LOG_DIR, dedup_window=UNKNOWN_LOG_WINDOW_SEC)
+
 
-    log_file = os.path.join(LOG_DIR, "unknown_log.txt")
-    with open(log_file, "a") as f:
-        f.write(f"{ts}, best_sim={best_sim:.4f}, file={img_path}\n")
+def log_unknown_face(face_img, best_sim, track_id=None, box=None, source=None):
+    """Queue an unknown face for the background logger (never blocks)."""
+    UNKNOWN_LOGGER.submit(face_img, best_sim, track_id, box, source)
 
 
 # -------------------------------------------------
 # BUILD FACE DATABASE FROM TRAIN IMAGES
 # -------------------------------------------------
+def crop_largest_face(img):
+    """Detect faces in a BGR image and return the largest crop (or None)."""
+    faces = DETECTOR.detect(img)
+
+    if len(faces) == 0:
+        return None
+
+    # Take the largest detected face (if multiple)
+    faces_sorted = sorted(faces, key=lambda b: b[2] * b[3], reverse=True)
+    (x, y, w, h) = faces_sorted[0]
+    return img[y:y + h, x:x + w]
+
+
+# Per-image embeddings live in models/face_db_images.npz/.json, so adding
+# one photo to dataset_faces/train/<person>/ embeds only that photo.
+FACE_DB_INDEXER = IncrementalFaceIndexer(
+    DATASET_TRAIN_DIR,
+    FACE_DB_CACHE_PREFIX + "_images",
+    EMBED_MODEL_FILE,
+    crop_fn=crop_largest_face,
+    embed_fn=get_embeddings,
+    settings=FACE_DB_SETTINGS,
+    num_prototypes=NUM_PROTOTYPES,
+    prototype_method=PROTOTYPE_METHOD,
+)
+
+
 def build_face_database():
     """
     For each person folder in dataset_faces/train,
-    compute average embedding vector from all images.
-    Returns: dict{name: embedding_vector}
+    compute average embedding vector (or NUM_PROTOTYPES prototypes) from all images.
+    Only new or changed images are embedded; unchanged persons keep
+    their stored prototypes (see incremental_index.py).
+    Returns: dict{name: (k, 128) embeddings}
     """
     print("[INFO] Building face database from training images...")
-    face_db = {}
-    exts = (".jpg", ".jpeg", ".png", ".bmp")
-
-    for person_name in sorted(os.listdir(DATASET_TRAIN_DIR)):
-        person_dir = os.path.join(DATASET_TRAIN_DIR, person_name)
-        if not os.path.isdir(person_dir):
-            continue
-
-        embeddings = []
-        for fname in os.listdir(person_dir):
-            if not fname.lower().endswith(exts):
-                continue
-
-            img_path = os.path.join(person_dir, fname)
-            img = cv2.imread(img_path)
-            if img is None:
-                continue
-
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            faces = face_cascade.detectMultiScale(
-                gray,
-                scaleFactor=1.1,
-                minNeighbors=5,
-                minSize=(60, 60),
-            )
-
-            if len(faces) == 0:
-                continue
-
-            # Take the largest detected face (if multiple)
-            faces_sorted = sorted(faces, key=lambda b: b[2] * b[3], reverse=True)
-            (x, y, w, h) = faces_sorted[0]
-            face_color = img[y:y + h, x:x + w]
-
-            emb = get_embedding(face_color)
-            embeddings.append(emb)
-
-        if len(embeddings) == 0:
-            print(f"[WARN] No faces found for person '{person_name}', skipping.")
-            continue
-
-        mean_emb = np.mean(embeddings, axis=0)
-        # normalize mean embedding too
-        mean_emb = mean_emb / (np.linalg.norm(mean_emb) + 1e-10)
-        face_db[person_name] = mean_emb
-        print(f"[INFO] Added '{person_name}' with {len(embeddings)} samples.")
+    face_db = FACE_DB_INDEXER.update()
 
     if not face_db:
         print("[ERROR] Face database is empty! Check your dataset.")
@@ -165,43 +359,16 @@ def build_face_database():
     return face_db
 
 
-FACE_DB = build_face_database()
-
-
 # -------------------------------------------------
 # RECOGNITION USING EMBEDDINGS
 # -------------------------------------------------
-def recognize_face(face_img):
+def decide_label(best_name, best_sim, second_best_sim):
     """
-    Compute embedding for face_img and compare with all persons in FACE_DB.
-    Returns (label, best_sim).
+    Apply the unknown-face rules to a best / second-best match.
     Uses:
       - SIM_THRESHOLD       : minimum similarity to be considered known
       - MARGIN_THRESHOLD    : best_sim must be clearly ahead of second_best_sim
     """
-    if not FACE_DB:
-        return "Unknown", 0.0
-
-    emb = get_embedding(face_img)
-
-    best_name = None
-    best_sim = -1.0
-    second_best_sim = -1.0
-
-    # find best and second best similarity
-    for name, ref_emb in FACE_DB.items():
-        sim = cosine_similarity(emb, ref_emb)
-
-        if sim > best_sim:
-            second_best_sim = best_sim
-            best_sim = sim
-            best_name = name
-        elif sim > second_best_sim:
-            second_best_sim = sim
-
-    # Debug line – keep for tuning, you can comment it later
-    print(f"[DEBUG] best={best_name} {best_sim:.3f}, second={second_best_sim:.3f}")
-
     # Condition 1: absolute similarity must be high enough
     if best_sim < SIM_THRESHOLD:
         return "Unknown", best_sim
@@ -214,71 +381,430 @@ def recognize_face(face_img):
     return best_name, best_sim
 
 
+def find_matches(embs):
+    """
+    Compare a batch of normalized embeddings with all persons in the face database.
+    One matrix multiply + partial top-2 selection for the whole batch.
+    Returns a list of (best_name, best_sim, second_best_sim), before the unknown rules.
+    """
+    with PROFILER.stage("match"):
+        return get_face_db().match(embs)
+
+
+def match_embeddings(embs):
+    """find_matches() + decide_label(): a list of (label, best_sim)."""
+    return [decide_label(*m) for m in find_matches(embs)]
+
+
+def recognize_face(face_img):
+    """
+    Compute embedding for face_img and compare with all persons in the face database.
+    Returns (label, best_sim).
+    """
+    if len(get_face_db()) == 0:
+        return "Unknown", 0.0
+
+    emb = get_embedding(face_img)
+    return match_embeddings(emb[np.newaxis])[0]
+
+
+def match_faces(face_imgs):
+    """
+    Embed a list of face crops with one model call and match them.
+    Returns (best_name, best_sim, second_best_sim) per face; best_name is
+    None when the face database is empty.
+    """
+    if len(get_face_db()) == 0:
+        return [(None, 0.0, -1.0) for _ in face_imgs]
+
+    return find_matches(get_embeddings(face_imgs))
+
+
+def recognize_faces(face_imgs):
+    """
+    Batched version of recognize_face() for all faces of one frame.
+    Runs the embedding model once for the whole list.
+    Returns a list of (label, best_sim), one per face.
+    """
+    return [decide_label(*m) for m in match_faces(face_imgs)]
+
+
 # -------------------------------------------------
-# MAIN LOOP
+# PER-FRAME PROCESSING
 # -------------------------------------------------
-def main():
-    cap = cv2.VideoCapture(0)
+# one entry per detected face; track_id is None when tracking is off
+FaceResult = namedtuple("FaceResult", ["box", "label", "sim", "crop", "track_id"])
+
+IDENTITY_SMOOTHER = IdentitySmoother(
+    SIM_THRESHOLD,
+    MARGIN_THRESHOLD,
+    window=SMOOTH_WINDOW,
+    min_votes=SMOOTH_MIN_VOTES,
+    hysteresis=SIM_HYSTERESIS,
+) if SMOOTH_IDENTITIES else None
+
+
+def make_tracker():
+    """A FaceTracker with this file's re-embedding settings (one per video source)."""
+    if IDENTITY_SMOOTHER is None:
+        return FaceTracker(reembed_every=REEMBED_EVERY_N_FRAMES, reembed_iou=REEMBED_IOU)
+    return FaceTracker(
+        reembed_every=REEMBED_EVERY_N_FRAMES,
+        reembed_iou=REEMBED_IOU,
+        settle_every=SETTLE_EVERY_N_FRAMES,
+        confident_every=CONFIDENT_REEMBED_EVERY_N_FRAMES,
+    )
 
-    if not cap.isOpened():
-        print("[ERROR] Cannot open webcam.")
+
+FACE_TRACKER = make_tracker()
+
+
+def make_detector():
+    """A FaceDetector (ROI / full-scan state) over the shared backend, one per video source."""
+    return FaceDetector(
+        DETECTOR,
+        scale=DETECTION_SCALE,
+        full_scan_every=FULL_SCAN_EVERY_N_FRAMES,
+        roi_padding=ROI_PADDING,
+    )
+
+
+FACE_DETECTOR = make_detector()
+
+
+# detection + tracking half of process_frame(); `todo` indexes the crops
+# that need an embedding (all of them when tracking is off)
+FramePlan = namedtuple("FramePlan", ["boxes", "crops", "tracked", "todo"])
+
+
+def plan_frame(frame, tracker=None, detector=FACE_DETECTOR):
+    """
+    Detect faces in a BGR frame and decide which crops must be embedded.
+    With a tracker, only new tracks and tracks due for a refresh are
+    embedded, and detection scans only around existing tracks between
+    full-frame scans. Returns a FramePlan.
+    """
+    track_boxes = [t.box for t in tracker.tracks] if tracker is not None else None
+    with PROFILER.stage("detect"):
+        faces = detector.detect(frame, track_boxes)
+
+    boxes = []
+    crops = []
+    for (x, y, w, h) in faces:
+        x1, y1 = x, y
+        x2, y2 = x + w, y + h
+
+        face_color = frame[y1:y2, x1:x2]
+        if face_color.size == 0:
+            continue
+
+        boxes.append((x1, y1, x2, y2))
+        crops.append(face_color)
+
+    if tracker is None:
+        return FramePlan(boxes, crops, None, list(range(len(crops))))
+
+    tracked = tracker.update(boxes)
+    if any(t.missed for t in tracker.tracks):
+        # a ROI box may belong to another face: find the lost one before its track expires
+        detector.request_full_scan()
+    todo = [i for i, (_, needs_embedding) in enumerate(tracked) if needs_embedding]
+    return FramePlan(boxes, crops, tracked, todo)
+
+
+def finish_frame(plan, matches, tracker=None, smoother=IDENTITY_SMOOTHER):
+    """
+    Combine a FramePlan with the match_faces() output of its `todo` crops.
+    With a tracker and a smoother, each match is a vote for its track's
+    label instead of the label itself.
+    Returns a list of FaceResult.
+    """
+    if tracker is None:
+        return [FaceResult(box, *decide_label(*m), crop, None)
+                for box, crop, m in zip(plan.boxes, plan.crops, matches)]
+
+    for i, m in zip(plan.todo, matches):
+        track = plan.tracked[i][0]
+        if smoother is not None:
+            label, sim = smoother.update(track, *m)
+        else:
+            label, sim = decide_label(*m)
+        tracker.set_result(track, label, sim)
+
+    return [FaceResult(box, track.label, track.sim, crop, track.id)
+            for box, crop, (track, _) in zip(plan.boxes, plan.crops, plan.tracked)]
+
+
+def process_frame(frame, tracker=None, detector=FACE_DETECTOR):
+    """
+    Detect and recognize every face in a BGR frame: plan_frame(), one
+    batched match_faces() call for the crops that need it, finish_frame().
+    Returns a list of FaceResult.
+    """
+    plan = plan_frame(frame, tracker, detector)
+    matches = match_faces([plan.crops[i] for i in plan.todo])
+    return finish_frame(plan, matches, tracker)
+
+
+def log_unknown_faces(results, source=None):
+    """source: camera the results belong to (track ids are per camera)."""
+    with PROFILER.stage("log"):
+        for res in results:
+            if res.label == "Unknown":
+                log_unknown_face(res.crop, res.sim, res.track_id, res.box, source)
+
+
+def draw_results(frame, results):
+    with PROFILER.stage("draw"):
+        _draw_results(frame, results)
+
+
+def _draw_results(frame, results):
+    for (x1, y1, x2, y2), label, sim, _, _ in results:
+        color = (0, 255, 0) if label != "Unknown" else (0, 0, 255)
+
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+        text = f"{label} ({sim:.2f})"
+        cv2.putText(
+            frame,
+            text,
+            (x1, max(0, y1 - 10)),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            0.6,
+            color,
+            2,
+        )
+
+
+def draw_profile(frame, top=20):
+    """FPS + per-stage p50 / p95 in the top-left corner."""
+    for i, line in enumerate(PROFILER.format_lines()):
+        cv2.putText(
+            frame,
+            line,
+            (10, top + 16 * i),
+            cv2.FONT_HERSHEY_PLAIN,
+            1.0,
+            (255, 255, 0),
+            1,
+        )
+
+
+def report_profile(state, metrics_file=None, force=False):
+    """Every STATS_EVERY_SEC: print [PROFILE] lines and append to the metrics file."""
+    now = time.perf_counter()
+    if not force and now - state.get("last_profile", now) < STATS_EVERY_SEC:
+        state.setdefault("last_profile", now)
         return
+    state["last_profile"] = now
+
+    for line in PROFILER.format_lines():
+        print(f"[PROFILE] {line}")
+    if metrics_file:
+        PROFILER.dump(metrics_file)
+
+
+def draw_warming_up(frame):
+    cv2.putText(
+        frame,
+        "Warming up... (loading model and face database)",
+        (10, frame.shape[0] - 15),
+        cv2.FONT_HERSHEY_SIMPLEX,
+        0.6,
+        (0, 255, 255),
+        2,
+    )
+
+
+def check_warm_up(state):
+    """
+    Track the background warm-up from the display loop.
+    Prints the startup report once; returns False if warm-up failed.
+    """
+    if state.get("reported") or not _warmup_done.is_set():
+        return True
+    state["reported"] = True
+
+    error = warm_up_error()
+    if error is not None:
+        print(f"[ERROR] Startup failed: {error}")
+        return False
+
+    STARTUP_TIMES["ready_after_start"] = time.perf_counter() - _T_IMPORT
+    print_startup_report()
+    return True
+
+
+def show_frame(frame):
+    """imshow + record when the first window appeared."""
+    cv2.imshow(WINDOW_NAME, frame)
+    if "first_window" not in STARTUP_TIMES:
+        STARTUP_TIMES["first_window"] = time.perf_counter() - _T_IMPORT
 
-    print("[INFO] Press 'q' to quit, 's' to save screenshot.")
-    print(f"[INFO] Similarity threshold for known faces: {SIM_THRESHOLD}")
-    print(f"[INFO] Margin threshold between best and second: {MARGIN_THRESHOLD}")
 
+def handle_key(key, frame):
+    """Returns True when the user asked to quit."""
+    if key == ord("q"):
+        return True
+    elif key == ord("s"):
+        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(SCREENSHOT_DIR, f"screenshot_{ts}.jpg")
+        cv2.imwrite(path, frame)
+        print("[INFO] Screenshot saved:", path)
+    return False
+
+
+# -------------------------------------------------
+# MAIN LOOP
+# -------------------------------------------------
+WINDOW_NAME = "Real-Time Face Recognition (Embedding + NN)"
+STATS_EVERY_SEC = 5.0
+
+
+def run_sequential(cap, tracker=None, metrics_file=None, overlay=PROFILE_OVERLAY):
+    """Capture, recognize and display one frame after another on one thread."""
+    warm_state = {}
     while True:
-        ret, frame = cap.read()
+        with PROFILER.stage("capture"):
+            ret, frame = cap.read()
         if not ret:
             break
 
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if not check_warm_up(warm_state):
+            break
 
-        faces = face_cascade.detectMultiScale(
-            gray,
-            scaleFactor=1.1,
-            minNeighbors=5,
-            minSize=(60, 60),
-        )
+        if is_ready():
+            results = process_frame(frame, tracker)
+            draw_results(frame, results)
+            log_unknown_faces(results)
+            PROFILER.frame_done()
+            if overlay:
+                draw_profile(frame)
+            report_profile(warm_state, metrics_file)
+        else:
+            draw_warming_up(frame)
+
+        show_frame(frame)
+        key = cv2.waitKey(1) & 0xFF
+        if handle_key(key, frame):
+            break
 
-        for (x, y, w, h) in faces:
-            x1, y1 = x, y
-            x2, y2 = x + w, y + h
 
-            face_color = frame[y1:y2, x1:x2]
-            if face_color.size == 0:
+def run_pipelined(cap, tracker=None, metrics_file=None, overlay=PROFILE_OVERLAY):
+    """
+    Capture thread -> inference worker -> display on the main thread.
+    Display runs at camera rate with the newest available recognition
+    results; recognition runs as fast as the model allows.
+    """
+    def infer(frame):
+        if not is_ready():
+            return []
+        results = process_frame(frame, tracker)
+        log_unknown_faces(results)
+        PROFILER.frame_done()
+        return results
+
+    pipe = RecognitionPipeline(cap, infer, profiler=PROFILER)
+    pipe.start()
+    last_report = time.perf_counter()
+    warm_state = {}
+
+    try:
+        while pipe.running():
+            if not check_warm_up(warm_state):
+                break
+
+            frame, results = pipe.next_display(timeout=0.5)
+            if frame is None:
                 continue
 
-            label, sim = recognize_face(face_color)
+            # the inference worker may still be reading this frame
+            view = frame.copy()
+            draw_results(view, results)
+            if not is_ready():
+                draw_warming_up(view)
 
-            color = (0, 255, 0) if label != "Unknown" else (0, 0, 255)
-
-            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-            text = f"{label} ({sim:.2f})"
+            stats = pipe.stats()
             cv2.putText(
-                frame,
-                text,
-                (x1, max(0, y1 - 10)),
+                view,
+                f"cap {stats['capture_fps']:.1f} | rec {stats['inference_fps']:.1f}"
+                f" | disp {stats['display_fps']:.1f} fps",
+                (10, 20),
                 cv2.FONT_HERSHEY_SIMPLEX,
-                0.6,
-                color,
-                2,
+                0.5,
+                (255, 255, 0),
+                1,
             )
+            if overlay and is_ready():
+                draw_profile(view, top=40)
+
+            show_frame(view)
+            pipe.display_counter.tick()
+            key = cv2.waitKey(1) & 0xFF
+            if handle_key(key, view):
+                break
+
+            now = time.perf_counter()
+            if now - last_report >= STATS_EVERY_SEC:
+                last_report = now
+                print("[STATS] capture {capture_fps:.1f} fps, recognition {inference_fps:.1f} fps, "
+                      "display {display_fps:.1f} fps, dropped display={dropped_display} "
+                      "recognition={dropped_inference}".format(**stats))
+                if is_ready():
+                    report_profile(warm_state, metrics_file, force=True)
+    finally:
+        pipe.stop()
 
-            if label == "Unknown":
-                log_unknown_face(face_color, sim)
 
-        cv2.imshow("Real-Time Face Recognition (Embedding + NN)", frame)
-        key = cv2.waitKey(1) & 0xFF
+def main():
+    parser = argparse.ArgumentParser(description="Real-time face recognition (embedding + NN).")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="run capture, recognition and display on separate threads")
+    parser.add_argument("--no-tracking", action="store_true",
+                        help="re-embed every face on every frame")
+    parser.add_argument("--detect-scale", type=float, default=DETECTION_SCALE,
+                        help="resize factor for face detection, e.g. 0.5 for 1080p cameras")
+    parser.add_argument("--metrics-file", default=None,
+                        help="append per-stage p50/p95 + FPS as JSON lines every few seconds")
+    parser.add_argument("--no-overlay", action="store_true",
+                        help="do not draw the FPS / latency overlay")
+    args = parser.parse_args()
+
+    FACE_DETECTOR.scale = args.detect_scale
+
+    tracker = FACE_TRACKER if (TRACK_FACES and not args.no_tracking) else None
+
+    # open the camera first, load the model / face database behind it
+    start = time.perf_counter()
+    cap = cv2.VideoCapture(0)
+    STARTUP_TIMES["camera_open"] = time.perf_counter() - start
 
-        if key == ord("q"):
-            break
-        elif key == ord("s"):
-            ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-            path = os.path.join(SCREENSHOT_DIR, f"screenshot_{ts}.jpg")
-            cv2.imwrite(path, frame)
-            print("[INFO] Screenshot saved:", path)
+    if not cap.isOpened():
+        print("[ERROR] Cannot open webcam.")
+        return
+
+    start_warm_up()
+
+    print("[INFO] Press 'q' to quit, 's' to save screenshot.")
+    print(f"[INFO] Similarity threshold for known faces: {SIM_THRESHOLD}")
+    print(f"[INFO] Margin threshold between best and second: {MARGIN_THRESHOLD}")
+
+    overlay = PROFILE_OVERLAY and not args.no_overlay
+    if args.pipeline:
+        run_pipelined(cap, tracker, args.metrics_file, overlay)
+    else:
+        run_sequential(cap, tracker, args.metrics_file, overlay)
+
+    if PROFILER.summary()["stages"]:
+        report_profile({}, args.metrics_file, force=True)
+
+    UNKNOWN_LOGGER.close()
+    print(f"[INFO] Unknown faces logged: {UNKNOWN_LOGGER.written} "
+          f"(deduplicated {UNKNOWN_LOGGER.deduplicated}, dropped {UNKNOWN_LOGGER.dropped}).")
+
+    if tracker is not None:
+        print(f"[INFO] Tracking: {tracker.num_embeddings} CNN calls for "
+              f"{tracker.num_detections} detected faces ({tracker.embed_ratio():.1%}).")
 
     cap.release()
     cv2.destroyAllWindows()
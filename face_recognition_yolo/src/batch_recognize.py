@@ -0,0 +1,235 @@
+import os
+import csv
+import sys
+import glob
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# -------------------------------------------------
+# HEADLESS BATCH RECOGNITION OVER VIDEOS / IMAGE FOLDERS
+# -------------------------------------------------
+# Runs detection + recognition without a camera or GUI window and writes
+# per-frame results as JSONL (one line per frame) or CSV (one row per face).
+# Files are spread over a process pool; each worker imports app.py (and
+# therefore loads the Keras model and face database) exactly once. The face
+# database cache is built once, in a helper process, before the pool starts,
+# so the workers only load a fresh cache instead of all re-embedding the
+# training set at the same time.
+#
+#   python src/batch_recognize.py footage/*.mp4 snapshots/ -o results.jsonl
+#   python src/batch_recognize.py "cams/**/*.avi" --format csv -o results.csv --every 5
+
+VIDEO_EXTS = (".mp4", ".avi", ".mov", ".mkv", ".m4v", ".wmv")
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp")
+IMAGES_PER_TASK = 64
+
+CSV_FIELDS = ["source", "frame", "time_sec", "x1", "y1", "x2", "y2", "label", "sim"]
+
+_app = None  # app module, imported once per worker process
+
+
+def _init_worker():
+    global _app
+    # app prints [INFO] lines; keep stdout for the results (-o -)
+    sys.stdout = sys.stderr
+    import app
+    _app = app
+
+
+def _prepare_face_db():
+    """Build or refresh the on-disk face database; returns the number of persons."""
+    return len(_app.get_face_db())
+
+
+def prepare_face_db():
+    """
+    Run _prepare_face_db() in a separate one-off process, so this process
+    never imports TensorFlow (forked pool workers would inherit its state).
+    """
+    with ProcessPoolExecutor(max_workers=1, initializer=_init_worker) as pool:
+        return pool.submit(_prepare_face_db).result()
+
+
+def expand_inputs(inputs):
+    """
+    Turn files, directories and glob patterns into tasks:
+    ("video", path) per video, ("images", [paths]) per chunk of images.
+    """
+    videos = []
+    images = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths = sorted(os.path.join(item, f) for f in os.listdir(item))
+        elif os.path.isfile(item):
+            paths = [item]
+        else:
+            paths = sorted(glob.glob(item, recursive=True))
+            if not paths:
+                print(f"[WARN] No files match '{item}', skipping.", file=sys.stderr)
+
+        for path in paths:
+            ext = os.path.splitext(path)[1].lower()
+            if ext in VIDEO_EXTS:
+                videos.append(path)
+            elif ext in IMAGE_EXTS:
+                images.append(path)
+
+    tasks = [("video", v) for v in videos]
+    for start in range(0, len(images), IMAGES_PER_TASK):
+        tasks.append(("images", images[start:start + IMAGES_PER_TASK]))
+    return tasks
+
+
+def describe_task(task):
+    kind, payload = task
+    if kind == "video":
+        return payload
+    return f"{len(payload)} images from {os.path.dirname(payload[0]) or '.'}"
+
+
+def _frame_record(source, frame_idx, time_sec, results):
+    return {
+        "source": source,
+        "frame": frame_idx,
+        "time_sec": time_sec,
+        "faces": [
+            {"box": [int(v) for v in r.box], "label": r.label, "sim": round(float(r.sim), 4)}
+            for r in results
+        ],
+    }
+
+
+def run_task(task, every=1, track=True):
+    """Worker entry point: returns (task description, frame records, error or None)."""
+    kind, payload = task
+    records = []
+
+    if kind == "video":
+        cap = _app.cv2.VideoCapture(payload)
+        if not cap.isOpened():
+            return payload, records, f"cannot open video {payload}"
+
+        fps = cap.get(_app.cv2.CAP_PROP_FPS) or 0.0
+        tracker = _app.make_tracker() if track else None
+        detector = _app.make_detector()
+
+        frame_idx = -1
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frame_idx += 1
+            if frame_idx % every != 0:
+                continue
+            results = _app.process_frame(frame, tracker, detector)
+            time_sec = round(frame_idx / fps, 3) if fps > 0 else None
+            records.append(_frame_record(payload, frame_idx, time_sec, results))
+        cap.release()
+        return payload, records, None
+
+    for path in payload:
+        frame = _app.cv2.imread(path)
+        if frame is None:
+            continue
+        results = _app.process_frame(frame)
+        records.append(_frame_record(path, 0, None, results))
+    return describe_task(task), records, None
+
+
+class ResultWriter:
+    def __init__(self, path, fmt):
+        self.fmt = fmt
+        self.f = open(path, "w", newline="") if path != "-" else sys.stdout
+        self.csv = None
+        if fmt == "csv":
+            self.csv = csv.DictWriter(self.f, fieldnames=CSV_FIELDS)
+            self.csv.writeheader()
+
+    def write(self, records):
+        for rec in records:
+            if self.fmt == "jsonl":
+                self.f.write(json.dumps(rec) + "\n")
+                continue
+            for face in rec["faces"]:
+                x1, y1, x2, y2 = face["box"]
+                self.csv.writerow({
+                    "source": rec["source"], "frame": rec["frame"], "time_sec": rec["time_sec"],
+                    "x1": x1, "y1": y1, "x2": x2, "y2": y2,
+                    "label": face["label"], "sim": face["sim"],
+                })
+        self.f.flush()
+
+    def close(self):
+        if self.f is not sys.stdout:
+            self.f.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless face recognition over videos and image folders.")
+    parser.add_argument("inputs", nargs="+", help="video files, image directories or glob patterns")
+    parser.add_argument("-o", "--output", default="batch_results.jsonl",
+                        help="output file, '-' for stdout (default: batch_results.jsonl)")
+    parser.add_argument("--format", choices=("jsonl", "csv"), default=None,
+                        help="output format (default: from the output extension, else jsonl)")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="worker processes, each loads the model once")
+    parser.add_argument("--every", type=int, default=1, help="process every N-th video frame")
+    parser.add_argument("--no-tracking", action="store_true",
+                        help="re-embed every face on every processed video frame")
+    args = parser.parse_args()
+
+    fmt = args.format or ("csv" if args.output.lower().endswith(".csv") else "jsonl")
+    tasks = expand_inputs(args.inputs)
+    if not tasks:
+        print("[ERROR] No videos or images found.", file=sys.stderr)
+        return
+
+    print(f"[INFO] {len(tasks)} tasks on {args.workers} workers -> {args.output} ({fmt})",
+          file=sys.stderr)
+
+    start = time.perf_counter()
+    try:
+        n_persons = prepare_face_db()
+    except Exception as e:
+        print(f"[ERROR] Could not load the model / face database: {e}", file=sys.stderr)
+        return
+    print(f"[INFO] Face database ready ({n_persons} persons, {time.perf_counter() - start:.1f}s)",
+          file=sys.stderr)
+
+    writer = ResultWriter(args.output, fmt)
+    start = time.perf_counter()
+    n_frames = 0
+    n_failed = 0
+
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker) as pool:
+            futures = {pool.submit(run_task, task, max(args.every, 1), not args.no_tracking): task
+                       for task in tasks}
+            for fut in as_completed(futures):
+                try:
+                    name, records, error = fut.result()
+                except Exception as e:
+                    # one bad file (or a crashed worker) must not abort the whole run
+                    n_failed += 1
+                    print(f"[WARN] {describe_task(futures[fut])} failed: {e!r}", file=sys.stderr)
+                    continue
+                if error:
+                    print(f"[WARN] {error}", file=sys.stderr)
+                    continue
+                writer.write(records)
+                n_frames += len(records)
+                print(f"[INFO] {name}: {len(records)} frames", file=sys.stderr)
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"[INFO] Done: {n_frames} frames in {elapsed:.1f}s "
+          f"({n_frames / max(elapsed, 1e-9):.1f} frames/s).", file=sys.stderr)
+    if n_failed:
+        print(f"[WARN] {n_failed} of {len(tasks)} tasks failed.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import time
+import argparse
+
+import numpy as np
+
+from ann_index import IVFFaceIndex
+from face_index import EMB_DIM, FaceIndex
+
+# -------------------------------------------------
+# BENCHMARK: IVF INDEX vs EXACT SEARCH
+# -------------------------------------------------
+# Synthetic rosters of N identities (k prototypes each, clustered like real
+# face embeddings rather than uniformly random) and queries that are noisy
+# copies of enrolled identities. For every N and nprobe it reports
+#   - build time and ms per query (batch of --batch queries) for both indexes
+#   - recall@1: IVF best person == exact best person
+#   - second-best error: mean |IVF second_sim - exact second_sim|
+#   - decision agreement: same known / Unknown decision with app.py's
+#     SIM_THRESHOLD and MARGIN_THRESHOLD
+#
+#   python src/bench_ann_index.py --sizes 1000 10000 50000 --nprobe 4 8 16
+
+SIM_THRESHOLD = 0.85      # keep in sync with app.py
+MARGIN_THRESHOLD = 0.10
+
+
+def _normalize(x):
+    return (x / (np.linalg.norm(x, axis=1, keepdims=True) + 1e-10)).astype(np.float32)
+
+
+def synthetic_roster(n_persons, k=1, n_groups=64, spread=1.0, proto_noise=0.3, seed=0):
+    """(names, (n_persons * k, 128) embeddings, (n_persons, 128) identity centres)."""
+    rng = np.random.default_rng(seed)
+    groups = _normalize(rng.normal(size=(n_groups, EMB_DIM)))
+    centres = _normalize(groups[rng.integers(0, n_groups, n_persons)]
+                         + spread * _normalize(rng.normal(size=(n_persons, EMB_DIM))))
+
+    protos = np.repeat(centres, k, axis=0)
+    protos = _normalize(protos + proto_noise * _normalize(rng.normal(size=protos.shape)))
+    names = np.repeat(np.array([f"person{i:06d}" for i in range(n_persons)], dtype=object), k)
+    return names, protos, centres
+
+
+def synthetic_queries(centres, n_queries, noise=0.5, seed=1):
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(centres), n_queries)
+    return _normalize(centres[picks] + noise * _normalize(rng.normal(size=(n_queries, EMB_DIM))))
+
+
+def decide(best_sim, second_sim):
+    known = best_sim >= SIM_THRESHOLD
+    return known & ~((second_sim > 0) & (best_sim - second_sim < MARGIN_THRESHOLD))
+
+
+def time_search(index, queries, batch, repeats=3):
+    """Mean ms per query over all queries, searched `batch` at a time."""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for i in range(0, len(queries), batch):
+            index.search(queries[i:i + batch])
+        best = min(best, time.perf_counter() - start)
+    return best / len(queries) * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall and latency of the IVF face index vs exact search.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000],
+                        help="number of enrolled persons")
+    parser.add_argument("--k", type=int, default=1, help="prototypes per person")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16, 32])
+    parser.add_argument("--nlist", type=int, default=None, help="IVF cells (default ~sqrt(rows))")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--batch", type=int, default=4, help="queries per search() call (faces per frame)")
+    args = parser.parse_args()
+
+    print(f"{'persons':>8} {'index':<12} {'build s':>8} {'ms/query':>9} {'recall@1':>9} "
+          f"{'2nd err':>8} {'decision':>9}")
+    for n in args.sizes:
+        names, embs, centres = synthetic_roster(n, args.k)
+        queries = synthetic_queries(centres, args.queries)
+
+        start = time.perf_counter()
+        exact = FaceIndex(names, embs)
+        exact_build = time.perf_counter() - start
+        e_idx, e_best, e_second = exact.search(queries)
+        e_decision = decide(e_best, e_second)
+        exact_ms = time_search(exact, queries, args.batch)
+        print(f"{n:>8} {'exact':<12} {exact_build:>8.2f} {exact_ms:>9.3f} {1.0:>9.3f} "
+              f"{0.0:>8.4f} {1.0:>9.3f}")
+
+        start = time.perf_counter()
+        ivf = IVFFaceIndex(names, embs, nlist=args.nlist, min_rows=0)
+        ivf_build = time.perf_counter() - start
+
+        for nprobe in args.nprobe:
+            if nprobe >= ivf.nlist:
+                continue
+            ivf.nprobe = nprobe
+            a_idx, a_best, a_second = ivf.search(queries)
+            recall = float(np.mean(a_idx == e_idx))
+            second_err = float(np.mean(np.abs(a_second - e_second)))
+            agreement = float(np.mean(decide(a_best, a_second) == e_decision))
+            ivf_ms = time_search(ivf, queries, args.batch)
+            label = f"ivf {nprobe}/{ivf.nlist}"
+            print(f"{n:>8} {label:<12} {ivf_build:>8.2f} {ivf_ms:>9.3f} {recall:>9.3f} "
+                  f"{second_err:>8.4f} {agreement:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
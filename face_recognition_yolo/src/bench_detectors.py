@@ -0,0 +1,103 @@
+import os
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+from detection import HaarFaceDetector
+from yolo_detector import YOLO_CFG_PATH, YOLO_WEIGHTS_PATH, YoloFaceDetector
+
+# -------------------------------------------------
+# BENCHMARK: HAAR vs YOLO FACE DETECTION
+# -------------------------------------------------
+# Every image in dataset_faces/<split>/<person>/ shows exactly one face, so
+# recall = fraction of images with at least one detection. Images can be
+# pasted onto a larger canvas (--canvas 640) to look more like a camera
+# frame. For YOLO every --sizes input size is measured, at batch 1 and at
+# --batch images per blobFromImages call.
+#
+#   python src/bench_detectors.py --split val --sizes 320 416 608 --batch 8
+
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))  # face_recognition_yolo/
+DATASET_DIR = os.path.join(BASE_DIR, "dataset_faces")
+HAAR_PATH = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+
+
+def load_images(split, canvas=None, limit=None):
+    images = []
+    split_dir = os.path.join(DATASET_DIR, split)
+    for person in sorted(os.listdir(split_dir)):
+        person_dir = os.path.join(split_dir, person)
+        if not os.path.isdir(person_dir):
+            continue
+        for fname in sorted(os.listdir(person_dir)):
+            img = cv2.imread(os.path.join(person_dir, fname))
+            if img is None:
+                continue
+            images.append(paste_on_canvas(img, canvas) if canvas else img)
+            if limit and len(images) >= limit:
+                return images
+    return images
+
+
+def paste_on_canvas(img, size):
+    """Centre `img` (shrunk to half the canvas if needed) on a grey size x size frame."""
+    h, w = img.shape[:2]
+    f = min(1.0, (size / 2) / max(h, w))
+    if f < 1.0:
+        img = cv2.resize(img, (int(w * f), int(h * f)), interpolation=cv2.INTER_AREA)
+        h, w = img.shape[:2]
+    frame = np.full((size, size, 3), 127, dtype=np.uint8)
+    y, x = (size - h) // 2, (size - w) // 2
+    frame[y:y + h, x:x + w] = img
+    return frame
+
+
+def run(detector, images, batch):
+    """Returns (images per second, recall)."""
+    detector.detect_batch(images[:batch])  # warm-up / lazy load
+    found = 0
+    start = time.perf_counter()
+    for i in range(0, len(images), batch):
+        for faces in detector.detect_batch(images[i:i + batch]):
+            found += len(faces) > 0
+    elapsed = time.perf_counter() - start
+    return len(images) / elapsed, found / max(len(images), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detection FPS and recall of the Haar and YOLO backends.")
+    parser.add_argument("--split", default="val", choices=("train", "val"))
+    parser.add_argument("--sizes", type=int, nargs="+", default=[320, 416, 608], help="YOLO input sizes")
+    parser.add_argument("--batch", type=int, default=8, help="images per YOLO forward pass")
+    parser.add_argument("--canvas", type=int, default=None,
+                        help="paste every image onto a square canvas of this size")
+    parser.add_argument("--limit", type=int, default=None, help="use at most this many images")
+    parser.add_argument("--weights", default=YOLO_WEIGHTS_PATH)
+    args = parser.parse_args()
+
+    images = load_images(args.split, args.canvas, args.limit)
+    if not images:
+        print(f"[ERROR] No images in {os.path.join(DATASET_DIR, args.split)}.")
+        return
+    print(f"[INFO] {len(images)} images from dataset_faces/{args.split}"
+          + (f" on a {args.canvas}px canvas" if args.canvas else ""))
+
+    print(f"\n{'detector':<14} {'batch':>5} {'img/s':>8} {'recall':>7}")
+    fps, recall = run(HaarFaceDetector(cv2.CascadeClassifier(HAAR_PATH)), images, 1)
+    print(f"{'haar':<14} {1:>5} {fps:>8.1f} {recall:>7.3f}")
+
+    if not os.path.exists(args.weights):
+        print(f"\n[WARN] YOLO weights not found at {args.weights}, skipping YOLO.")
+        return
+
+    for size in args.sizes:
+        yolo = YoloFaceDetector(YOLO_CFG_PATH, args.weights, input_size=size)
+        for batch in sorted({1, args.batch}):
+            fps, recall = run(yolo, images, batch)
+            print(f"{f'yolo {size}':<14} {batch:>5} {fps:>8.1f} {recall:>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import os
+import time
+import argparse
+
+import numpy as np
+
+from inference_backends import KERAS_MODES, KerasEmbedder, build_embedding_model
+
+# -------------------------------------------------
+# MICRO-BENCHMARK: KERAS predict() vs DIRECT CALL vs tf.function
+# -------------------------------------------------
+# Per-face latency of the embedding model for the three Keras call paths,
+# at several batch sizes, on random (N, 160, 160, 3) inputs.
+#
+#   python src/bench_inference.py --batch-sizes 1 4 8 --repeats 50
+
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))  # face_recognition_yolo/
+MODEL_PATH = os.path.join(BASE_DIR, "models", "face_cnn_mobilenetv2.h5")
+IMG_SIZE = 160
+
+
+def time_embedder(embedder, batch, repeats, warmup=3):
+    """Returns (median ms per call, median ms per face)."""
+    for _ in range(warmup):
+        embedder.embed(batch)
+
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        embedder.embed(batch)
+        times.append(time.perf_counter() - start)
+
+    per_call = float(np.median(times)) * 1000.0
+    return per_call, per_call / len(batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-face latency of the Keras embedding call paths.")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--modes", nargs="+", choices=KERAS_MODES, default=list(KERAS_MODES))
+    parser.add_argument("--repeats", type=int, default=30)
+    args = parser.parse_args()
+
+    import tensorflow as tf
+
+    print("[INFO] Loading CNN face recognition model...")
+    embedding_model = build_embedding_model(tf.keras.models.load_model(MODEL_PATH))
+    embedders = {mode: KerasEmbedder(embedding_model, mode) for mode in args.modes}
+
+    rng = np.random.default_rng(0)
+    print(f"\n{'mode':<10} {'batch':>5} {'ms/call':>9} {'ms/face':>9}")
+    for n in args.batch_sizes:
+        batch = rng.random((n, IMG_SIZE, IMG_SIZE, 3), dtype=np.float32)
+        for mode, embedder in embedders.items():
+            per_call, per_face = time_embedder(embedder, batch, args.repeats)
+            print(f"{mode:<10} {n:>5} {per_call:>9.2f} {per_face:>9.2f}")
+
+    # all three paths must compute the same embeddings
+    batch = rng.random((2, IMG_SIZE, IMG_SIZE, 3), dtype=np.float32)
+    outs = [e.embed(batch) for e in embedders.values()]
+    diff = max(float(np.max(np.abs(o - outs[0]))) for o in outs)
+    print(f"\n[INFO] Max difference between modes: {diff:.2e}")
+
+
+if __name__ == "__main__":
+    main()
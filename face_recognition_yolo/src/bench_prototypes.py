@@ -0,0 +1,111 @@
+import os
+import time
+import argparse
+
+import numpy as np
+
+import app
+from face_index import FaceIndex
+from prototypes import select_prototypes, PROTOTYPE_METHODS
+
+# -------------------------------------------------
+# BENCHMARK: PROTOTYPES PER PERSON
+# -------------------------------------------------
+# Builds the face database with k = 1, 2, 3, ... prototypes per person from
+# the stored training embeddings and reports, for dataset_faces/val:
+#   - accuracy / unknown rate / wrong-name rate with app.py's thresholds
+#   - matching latency per frame, on the real roster and on a roster padded
+#     with random identities (to see how k scales with enrolment size)
+#
+#   python src/bench_prototypes.py --ks 1 2 3 5 8 --method kmeans
+
+VAL_DIR = os.path.join(app.BASE_DIR, "dataset_faces", "val")
+
+
+def embed_val_images():
+    """Returns (true_names, (M, 128) embeddings) for every val image with a face."""
+    names = []
+    crops = []
+    for person_name in sorted(os.listdir(VAL_DIR)):
+        person_dir = os.path.join(VAL_DIR, person_name)
+        if not os.path.isdir(person_dir):
+            continue
+        for fname in sorted(os.listdir(person_dir)):
+            img = app.cv2.imread(os.path.join(person_dir, fname))
+            if img is None:
+                continue
+            face = app.crop_largest_face(img)
+            if face is None:
+                continue
+            names.append(person_name)
+            crops.append(face)
+
+    return np.array(names, dtype=object), app.get_embeddings(crops)
+
+
+def build_index(train_embs, k, method, extra_persons=0, seed=0):
+    face_db = {name: select_prototypes(embs, k, method) for name, embs in train_embs.items()}
+
+    # random unit vectors as stand-ins for a larger roster
+    rng = np.random.default_rng(seed)
+    for i in range(extra_persons):
+        protos = rng.normal(size=(k, 128)).astype(np.float32)
+        face_db[f"_pad{i:05d}"] = protos / np.linalg.norm(protos, axis=1, keepdims=True)
+
+    return FaceIndex.from_dict(face_db)
+
+
+def evaluate(index, true_names, val_embs):
+    correct = unknown = wrong = 0
+    for truth, (name, best, second) in zip(true_names, index.match(val_embs)):
+        label, _ = app.decide_label(name, best, second)
+        if label == "Unknown":
+            unknown += 1
+        elif label == truth:
+            correct += 1
+        else:
+            wrong += 1
+    n = max(len(true_names), 1)
+    return correct / n, unknown / n, wrong / n
+
+
+def time_matching(index, val_embs, faces_per_frame, repeats):
+    """Mean milliseconds to match one frame with `faces_per_frame` faces."""
+    frame = val_embs[:faces_per_frame]
+    index.search(frame)  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        index.search(frame)
+    return (time.perf_counter() - start) / repeats * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Accuracy / latency vs prototypes per person.")
+    parser.add_argument("--ks", type=int, nargs="+", default=[1, 2, 3, 5, 8])
+    parser.add_argument("--method", choices=PROTOTYPE_METHODS, default=app.PROTOTYPE_METHOD)
+    parser.add_argument("--faces-per-frame", type=int, default=4)
+    parser.add_argument("--roster", type=int, default=1000,
+                        help="random identities added for the large-roster latency column")
+    parser.add_argument("--repeats", type=int, default=2000)
+    args = parser.parse_args()
+
+    train_embs = app.FACE_DB_INDEXER.image_embeddings()
+    true_names, val_embs = embed_val_images()
+    print(f"[INFO] {sum(len(e) for e in train_embs.values())} train / {len(val_embs)} val faces, "
+          f"SIM_THRESHOLD={app.SIM_THRESHOLD}, MARGIN_THRESHOLD={app.MARGIN_THRESHOLD}")
+
+    print(f"\n{'k':>3} {'acc':>7} {'unknown':>8} {'wrong':>7} "
+          f"{'match ms':>9} {'ms @ +' + str(args.roster):>12}")
+    for k in args.ks:
+        index = build_index(train_embs, k, args.method)
+        acc, unk, wrong = evaluate(index, true_names, val_embs)
+        ms = time_matching(index, val_embs, args.faces_per_frame, args.repeats)
+
+        big = build_index(train_embs, k, args.method, extra_persons=args.roster)
+        big_ms = time_matching(big, val_embs, args.faces_per_frame, max(args.repeats // 10, 1))
+
+        print(f"{k:>3} {acc:>7.3f} {unk:>8.3f} {wrong:>7.3f} {ms:>9.4f} {big_ms:>12.4f}")
+
+
+if __name__ == "__main__":
+    main()
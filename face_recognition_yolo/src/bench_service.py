@@ -0,0 +1,167 @@
+import os
+import json
+import time
+import socket
+import argparse
+import threading
+import http.client
+
+import cv2
+import numpy as np
+
+# -------------------------------------------------
+# LOAD GENERATOR FOR recognition_service.py
+# -------------------------------------------------
+# N client threads send face crops (JPEG) back to back over keep-alive
+# connections for a fixed time, then report throughput, client latency
+# percentiles and the server's mean batch size (from /health counters).
+#
+#   python src/recognition_service.py --max-wait-ms 5 &
+#   python src/bench_service.py --clients 1 2 4 8 16 --duration 10
+#   python src/bench_service.py --unix /tmp/face.sock --clients 8
+
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))  # face_recognition_yolo/
+VAL_DIR = os.path.join(BASE_DIR, "dataset_faces", "val")
+MAX_IMAGES = 64
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=30.0):
+        super().__init__("localhost", timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+def connect(args):
+    if args.unix:
+        return UnixHTTPConnection(args.unix)
+    return http.client.HTTPConnection(args.host, args.port, timeout=30.0)
+
+
+def load_payloads(dataset_dir=VAL_DIR, limit=MAX_IMAGES):
+    """JPEG bytes of dataset images (or random noise crops if there are none)."""
+    payloads = []
+    if os.path.isdir(dataset_dir):
+        for person in sorted(os.listdir(dataset_dir)):
+            person_dir = os.path.join(dataset_dir, person)
+            if not os.path.isdir(person_dir):
+                continue
+            for fname in sorted(os.listdir(person_dir)):
+                with open(os.path.join(person_dir, fname), "rb") as f:
+                    payloads.append(f.read())
+                if len(payloads) >= limit:
+                    return payloads
+
+    if not payloads:
+        print(f"[WARN] No images in {dataset_dir}, sending random crops.")
+        rng = np.random.default_rng(0)
+        for _ in range(8):
+            img = rng.integers(0, 256, (160, 160, 3), dtype=np.uint8)
+            payloads.append(cv2.imencode(".jpg", img)[1].tobytes())
+    return payloads
+
+
+def request(conn, method, path, body=None):
+    headers = {"Content-Type": "image/jpeg"} if body is not None else {}
+    conn.request(method, path, body=body, headers=headers)
+    resp = conn.getresponse()
+    return resp.status, json.loads(resp.read() or b"{}")
+
+
+def wait_until_ready(args, timeout=300.0):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            conn = connect(args)
+            status, health = request(conn, "GET", "/health")
+            conn.close()
+            if health.get("error"):
+                raise RuntimeError(f"service failed to start: {health['error']}")
+            if health.get("ready"):
+                return health
+        except (ConnectionError, OSError):
+            pass
+        time.sleep(0.5)
+    raise TimeoutError("service did not become ready")
+
+
+def client_loop(args, payloads, stop, latencies, errors, offset):
+    conn = connect(args)
+    path = f"/recognize?mode={args.mode}"
+    i = offset
+    while not stop.is_set():
+        body = payloads[i % len(payloads)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            status, _ = request(conn, "POST", path, body)
+        except (ConnectionError, OSError, http.client.HTTPException):
+            errors.append(1)
+            conn.close()
+            conn = connect(args)
+            continue
+        if status == 200:
+            latencies.append((time.perf_counter() - start) * 1000.0)
+        else:
+            errors.append(status)
+    conn.close()
+
+
+def run_level(args, payloads, clients):
+    stop = threading.Event()
+    latencies = []   # list.append is atomic, shared by all clients
+    errors = []
+    threads = [threading.Thread(target=client_loop, args=(args, payloads, stop, latencies, errors, k))
+               for k in range(clients)]
+
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(args.duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    lat = np.array(latencies) if latencies else np.zeros(1)
+    p50, p95, p99 = np.percentile(lat, (50, 95, 99))
+    return len(latencies) / elapsed, p50, p95, p99, len(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for recognition_service.py.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", default=None, help="Unix socket path of the service")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16],
+                        help="concurrency levels to test")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per concurrency level")
+    parser.add_argument("--mode", choices=("crop", "frame"), default="crop")
+    parser.add_argument("--images", default=VAL_DIR, help="folder of person folders to send")
+    args = parser.parse_args()
+
+    payloads = load_payloads(args.images)
+    print(f"[INFO] {len(payloads)} payloads, waiting for the service...")
+    health = wait_until_ready(args)
+    print(f"[INFO] Service ready ({health.get('persons')} persons).")
+
+    print(f"\n{'clients':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'errors':>6} {'avg batch':>9}")
+    for clients in args.clients:
+        rps, p50, p95, p99, errors = run_level(args, payloads, clients)
+
+        conn = connect(args)
+        _, after = request(conn, "GET", "/health")
+        conn.close()
+        batches = after["batches"] - health["batches"]
+        avg_batch = (after["items"] - health["items"]) / batches if batches else 0.0
+        health = after
+        print(f"{clients:>7} {rps:>8.1f} {p50:>8.1f} {p95:>8.1f} {p99:>8.1f} {errors:>6} {avg_batch:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
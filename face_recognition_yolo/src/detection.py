@@ -0,0 +1,200 @@
+import cv2
+import numpy as np
+
+# -------------------------------------------------
+# FACE DETECTION WITH DOWNSCALING + REGIONS OF INTEREST
+# -------------------------------------------------
+# Detection backends share one interface:
+#   backend.detect(image, scale=1.0)        -> (N, 4) int (x, y, w, h)
+#   backend.detect_batch(images, scale=1.0) -> list of (N_i, 4) arrays
+#   backend.load()                          -> create the model now
+# HaarFaceDetector wraps the OpenCV cascade; YoloFaceDetector
+# (yolo_detector.py) runs yolo/yolov3-face.cfg through cv2.dnn.
+#
+# On top of a backend, FaceDetector can
+#   - run detection on a frame resized by `scale` and map the boxes back
+#     to full resolution for cropping, and
+#   - scan only padded regions around the current tracks, with a full-frame
+#     scan every `full_scan_every` frames to pick up new faces, and on the
+#     frame after a ROI pass lost a face (instead of rescanning a stale ROI
+#     until the track expires).
+
+HAAR_WINDOW = 24  # native window of haarcascade_frontalface_default.xml
+
+
+def _scaled_min_size(min_size, scale):
+    return max(int(round(min_size * scale)), HAAR_WINDOW)
+
+
+def detect_faces(cascade, gray, scale=1.0, scale_factor=1.1, min_neighbors=5, min_size=60):
+    """
+    Run the cascade on `gray` resized by `scale`.
+    Returns an (N, 4) int array of (x, y, w, h) boxes in `gray` coordinates.
+    """
+    if scale != 1.0:
+        small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    else:
+        small = gray
+
+    ms = _scaled_min_size(min_size, scale) if scale != 1.0 else min_size
+    faces = cascade.detectMultiScale(
+        small,
+        scaleFactor=scale_factor,
+        minNeighbors=min_neighbors,
+        minSize=(ms, ms),
+    )
+
+    if len(faces) == 0:
+        return np.zeros((0, 4), dtype=np.int32)
+
+    faces = np.asarray(faces, dtype=np.float32)
+    if scale != 1.0:
+        faces /= scale
+    return np.round(faces).astype(np.int32)
+
+
+def nms(boxes, scores, iou_threshold=0.4):
+    """
+    Greedy non-maximum suppression on (N, 4) (x, y, w, h) boxes.
+    The IoU of the best remaining box against all others is computed in one
+    vectorized step. Returns the kept indices, best score first.
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    x1, y1 = boxes[:, 0], boxes[:, 1]
+    x2, y2 = x1 + boxes[:, 2], y1 + boxes[:, 3]
+    areas = boxes[:, 2] * boxes[:, 3]
+    order = np.argsort(-np.asarray(scores, dtype=np.float32))
+
+    keep = []
+    while len(order):
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        iw = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        ih = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = iw * ih
+        iou = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-6)
+        order = rest[iou < iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+def expand_box(box, pad, width, height):
+    """Grow an (x1, y1, x2, y2) box by `pad` x its size on every side, clipped to the frame."""
+    x1, y1, x2, y2 = box
+    dx = int((x2 - x1) * pad)
+    dy = int((y2 - y1) * pad)
+    return (max(0, x1 - dx), max(0, y1 - dy), min(width, x2 + dx), min(height, y2 + dy))
+
+
+def merge_duplicates(faces, iou_threshold=0.5):
+    """Drop boxes that overlap a larger box (overlapping ROIs find the same face twice)."""
+    if len(faces) <= 1:
+        return faces
+    keep = nms(faces, faces[:, 2] * faces[:, 3], iou_threshold)
+    return faces[np.sort(keep)]
+
+
+class HaarFaceDetector:
+    """Detection backend around an OpenCV Haar cascade."""
+
+    name = "haar"
+
+    def __init__(self, cascade, scale_factor=1.1, min_neighbors=5, min_size=60):
+        """
+        cascade : cv2.CascadeClassifier, or a zero-argument function
+                  returning one (called on the first detect())
+        min_size: minimum face size in FULL-resolution pixels
+        """
+        self._cascade = cascade
+        self.params = dict(scale_factor=scale_factor, min_neighbors=min_neighbors, min_size=min_size)
+
+    @property
+    def cascade(self):
+        if callable(self._cascade):
+            self._cascade = self._cascade()
+        return self._cascade
+
+    def load(self):
+        return self.cascade
+
+    def detect(self, image, scale=1.0):
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        return detect_faces(self.cascade, gray, scale, **self.params)
+
+    def detect_batch(self, images, scale=1.0):
+        # the cascade has no batch mode
+        return [self.detect(image, scale) for image in images]
+
+
+class FaceDetector:
+    def __init__(self, backend, scale=1.0, full_scan_every=10, roi_padding=0.5,
+                 scale_factor=1.1, min_neighbors=5, min_size=60):
+        """
+        backend        : a detection backend (HaarFaceDetector, YoloFaceDetector);
+                         a cascade or a function returning one is wrapped in
+                         HaarFaceDetector with scale_factor / min_neighbors / min_size
+        scale          : resize factor for detection (0.5 = half resolution)
+        full_scan_every: with ROIs, scan the whole frame every N frames
+        roi_padding    : ROI = track box grown by this fraction on each side
+        """
+        if not hasattr(backend, "detect_batch"):
+            backend = HaarFaceDetector(backend, scale_factor, min_neighbors, min_size)
+        self.backend = backend
+        self.scale = scale
+        self.full_scan_every = full_scan_every
+        self.roi_padding = roi_padding
+        self.frame_count = 0
+        self.full_scans = 0
+        self._rescan = False  # a face was lost: scan the whole next frame
+
+    def request_full_scan(self):
+        """Scan the whole frame on the next detect() (e.g. a track went unmatched)."""
+        self._rescan = True
+
+    def detect(self, frame, track_boxes=None):
+        """
+        Faces in a BGR frame as an (N, 4) array of full-resolution (x, y, w, h).
+        track_boxes: (x1, y1, x2, y2) boxes of the current tracks; when given,
+                     only the regions around them are scanned, except on
+                     every `full_scan_every`-th frame and after a ROI pass
+                     found fewer faces than there are tracks.
+        """
+        self.frame_count += 1
+
+        full_scan = (
+            not track_boxes
+            or self._rescan
+            or self.full_scan_every <= 1
+            or self.frame_count % self.full_scan_every == 1
+        )
+        if full_scan:
+            self._rescan = False
+            self.full_scans += 1
+            return self.backend.detect(frame, self.scale)
+
+        height, width = frame.shape[:2]
+        rois = []
+        for box in track_boxes:
+            x1, y1, x2, y2 = expand_box(box, self.roi_padding, width, height)
+            if x2 - x1 < HAAR_WINDOW or y2 - y1 < HAAR_WINDOW:
+                continue
+            rois.append((x1, y1, x2, y2))
+
+        # all ROIs of the frame in one call (one forward pass for YOLO)
+        crops = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in rois]
+        found = []
+        for (x1, y1, _, _), faces in zip(rois, self.backend.detect_batch(crops, self.scale)):
+            if len(faces):
+                faces = faces.copy()
+                faces[:, 0] += x1
+                faces[:, 1] += y1
+                found.append(faces)
+
+        faces = merge_duplicates(np.concatenate(found, axis=0)) if found else np.zeros((0, 4), dtype=np.int32)
+        if len(faces) < len(track_boxes):
+            # a face moved out of its ROI: look for it everywhere next frame
+            self._rescan = True
+        return faces
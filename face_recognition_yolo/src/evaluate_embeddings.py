@@ -0,0 +1,278 @@
+import os
+import csv
+import json
+import argparse
+
+import numpy as np
+
+import app
+from face_index import top2
+from incremental_index import IncrementalFaceIndexer
+
+# -------------------------------------------------
+# EMBEDDING QUALITY + THRESHOLD SWEEP
+# -------------------------------------------------
+# Embeds every face in dataset_faces/val (batched, cached per image like the
+# training store, so a re-run only embeds new photos) and reports:
+#
+#   verification : cosine of every val/val pair, genuine (same person) vs
+#                  impostor -> ROC / DET curves, EER, threshold at a target FAR
+#   open set     : every val face against the enrolled face database, once
+#                  as a known person and once with its own person removed
+#                  (as if never enrolled), swept over SIM_THRESHOLD x
+#                  MARGIN_THRESHOLD with app.py's decide_label() rules
+#                  -> recommended (threshold, margin)
+#
+# Results go to logs/embedding_eval/ (CSV, summary.json, roc.png / det.png
+# when matplotlib is installed).
+#
+#   python src/evaluate_embeddings.py --target-far 0.001 --max-error 0.01
+
+VAL_DIR = os.path.join(app.BASE_DIR, "dataset_faces", "val")
+VAL_STORE_PREFIX = app.FACE_DB_CACHE_PREFIX + "_val_images"
+OUT_DIR = os.path.join(app.BASE_DIR, "logs", "embedding_eval")
+
+THRESHOLDS = np.round(np.arange(0.30, 1.0001, 0.01), 2)
+MARGINS = np.round(np.arange(0.0, 0.3001, 0.01), 2)
+CURRENT_SETTINGS = {
+    "app.py": (app.SIM_THRESHOLD, app.MARGIN_THRESHOLD),
+    "realtime_haar_face_recognition.py": (0.65, 0.0),  # no margin rule there
+}
+
+
+def embed_val_images():
+    """Returns (labels, (M, 128) embeddings) for every val image with a face."""
+    indexer = IncrementalFaceIndexer(
+        VAL_DIR,
+        VAL_STORE_PREFIX,
+        app.EMBED_MODEL_FILE,
+        crop_fn=app.crop_largest_face,
+        embed_fn=app.get_embeddings,
+        settings=app.FACE_DB_SETTINGS,
+    )
+    labels = []
+    rows = []
+    for person, embs in sorted(indexer.image_embeddings().items()):
+        labels.extend([person] * len(embs))
+        rows.append(embs)
+    if not rows:
+        return np.array([], dtype=object), np.zeros((0, 128), dtype=np.float32)
+    return np.array(labels, dtype=object), np.concatenate(rows, axis=0)
+
+
+# ---------------- verification (pairs) ----------------
+def similarity_pairs(embs, labels):
+    """Cosine similarity of every unordered val pair -> (genuine, impostor)."""
+    sims = embs @ embs.T
+    i, j = np.triu_indices(len(embs), k=1)
+    pair_sims = sims[i, j]
+    same = labels[i] == labels[j]
+    return pair_sims[same], pair_sims[~same]
+
+
+def error_rates(genuine, impostor, thresholds):
+    """
+    For every threshold t (accept when sim >= t):
+      FAR = impostor pairs accepted, FRR = genuine pairs rejected.
+    """
+    frr = np.searchsorted(np.sort(genuine), thresholds, side="left") / max(len(genuine), 1)
+    far = 1.0 - np.searchsorted(np.sort(impostor), thresholds, side="left") / max(len(impostor), 1)
+    return far, frr
+
+
+def equal_error_rate(thresholds, far, frr):
+    """(EER, threshold) where FAR and FRR cross."""
+    i = int(np.argmin(np.abs(far - frr)))
+    return float((far[i] + frr[i]) / 2.0), float(thresholds[i])
+
+
+def threshold_at_far(thresholds, far, target):
+    """Lowest threshold whose FAR is at most `target` (FAR falls as t rises)."""
+    ok = np.flatnonzero(far <= target)
+    return float(thresholds[ok[0]]) if len(ok) else float(thresholds[-1])
+
+
+# ---------------- open-set identification ----------------
+def accepted(best, second, thresholds, margins):
+    """(T, M, Q) mask of faces app.decide_label() would give a name."""
+    best = best[None, None, :]
+    second = second[None, None, :]
+    t = np.asarray(thresholds, dtype=np.float32)[:, None, None]
+    m = np.asarray(margins, dtype=np.float32)[None, :, None]
+    too_close = (second > 0) & ((best - second) < m)
+    return (best >= t) & ~too_close
+
+
+def open_set_rates(person_sims, truth, thresholds, margins):
+    """
+    person_sims: (Q, P) similarity of every val face to every enrolled person
+    truth      : (Q,) column of the true person, -1 if not enrolled
+    Returns (correct, wrong, false_accept), each (T, M):
+      correct     : enrolled faces given their own name
+      wrong       : enrolled faces given another person's name
+      false_accept: faces of a person removed from the gallery that still get a name
+    """
+    rows = np.arange(len(truth))
+    known = truth >= 0
+
+    best_idx, best, second = top2(person_sims)
+    acc = accepted(best, second, thresholds, margins)
+    right = best_idx == truth
+    n_known = max(int(known.sum()), 1)
+    correct = (acc & (right & known)[None, None, :]).sum(axis=2) / n_known
+    wrong = (acc & (~right & known)[None, None, :]).sum(axis=2) / n_known
+
+    # leave-one-person-out: hide the true person's column
+    hidden = person_sims.copy()
+    hidden[rows[known], truth[known]] = -np.inf
+    if hidden.shape[1] > 1:
+        _, best_u, second_u = top2(hidden)
+        second_u = np.where(np.isfinite(second_u), second_u, -1.0)
+        acc_u = accepted(best_u, second_u, thresholds, margins)
+        false_accept = acc_u.sum(axis=2) / max(len(truth), 1)
+    else:
+        false_accept = np.zeros((len(thresholds), len(margins)))
+    return correct, wrong, false_accept
+
+
+def recommend(thresholds, margins, correct, wrong, false_accept, max_error):
+    """
+    Most correct names with wrong-name and unknown-accept rates both
+    <= max_error; among equally good settings the strictest one.
+    """
+    ok = (wrong <= max_error) & (false_accept <= max_error)
+    if not ok.any():
+        return None
+    top = correct[ok].max()
+    ti, mi = np.argwhere(ok & (correct >= top - 1e-9))[-1]
+    return {
+        "sim_threshold": float(thresholds[ti]),
+        "margin_threshold": float(margins[mi]),
+        "correct": float(correct[ti, mi]),
+        "wrong": float(wrong[ti, mi]),
+        "false_accept": float(false_accept[ti, mi]),
+    }
+
+
+# ---------------- output ----------------
+def write_csv(path, header, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def plot_curves(far, frr, eer, out_dir):
+    """roc.png and det.png; skipped without matplotlib."""
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("[WARN] matplotlib not installed, skipping plots (curves are in verification.csv).")
+        return
+
+    fig, ax = plt.subplots(figsize=(5, 5))
+    ax.plot(far, 1.0 - frr)
+    ax.set_xscale("log")
+    ax.set_xlim(1e-4, 1.0)
+    ax.set_xlabel("false accept rate")
+    ax.set_ylabel("true accept rate")
+    ax.set_title("ROC (val pairs)")
+    ax.grid(True, which="both", alpha=0.3)
+    fig.savefig(os.path.join(out_dir, "roc.png"), dpi=120, bbox_inches="tight")
+    plt.close(fig)
+
+    fig, ax = plt.subplots(figsize=(5, 5))
+    ax.plot(np.maximum(far, 1e-5), np.maximum(frr, 1e-5))
+    ax.plot([eer], [eer], "o", label=f"EER {eer:.3%}")
+    ax.set_xscale("log")
+    ax.set_yscale("log")
+    ax.set_xlim(1e-4, 1.0)
+    ax.set_ylim(1e-4, 1.0)
+    ax.set_xlabel("false accept rate")
+    ax.set_ylabel("false reject rate")
+    ax.set_title("DET (val pairs)")
+    ax.legend()
+    ax.grid(True, which="both", alpha=0.3)
+    fig.savefig(os.path.join(out_dir, "det.png"), dpi=120, bbox_inches="tight")
+    plt.close(fig)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ROC/DET, EER and threshold/margin sweep on dataset_faces/val.")
+    parser.add_argument("--target-far", type=float, default=1e-3,
+                        help="false accept rate for the verification threshold")
+    parser.add_argument("--max-error", type=float, default=0.01,
+                        help="allowed wrong-name and unknown-accept rate for the recommendation")
+    parser.add_argument("--out-dir", default=OUT_DIR)
+    args = parser.parse_args()
+
+    labels, embs = embed_val_images()
+    if len(embs) < 2:
+        print(f"[ERROR] Need at least two val faces in {VAL_DIR}.")
+        return
+    os.makedirs(args.out_dir, exist_ok=True)
+
+    # verification
+    genuine, impostor = similarity_pairs(embs, labels)
+    thresholds = np.linspace(-1.0, 1.0, 2001)
+    far, frr = error_rates(genuine, impostor, thresholds)
+    eer, eer_thr = equal_error_rate(thresholds, far, frr)
+    far_thr = threshold_at_far(thresholds, far, args.target_far)
+    print(f"[INFO] {len(embs)} val faces, {len(genuine)} genuine / {len(impostor)} impostor pairs")
+    print(f"[INFO] Genuine sim mean {genuine.mean() if len(genuine) else float('nan'):.3f}, "
+          f"impostor sim mean {impostor.mean() if len(impostor) else float('nan'):.3f}")
+    print(f"[INFO] EER {eer:.3%} at threshold {eer_thr:.3f}; "
+          f"FAR <= {args.target_far:g} from threshold {far_thr:.3f}")
+
+    write_csv(os.path.join(args.out_dir, "verification.csv"), ["threshold", "far", "frr"],
+              zip(np.round(thresholds, 4), far, frr))
+    plot_curves(far, frr, eer, args.out_dir)
+
+    # open-set identification against the enrolled database
+    face_db = app.get_face_db()
+    column = {name: i for i, name in enumerate(face_db.persons)}
+    truth = np.array([column.get(name, -1) for name in labels], dtype=np.int64)
+    person_sims = face_db.person_similarities(embs)
+    correct, wrong, false_accept = open_set_rates(person_sims, truth, THRESHOLDS, MARGINS)
+
+    rows = [(t, m, correct[i, j], wrong[i, j], false_accept[i, j])
+            for i, t in enumerate(THRESHOLDS) for j, m in enumerate(MARGINS)]
+    write_csv(os.path.join(args.out_dir, "sweep.csv"),
+              ["sim_threshold", "margin_threshold", "correct", "wrong", "false_accept"], rows)
+
+    print(f"\n{'setting':<36} {'thr':>5} {'margin':>6} {'correct':>8} {'wrong':>7} {'unk acc':>8}")
+    current = {}
+    for name, (t, m) in CURRENT_SETTINGS.items():
+        c, w, fa = (r[0, 0] for r in open_set_rates(person_sims, truth, [t], [m]))
+        current[name] = {"sim_threshold": t, "margin_threshold": m,
+                         "correct": float(c), "wrong": float(w), "false_accept": float(fa)}
+        print(f"{name:<36} {t:>5.2f} {m:>6.2f} {c:>8.3f} {w:>7.3f} {fa:>8.3f}")
+
+    best = recommend(THRESHOLDS, MARGINS, correct, wrong, false_accept, args.max_error)
+    if best is None:
+        print(f"[WARN] No threshold/margin keeps both error rates <= {args.max_error}.")
+    else:
+        print(f"{'recommended':<36} {best['sim_threshold']:>5.2f} {best['margin_threshold']:>6.2f} "
+              f"{best['correct']:>8.3f} {best['wrong']:>7.3f} {best['false_accept']:>8.3f}")
+
+    summary = {
+        "val_faces": int(len(embs)),
+        "genuine_pairs": int(len(genuine)),
+        "impostor_pairs": int(len(impostor)),
+        "eer": eer,
+        "eer_threshold": eer_thr,
+        "target_far": args.target_far,
+        "threshold_at_target_far": far_thr,
+        "current": current,
+        "max_error": args.max_error,
+        "recommended": best,
+    }
+    with open(os.path.join(args.out_dir, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    print(f"\n[INFO] Curves, sweep and summary written to {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+import os
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+from inference_backends import build_embedding_model, load_embedder, KerasEmbedder
+from preprocessing import preprocess_faces
+
+# -------------------------------------------------
+# EXPORT THE EMBEDDING SUB-MODEL FOR LEAN INFERENCE
+# -------------------------------------------------
+# Writes the Dense(128) sub-model of face_cnn_mobilenetv2.h5 as
+#   models/face_embedding_<quant>.tflite   (fp32 / float16 / int8)
+#   models/face_embedding_<quant>.onnx     (fp32 / float16 / int8)
+# int8 is calibrated on face crops from dataset_faces/val. With --compare
+# the exported file is checked against Keras: embedding agreement,
+# nearest-person accuracy on val and per-face latency.
+#
+#   python src/export_embedding_model.py --format tflite --quant int8 --compare
+#   python src/export_embedding_model.py --format onnx --quant fp32
+#
+# ONNX export needs `tf2onnx`; ONNX int8 / float16 need `onnxruntime` /
+# `onnxconverter-common`. TFLite only needs TensorFlow.
+
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))  # face_recognition_yolo/
+MODELS_DIR = os.path.join(BASE_DIR, "models")
+MODEL_PATH = os.path.join(MODELS_DIR, "face_cnn_mobilenetv2.h5")
+TRAIN_DIR = os.path.join(BASE_DIR, "dataset_faces", "train")
+VAL_DIR = os.path.join(BASE_DIR, "dataset_faces", "val")
+
+IMG_SIZE = 160
+QUANT_MODES = ("fp32", "float16", "int8")
+CALIBRATION_SAMPLES = 200
+
+HAAR_PATH = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+face_cascade = cv2.CascadeClassifier(HAAR_PATH)
+
+
+def export_path(fmt, quant):
+    ext = "tflite" if fmt == "tflite" else "onnx"
+    return os.path.join(MODELS_DIR, f"face_embedding_{quant}.{ext}")
+
+
+# -------------------------------------------------
+# FACE CROPS (same detection + preprocessing as app.py)
+# -------------------------------------------------
+def load_face_batch(dataset_dir, max_per_person=None):
+    """Returns (names, (N, 160, 160, 3) float32 batch) of the largest face per image."""
+    names = []
+    faces = []
+    for person_name in sorted(os.listdir(dataset_dir)):
+        person_dir = os.path.join(dataset_dir, person_name)
+        if not os.path.isdir(person_dir):
+            continue
+        count = 0
+        for fname in sorted(os.listdir(person_dir)):
+            if max_per_person is not None and count >= max_per_person:
+                break
+            img = cv2.imread(os.path.join(person_dir, fname))
+            if img is None:
+                continue
+            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+            boxes = face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(60, 60))
+            if len(boxes) == 0:
+                continue
+            x, y, w, h = sorted(boxes, key=lambda b: b[2] * b[3], reverse=True)[0]
+            faces.append(preprocess_faces([img[y:y + h, x:x + w]], IMG_SIZE)[0].copy())
+            names.append(person_name)
+            count += 1
+
+    batch = np.stack(faces) if faces else np.zeros((0, IMG_SIZE, IMG_SIZE, 3), dtype=np.float32)
+    return np.array(names, dtype=object), batch
+
+
+def calibration_batches(batch, limit=CALIBRATION_SAMPLES):
+    for i in range(min(len(batch), limit)):
+        yield batch[i:i + 1]
+
+
+# -------------------------------------------------
+# EXPORTERS
+# -------------------------------------------------
+def export_tflite(embedding_model, quant, calib, out_path):
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(embedding_model)
+    if quant == "float16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quant == "int8":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = lambda: ([b] for b in calibration_batches(calib))
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+
+    with open(out_path, "wb") as f:
+        f.write(converter.convert())
+
+
+def export_onnx(embedding_model, quant, calib, out_path):
+    import tensorflow as tf
+    import tf2onnx
+
+    spec = (tf.TensorSpec((None, IMG_SIZE, IMG_SIZE, 3), tf.float32, name="input"),)
+    fp32_path = out_path if quant == "fp32" else out_path + ".fp32.onnx"
+    tf2onnx.convert.from_keras(embedding_model, input_signature=spec, output_path=fp32_path)
+
+    if quant == "float16":
+        import onnx
+        from onnxconverter_common import float16
+        model = float16.convert_float_to_float16(onnx.load(fp32_path), keep_io_types=True)
+        onnx.save(model, out_path)
+    elif quant == "int8":
+        from onnxruntime.quantization import CalibrationDataReader, QuantType, quantize_static
+
+        class ValReader(CalibrationDataReader):
+            def __init__(self):
+                self._it = iter(calibration_batches(calib))
+
+            def get_next(self):
+                b = next(self._it, None)
+                return None if b is None else {"input": b}
+
+        quantize_static(fp32_path, out_path, ValReader(),
+                        activation_type=QuantType.QInt8, weight_type=QuantType.QInt8)
+
+    if fp32_path != out_path:
+        os.remove(fp32_path)
+
+
+# -------------------------------------------------
+# COMPARISON REPORT
+# -------------------------------------------------
+def _normalize(x):
+    return x / (np.linalg.norm(x, axis=1, keepdims=True) + 1e-10)
+
+
+def _latency_ms(embedder, batch, batch_size, repeats=20):
+    """Mean milliseconds per face at a given batch size."""
+    inp = batch[:batch_size]
+    embedder.embed(inp)  # warm-up / tensor allocation
+    start = time.perf_counter()
+    for _ in range(repeats):
+        embedder.embed(inp)
+    return (time.perf_counter() - start) / (repeats * len(inp)) * 1000.0
+
+
+def _nn_accuracy(embedder, train_names, train_batch, val_names, val_batch):
+    """Nearest-mean-person accuracy on val, gallery built with the same embedder."""
+    train = _normalize(embedder.embed(train_batch))
+    persons = sorted(set(train_names))
+    gallery = _normalize(np.stack([train[train_names == p].mean(axis=0) for p in persons]))
+    pred = np.argmax(_normalize(embedder.embed(val_batch)) @ gallery.T, axis=1)
+    return float(np.mean(np.array(persons, dtype=object)[pred] == val_names))
+
+
+def compare(reference, candidates, train, val):
+    train_names, train_batch = train
+    val_names, val_batch = val
+    ref_val = _normalize(reference.embed(val_batch))
+
+    print(f"\n{'backend':<28} {'cos vs keras':>12} {'val acc':>8} {'ms/face b1':>11} {'ms/face b8':>11}")
+    for label, embedder in [("keras (h5)", reference)] + candidates:
+        emb = _normalize(embedder.embed(val_batch))
+        agreement = float(np.mean(np.sum(emb * ref_val, axis=1)))
+        acc = _nn_accuracy(embedder, train_names, train_batch, val_names, val_batch)
+        b1 = _latency_ms(embedder, val_batch, 1)
+        b8 = _latency_ms(embedder, val_batch, 8)
+        print(f"{label:<28} {agreement:>12.4f} {acc:>8.3f} {b1:>11.2f} {b8:>11.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the Dense(128) embedding sub-model.")
+    parser.add_argument("--format", choices=("tflite", "onnx"), default="tflite")
+    parser.add_argument("--quant", choices=QUANT_MODES, default="int8")
+    parser.add_argument("--compare", action="store_true",
+                        help="compare the exported file against Keras on dataset_faces/val")
+    parser.add_argument("--threads", type=int, default=None, help="runtime threads for --compare")
+    args = parser.parse_args()
+
+    import tensorflow as tf
+
+    print("[INFO] Loading CNN face recognition model...")
+    embedding_model = build_embedding_model(tf.keras.models.load_model(MODEL_PATH))
+
+    print("[INFO] Loading validation faces for calibration...")
+    val_names, val_batch = load_face_batch(VAL_DIR)
+    if len(val_batch) == 0:
+        print("[ERROR] No faces found in dataset_faces/val.")
+        return
+
+    out_path = export_path(args.format, args.quant)
+    print(f"[INFO] Exporting {args.format} ({args.quant}) -> {out_path}")
+    if args.format == "tflite":
+        export_tflite(embedding_model, args.quant, val_batch, out_path)
+    else:
+        export_onnx(embedding_model, args.quant, val_batch, out_path)
+    print(f"[INFO] Done, {os.path.getsize(out_path) / 1e6:.1f} MB "
+          f"(h5: {os.path.getsize(MODEL_PATH) / 1e6:.1f} MB).")
+
+    if args.compare:
+        train = load_face_batch(TRAIN_DIR, max_per_person=40)
+        exported = load_embedder(args.format, export_path=out_path, num_threads=args.threads)
+        compare(KerasEmbedder(embedding_model),
+                [(f"{args.format} {args.quant}", exported)],
+                train, (val_names, val_batch))
+
+
+if __name__ == "__main__":
+    main()
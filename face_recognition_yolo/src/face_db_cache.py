@@ -0,0 +1,130 @@
+import os
+import json
+import hashlib
+import tempfile
+
+import numpy as np
+
+from face_index import FaceIndex
+
+# -------------------------------------------------
+# ON-DISK FACE DATABASE CACHE
+# -------------------------------------------------
+# The face database is saved as two files next to the model:
+#   <prefix>.npy   float32 (N, 128) embedding matrix (memory-mappable)
+#   <prefix>.json  names + the keys the cache was built with
+# It is reused only while the model file hash, the dataset signature and
+# the embedding settings are unchanged.
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def file_sha1(path, chunk_size=1 << 20):
+    """SHA-1 of a file's contents, read in chunks."""
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def atomic_write(path, write_fn, mode="wb"):
+    """
+    Write `path` via write_fn(file) into a unique temp file in the same
+    directory, then os.replace() it into place. Several processes may
+    rebuild the same cache at once; each publishes a complete file.
+    """
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode) as f:
+            write_fn(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def dataset_signature(dataset_dir):
+    """
+    Cheap fingerprint of an image folder: hashes every image's relative
+    path, size and mtime (no image is read).
+    """
+    h = hashlib.sha1()
+    for root, dirs, files in os.walk(dataset_dir):
+        dirs.sort()
+        for fname in sorted(files):
+            if not fname.lower().endswith(IMAGE_EXTS):
+                continue
+            path = os.path.join(root, fname)
+            st = os.stat(path)
+            rel = os.path.relpath(path, dataset_dir).replace(os.sep, "/")
+            h.update(f"{rel}|{st.st_size}|{st.st_mtime_ns}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def _cache_paths(cache_prefix):
+    return cache_prefix + ".npy", cache_prefix + ".json"
+
+
+def load_face_db(cache_prefix, key):
+    """
+    Load a cached FaceIndex if its stored key matches `key`.
+    The embedding matrix is memory-mapped, not read into RAM.
+    Returns None when the cache is missing or stale.
+    """
+    npy_path, meta_path = _cache_paths(cache_prefix)
+    if not (os.path.exists(npy_path) and os.path.exists(meta_path)):
+        return None
+
+    try:
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if meta.get("key") != key:
+        return None
+
+    embeddings = np.load(npy_path, mmap_mode="r")
+    if embeddings.shape[0] != len(meta["names"]):
+        return None
+
+    return FaceIndex(meta["names"], embeddings)
+
+
+def save_face_db(cache_prefix, index, key):
+    """Write a FaceIndex and its key to disk (atomically per file)."""
+    npy_path, meta_path = _cache_paths(cache_prefix)
+    os.makedirs(os.path.dirname(npy_path) or ".", exist_ok=True)
+
+    atomic_write(npy_path, lambda f: np.save(f, np.ascontiguousarray(index.embeddings, dtype=np.float32)))
+    atomic_write(meta_path, lambda f: json.dump({"key": key, "names": [str(n) for n in index.names]},
+                                                f, indent=2), mode="w")
+
+
+def load_or_build_face_db(build_fn, model_path, dataset_dir, cache_prefix, settings=None):
+    """
+    Return the cached FaceIndex, or call build_fn() -> {name: embedding},
+    save the result and return it.
+    settings: extra JSON-serializable values that change the embeddings
+              (image size, preprocessing, ...); a change forces a rebuild.
+    """
+    key = {
+        "model_sha1": file_sha1(model_path),
+        "dataset": dataset_signature(dataset_dir),
+        "settings": settings or {},
+    }
+
+    index = load_face_db(cache_prefix, key)
+    if index is not None:
+        print(f"[INFO] Loaded cached face database ({len(index)} persons) from {cache_prefix}.npy")
+        return index
+
+    print("[INFO] Face database cache missing or stale, rebuilding...")
+    index = FaceIndex.from_dict(build_fn())
+    if len(index) > 0:
+        save_face_db(cache_prefix, index, key)
+        print(f"[INFO] Saved face database cache to {cache_prefix}.npy")
+    return index
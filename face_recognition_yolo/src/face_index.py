@@ -0,0 +1,128 @@
+import numpy as np
+
+# -------------------------------------------------
+# EMBEDDING-MATRIX INDEX FOR THE FACE DATABASE
+# -------------------------------------------------
+# All reference embeddings live in one contiguous float32 (N, 128) matrix
+# with a parallel array of names. Because every row (and every query) is
+# already unit-length, cosine similarity is just a dot product, so a whole
+# batch of queries is matched with one matrix multiply.
+#
+# A person may own several rows (prototypes). Rows are kept grouped by
+# person, and a person's similarity is the max over their prototypes.
+
+EMB_DIM = 128
+
+
+class FaceIndex:
+    """Exact nearest-neighbour search over unit-length face embeddings."""
+
+    def __init__(self, names, embeddings):
+        names = np.asarray(names, dtype=object)
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(-1, EMB_DIM)
+
+        if len(names) != len(embeddings):
+            raise ValueError(
+                f"FaceIndex got {len(names)} names but {len(embeddings)} embeddings."
+            )
+
+        # group the rows of each person together (stable, keeps prototype order)
+        persons, row_person = np.unique(names.astype(str), return_inverse=True)
+        order = np.argsort(row_person, kind="stable")
+        if not np.array_equal(order, np.arange(len(order))):
+            names = names[order]
+            embeddings = embeddings[order]
+            row_person = row_person[order]
+
+        self.names = names                                  # (N,) per-row name
+        self.embeddings = np.ascontiguousarray(embeddings)  # (N, 128)
+        self.persons = persons.astype(object)               # (P,) unique names
+        self.row_person = row_person                        # (N,) row -> person id
+        # first row of every person, for np.maximum.reduceat
+        self._group_starts = np.searchsorted(row_person, np.arange(len(persons)))
+
+    @classmethod
+    def from_dict(cls, face_db):
+        """
+        Build an index from a {name: embedding} dictionary.
+        A value may also be a (k, 128) array of prototypes.
+        """
+        names = []
+        rows = []
+        for name, embs in face_db.items():
+            embs = np.asarray(embs, dtype=np.float32).reshape(-1, EMB_DIM)
+            names.extend([name] * len(embs))
+            rows.append(embs)
+
+        if not rows:
+            return cls([], np.zeros((0, EMB_DIM), dtype=np.float32))
+        return cls(names, np.concatenate(rows, axis=0))
+
+    def __len__(self):
+        """Number of persons (not rows)."""
+        return len(self.persons)
+
+    @property
+    def num_rows(self):
+        return len(self.embeddings)
+
+    def person_similarities(self, query_embs):
+        """(Q, P) similarity of every query to every person (max over prototypes)."""
+        q = np.asarray(query_embs, dtype=np.float32).reshape(-1, EMB_DIM)
+        sims = q @ self.embeddings.T  # (Q, N)
+        if self.num_rows == len(self.persons):
+            return sims
+        return np.maximum.reduceat(sims, self._group_starts, axis=1)
+
+    def search(self, query_embs):
+        """
+        Best and second-best person for every query embedding.
+        query_embs: (Q, 128) normalized embeddings.
+        Returns (best_idx, best_sim, second_sim), each of shape (Q,);
+        best_idx indexes self.persons.
+        second_sim is -1.0 when the index holds a single person.
+        """
+        q = np.asarray(query_embs, dtype=np.float32).reshape(-1, EMB_DIM)
+        n_queries = len(q)
+
+        if len(self) == 0:
+            return (np.full(n_queries, -1, dtype=np.int64),
+                    np.full(n_queries, -1.0, dtype=np.float32),
+                    np.full(n_queries, -1.0, dtype=np.float32))
+
+        sims = self.person_similarities(q)  # (Q, P)
+        return top2(sims)
+
+    def match(self, query_embs):
+        """
+        Like search(), but returns a list of (name, best_sim, second_sim)
+        tuples with plain Python floats.
+        """
+        best_idx, best_sim, second_sim = self.search(query_embs)
+        results = []
+        for i, b, s in zip(best_idx, best_sim, second_sim):
+            name = self.persons[i] if i >= 0 else None
+            results.append((name, float(b), float(s)))
+        return results
+
+
+def top2(sims):
+    """
+    Partial top-2 selection over the columns of a (Q, P) similarity matrix.
+    Returns (best_idx, best_sim, second_sim); second_sim is -1.0 if P == 1.
+    """
+    n_queries = sims.shape[0]
+    rows = np.arange(n_queries)
+
+    if sims.shape[1] == 1:
+        best_idx = np.zeros(n_queries, dtype=np.int64)
+        return best_idx, sims[:, 0], np.full(n_queries, -1.0, dtype=np.float32)
+
+    # O(P) per query instead of a full sort
+    idx = np.argpartition(-sims, 1, axis=1)[:, :2]
+    idx_sims = sims[rows[:, None], idx]
+    order = np.argsort(-idx_sims, axis=1)
+    idx = idx[rows[:, None], order]
+    idx_sims = idx_sims[rows[:, None], order]
+
+    return idx[:, 0], idx_sims[:, 0], idx_sims[:, 1]
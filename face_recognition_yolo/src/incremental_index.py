@@ -0,0 +1,251 @@
+import os
+import json
+
+import cv2
+import numpy as np
+
+from face_db_cache import IMAGE_EXTS, atomic_write, file_sha1
+from prototypes import select_prototypes
+
+# -------------------------------------------------
+# INCREMENTAL PER-IMAGE EMBEDDING STORE
+# -------------------------------------------------
+# Keeps one embedding record per training image, keyed by relative path,
+# size, mtime and content hash:
+#   <prefix>.npz   images: (M, 128) per-image embeddings
+#                  means:  (R, 128) per-person mean / prototype rows
+#   <prefix>.json  records + per-row person names + store key
+# update() embeds only new or changed files, drops deleted ones and
+# recomputes the prototypes of the affected persons only.
+
+EMB_DIM = 128
+EMBED_BATCH_SIZE = 32
+
+
+class IncrementalFaceIndexer:
+    def __init__(self, dataset_dir, store_prefix, model_path, crop_fn, embed_fn, settings=None,
+                 num_prototypes=1, prototype_method="kmeans"):
+        """
+        dataset_dir : dataset_faces/train (one sub-folder per person)
+        store_prefix: path prefix of the .npz/.json store
+        model_path  : model file; a different hash invalidates every record
+        crop_fn     : crop_fn(bgr_image) -> face crop or None
+        embed_fn    : embed_fn(list_of_crops) -> (N, 128) normalized embeddings
+        settings    : extra JSON-serializable values that change embeddings
+        num_prototypes / prototype_method: see prototypes.select_prototypes()
+                      (1 = a single mean embedding per person)
+        """
+        self.dataset_dir = dataset_dir
+        self.store_prefix = store_prefix
+        self.model_path = model_path
+        self.crop_fn = crop_fn
+        self.embed_fn = embed_fn
+        self.settings = settings or {}
+        self.num_prototypes = num_prototypes
+        self.prototype_method = prototype_method
+
+    def _prototype_key(self):
+        return {"k": self.num_prototypes, "method": self.prototype_method}
+
+    # ---------------- store I/O ----------------
+    def _paths(self):
+        return self.store_prefix + ".npz", self.store_prefix + ".json"
+
+    def _load_store(self, key):
+        """Returns (records, image_embs, person_protos) or empty state if stale."""
+        npz_path, meta_path = self._paths()
+        empty = ({}, {}, {})
+        if not (os.path.exists(npz_path) and os.path.exists(meta_path)):
+            return empty
+
+        try:
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+            data = np.load(npz_path)
+            images = data["images"]
+            means = data["means"]
+        except (OSError, ValueError, KeyError):
+            return empty
+
+        if meta.get("key") != key:
+            print("[INFO] Model or settings changed, re-embedding all training images.")
+            return empty
+
+        records = {}
+        image_embs = {}
+        for rec in meta["records"]:
+            row = rec.pop("row")
+            records[rec["path"]] = rec
+            if row is not None:
+                image_embs[rec["path"]] = images[row]
+
+        # prototypes are cheap to recompute from the stored image embeddings,
+        # so a different k / method only drops them, not the image records
+        person_protos = {}
+        if meta.get("prototypes") == self._prototype_key():
+            for i, name in enumerate(meta["mean_names"]):
+                person_protos.setdefault(name, []).append(means[i])
+            person_protos = {name: np.stack(rows) for name, rows in person_protos.items()}
+        return records, image_embs, person_protos
+
+    def _save_store(self, key, records, image_embs, person_protos):
+        npz_path, meta_path = self._paths()
+        os.makedirs(os.path.dirname(npz_path) or ".", exist_ok=True)
+
+        rows = []
+        meta_records = []
+        for path in sorted(records):
+            rec = dict(records[path])
+            if path in image_embs:
+                rec["row"] = len(rows)
+                rows.append(image_embs[path])
+            else:
+                rec["row"] = None  # image without a detectable face
+            meta_records.append(rec)
+
+        mean_names = []
+        mean_rows = []
+        for name in sorted(person_protos):
+            for proto in person_protos[name]:
+                mean_names.append(name)
+                mean_rows.append(proto)
+        images = np.array(rows, dtype=np.float32).reshape(-1, EMB_DIM)
+        means = np.array(mean_rows, dtype=np.float32).reshape(-1, EMB_DIM)
+
+        atomic_write(npz_path, lambda f: np.savez(f, images=images, means=means))
+        meta = {"key": key, "prototypes": self._prototype_key(),
+                "records": meta_records, "mean_names": mean_names}
+        atomic_write(meta_path, lambda f: json.dump(meta, f, indent=1), mode="w")
+
+    # ---------------- dataset scan ----------------
+    def _scan(self):
+        """Returns {rel_path: (person, abs_path, size, mtime_ns)}."""
+        found = {}
+        for person_name in sorted(os.listdir(self.dataset_dir)):
+            person_dir = os.path.join(self.dataset_dir, person_name)
+            if not os.path.isdir(person_dir):
+                continue
+            for fname in os.listdir(person_dir):
+                if not fname.lower().endswith(IMAGE_EXTS):
+                    continue
+                path = os.path.join(person_dir, fname)
+                st = os.stat(path)
+                rel = f"{person_name}/{fname}"
+                found[rel] = (person_name, path, st.st_size, st.st_mtime_ns)
+        return found
+
+    # ---------------- update ----------------
+    def update(self):
+        """
+        Bring the store in sync with the dataset folder.
+        Returns {name: (k, 128) prototypes} for every person with at least
+        one face (k = 1 is the plain mean embedding).
+        """
+        key = {"model_sha1": file_sha1(self.model_path), "settings": self.settings}
+        records, image_embs, person_protos = self._load_store(key)
+        found = self._scan()
+
+        # content hash -> embedding, so renamed / copied files are not re-embedded
+        by_hash = {records[p]["sha1"]: image_embs.get(p) for p in records}
+
+        affected = set()
+        to_embed = []  # (rel_path, abs_path)
+
+        # deleted files
+        for rel in list(records):
+            if rel not in found:
+                affected.add(records[rel]["person"])
+                del records[rel]
+                image_embs.pop(rel, None)
+
+        # new or changed files
+        for rel, (person, path, size, mtime_ns) in found.items():
+            rec = records.get(rel)
+            if rec is not None and rec["size"] == size and rec["mtime_ns"] == mtime_ns:
+                continue
+
+            sha1 = file_sha1(path)
+            if rec is not None and rec["sha1"] == sha1:
+                # touched but identical content: keep the embedding
+                rec["mtime_ns"] = mtime_ns
+                continue
+
+            records[rel] = {"path": rel, "person": person, "size": size,
+                            "mtime_ns": mtime_ns, "sha1": sha1}
+            image_embs.pop(rel, None)
+            affected.add(person)
+
+            if sha1 in by_hash:
+                if by_hash[sha1] is not None:
+                    image_embs[rel] = by_hash[sha1]
+            else:
+                to_embed.append((rel, path))
+
+        if to_embed:
+            print(f"[INFO] Embedding {len(to_embed)} new or changed images "
+                  f"({len(found) - len(to_embed)} reused).")
+        self._embed_files(to_embed, image_embs)
+
+        # persons whose images did not change keep their stored prototypes
+        persons = sorted({rec["person"] for rec in records.values()})
+        for person in list(person_protos):
+            if person not in persons:
+                del person_protos[person]
+
+        for person in persons:
+            if person in person_protos and person not in affected:
+                continue
+            embs = self.person_embeddings(person, records, image_embs)
+            if len(embs) == 0:
+                person_protos.pop(person, None)
+                print(f"[WARN] No faces found for person '{person}', skipping.")
+                continue
+            person_protos[person] = select_prototypes(
+                embs, self.num_prototypes, self.prototype_method
+            )
+            print(f"[INFO] Updated '{person}' with {len(embs)} samples "
+                  f"({len(person_protos[person])} prototypes).")
+
+        self._save_store(key, records, image_embs, person_protos)
+        self._records = records
+        self._image_embs = image_embs
+        return {name: person_protos[name] for name in sorted(person_protos)}
+
+    @staticmethod
+    def person_embeddings(person, records, image_embs):
+        """(M, 128) per-image embeddings of one person."""
+        embs = [image_embs[p] for p in sorted(records)
+                if records[p]["person"] == person and p in image_embs]
+        return np.array(embs, dtype=np.float32).reshape(-1, EMB_DIM)
+
+    def image_embeddings(self):
+        """
+        {person: (M, 128) per-image embeddings} as of the last update().
+        Used by the benchmarks to try other prototype settings offline.
+        """
+        if not hasattr(self, "_records"):
+            self.update()
+        persons = sorted({rec["person"] for rec in self._records.values()})
+        return {p: self.person_embeddings(p, self._records, self._image_embs) for p in persons}
+
+    def _embed_files(self, files, image_embs):
+        """Detect + embed `files` in batches, writing into image_embs."""
+        for start in range(0, len(files), EMBED_BATCH_SIZE):
+            chunk = files[start:start + EMBED_BATCH_SIZE]
+            rels = []
+            crops = []
+            for rel, path in chunk:
+                img = cv2.imread(path)
+                if img is None:
+                    continue
+                face = self.crop_fn(img)
+                if face is None:
+                    continue
+                rels.append(rel)
+                crops.append(face)
+
+            if not crops:
+                continue
+            embs = self.embed_fn(crops)
+            for rel, emb in zip(rels, embs):
+                image_embs[rel] = np.asarray(emb, dtype=np.float32)
@@ -0,0 +1,159 @@
+import os
+
+import numpy as np
+
+# -------------------------------------------------
+# EMBEDDING INFERENCE BACKENDS
+# -------------------------------------------------
+# Every backend exposes embed(batch) -> (N, 128) float32 raw embeddings for a
+# preprocessed (N, 160, 160, 3) float32 batch, so app.py does not care
+# whether Keras, TFLite or ONNX Runtime does the math.
+#   keras  : the Dense(128) sub-model of face_cnn_mobilenetv2.h5
+#   tflite : models/face_embedding_<quant>.tflite (see export_embedding_model.py)
+#   onnx   : models/face_embedding_<quant>.onnx
+# The TFLite / ONNX runtimes are optional and imported only when used.
+
+BACKENDS = ("keras", "tflite", "onnx")
+# how the Keras backend is invoked:
+#   predict  : model.predict() - builds a data adapter + callbacks every call
+#   call     : model(x, training=False) - eager direct call
+#   function : tf.function traced once for a fixed (None, 160, 160, 3) signature
+KERAS_MODES = ("predict", "call", "function")
+
+
+def build_embedding_model(base_model):
+    """Cut a trained classifier at its 128-unit Dense layer."""
+    import tensorflow as tf
+
+    embedding_layer = None
+    for layer in reversed(base_model.layers):
+        # In Keras 3, Dense has 'units' instead of reliable 'output_shape' here
+        if isinstance(layer, tf.keras.layers.Dense) and getattr(layer, "units", None) == 128:
+            embedding_layer = layer
+            break
+
+    if embedding_layer is None:
+        raise RuntimeError(
+            "Could not find a 128-unit Dense layer for embeddings. "
+            "Make sure train_cnn.py uses Dense(128) before the final output layer."
+        )
+
+    return tf.keras.Model(inputs=base_model.input, outputs=embedding_layer.output)
+
+
+class KerasEmbedder:
+    name = "keras"
+
+    def __init__(self, embedding_model, mode="function"):
+        if mode not in KERAS_MODES:
+            raise ValueError(f"Unknown Keras mode '{mode}', use one of {KERAS_MODES}.")
+        self.model = embedding_model
+        self.mode = mode
+        self._fn = None
+
+        if mode == "function":
+            import tensorflow as tf
+
+            input_shape = [None] + list(embedding_model.input_shape[1:])
+            model = embedding_model
+
+            @tf.function(input_signature=[tf.TensorSpec(input_shape, tf.float32)])
+            def _embed(x):
+                return model(x, training=False)
+
+            self._fn = _embed
+
+    def embed(self, batch):
+        if self.mode == "predict":
+            out = self.model.predict(batch, verbose=0)
+        elif self.mode == "call":
+            out = self.model(np.asarray(batch, dtype=np.float32), training=False).numpy()
+        else:
+            out = self._fn(np.asarray(batch, dtype=np.float32)).numpy()
+        return np.asarray(out, dtype=np.float32)
+
+
+class TFLiteEmbedder:
+    name = "tflite"
+
+    def __init__(self, model_path, num_threads=None):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+
+        self.interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        self.input_detail = self.interpreter.get_input_details()[0]
+        self.output_detail = self.interpreter.get_output_details()[0]
+        self._batch_size = None
+
+    def _resize(self, n):
+        if n != self._batch_size:
+            shape = [n] + list(self.input_detail["shape"][1:])
+            self.interpreter.resize_tensor_input(self.input_detail["index"], shape)
+            self.interpreter.allocate_tensors()
+            self._batch_size = n
+
+    def embed(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        self._resize(len(batch))
+
+        # int8 models take quantized input / produce quantized output
+        in_dtype = self.input_detail["dtype"]
+        if in_dtype != np.float32:
+            scale, zero_point = self.input_detail["quantization"]
+            info = np.iinfo(in_dtype)
+            batch = np.clip(np.round(batch / scale + zero_point), info.min, info.max).astype(in_dtype)
+
+        self.interpreter.set_tensor(self.input_detail["index"], batch)
+        self.interpreter.invoke()
+        out = self.interpreter.get_tensor(self.output_detail["index"])
+
+        if self.output_detail["dtype"] != np.float32:
+            scale, zero_point = self.output_detail["quantization"]
+            out = (out.astype(np.float32) - zero_point) * scale
+        return np.asarray(out, dtype=np.float32)
+
+
+class OnnxEmbedder:
+    name = "onnx"
+
+    def __init__(self, model_path, num_threads=None):
+        import onnxruntime as ort
+
+        opts = ort.SessionOptions()
+        if num_threads:
+            opts.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(model_path, opts, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.input_type = self.session.get_inputs()[0].type
+
+    def embed(self, batch):
+        dtype = np.float16 if "float16" in self.input_type else np.float32
+        out = self.session.run(None, {self.input_name: np.asarray(batch, dtype=dtype)})[0]
+        return np.asarray(out, dtype=np.float32)
+
+
+def load_embedder(backend, keras_model_path=None, export_path=None, num_threads=None,
+                  keras_mode="function"):
+    """
+    Create the embedder for `backend`.
+    keras  -> loads keras_model_path and cuts it at Dense(128), see KERAS_MODES
+    tflite -> export_path (.tflite), onnx -> export_path (.onnx)
+    """
+    if backend == "keras":
+        import tensorflow as tf
+        base_model = tf.keras.models.load_model(keras_model_path)
+        return KerasEmbedder(build_embedding_model(base_model), keras_mode)
+
+    if export_path is None or not os.path.exists(export_path):
+        raise FileNotFoundError(
+            f"No exported model at {export_path}. Run: python src/export_embedding_model.py --format {backend}"
+        )
+    if backend == "tflite":
+        return TFLiteEmbedder(export_path, num_threads)
+    if backend == "onnx":
+        return OnnxEmbedder(export_path, num_threads)
+
+    raise ValueError(f"Unknown embedding backend '{backend}', use one of {BACKENDS}.")
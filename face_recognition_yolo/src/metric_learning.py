@@ -0,0 +1,118 @@
+import math
+
+import tensorflow as tf
+
+# -------------------------------------------------
+# METRIC-LEARNING LOSSES FOR THE 128-D EMBEDDING
+# -------------------------------------------------
+# train_cnn.py --loss arcface|cosface|triplet trains Dense(128) as a real
+# face embedding instead of a by-product of a softmax classifier:
+#
+#   backbone -> GAP -> Dropout -> Dense(128) -> UnitNormalization -> ...
+#     arcface / cosface : CosineClassifier -> additive_margin_loss
+#     triplet           : batch_hard_triplet_loss on the embeddings
+#
+# Only the part up to UnitNormalization is saved to face_cnn_mobilenetv2.h5,
+# so app.py still finds its Dense(128) layer and needs no custom objects.
+
+METRIC_LOSSES = ("arcface", "cosface", "triplet")
+
+ARCFACE_MARGIN = 0.5    # additive angle, radians
+COSFACE_MARGIN = 0.35   # subtracted from the target cosine
+MARGIN_SCALE = 30.0     # logits = scale * cosine
+TRIPLET_MARGIN = 0.3    # on distances between unit vectors (range 0..2)
+
+
+@tf.keras.utils.register_keras_serializable(package="face")
+class CosineClassifier(tf.keras.layers.Layer):
+    """
+    Cosine between unit-length embeddings and one learned, L2-normalized
+    centre per class -> (N, num_classes) in [-1, 1]. Always float32.
+    """
+
+    def __init__(self, num_classes, **kwargs):
+        kwargs["dtype"] = "float32"
+        super().__init__(**kwargs)
+        self.num_classes = num_classes
+
+    def build(self, input_shape):
+        self.centres = self.add_weight(
+            name="centres",
+            shape=(int(input_shape[-1]), self.num_classes),
+            initializer="glorot_uniform",
+            trainable=True,
+        )
+
+    def call(self, embeddings):
+        embeddings = tf.math.l2_normalize(tf.cast(embeddings, tf.float32), axis=1)
+        centres = tf.math.l2_normalize(self.centres, axis=0)
+        return tf.matmul(embeddings, centres)
+
+    def get_config(self):
+        config = super().get_config()
+        config.update({"num_classes": self.num_classes})
+        return config
+
+
+def additive_margin_loss(kind="arcface", margin=None, scale=MARGIN_SCALE):
+    """
+    Softmax cross-entropy on CosineClassifier output with a margin on the
+    true class: cos(theta + m) for ArcFace, cos(theta) - m for CosFace.
+    """
+    if kind not in ("arcface", "cosface"):
+        raise ValueError(f"Unknown margin loss '{kind}', use 'arcface' or 'cosface'.")
+    if margin is None:
+        margin = ARCFACE_MARGIN if kind == "arcface" else COSFACE_MARGIN
+
+    cos_m, sin_m = math.cos(margin), math.sin(margin)
+    # past theta = pi - m, cos(theta + m) stops decreasing: use CosFace-style penalty there
+    threshold = math.cos(math.pi - margin)
+    fallback = math.sin(math.pi - margin) * margin
+
+    def loss(y_true, cosine):
+        y_true = tf.cast(y_true, tf.float32)
+        cosine = tf.clip_by_value(tf.cast(cosine, tf.float32), -1.0 + 1e-7, 1.0 - 1e-7)
+        if kind == "arcface":
+            sine = tf.sqrt(1.0 - tf.square(cosine))
+            target = cosine * cos_m - sine * sin_m
+            target = tf.where(cosine > threshold, target, cosine - fallback)
+        else:
+            target = cosine - margin
+        logits = scale * (y_true * target + (1.0 - y_true) * cosine)
+        return tf.keras.losses.categorical_crossentropy(y_true, logits, from_logits=True)
+
+    loss.__name__ = f"{kind}_loss"
+    return loss
+
+
+def batch_hard_triplet_loss(margin=TRIPLET_MARGIN):
+    """
+    For every anchor in the batch: hardest positive (farthest same person)
+    vs hardest negative (closest other person). Anchors without a positive
+    or a negative in the batch are left out. Expects one-hot labels and
+    unit-length embeddings; batches should hold K images of P people.
+    """
+
+    def loss(y_true, embeddings):
+        labels = tf.argmax(y_true, axis=1)
+        embeddings = tf.cast(embeddings, tf.float32)
+
+        sim = tf.matmul(embeddings, embeddings, transpose_b=True)
+        dist = tf.sqrt(tf.maximum(2.0 - 2.0 * sim, 1e-12))
+
+        same = tf.equal(labels[:, None], labels[None, :])
+        not_self = tf.logical_not(tf.eye(tf.shape(labels)[0], dtype=tf.bool))
+        pos_mask = tf.cast(tf.logical_and(same, not_self), tf.float32)
+        neg_mask = tf.cast(tf.logical_not(same), tf.float32)
+
+        hardest_pos = tf.reduce_max(dist * pos_mask, axis=1)
+        # masked-out entries pushed beyond the largest possible distance (2)
+        hardest_neg = tf.reduce_min(dist + 4.0 * (1.0 - neg_mask), axis=1)
+
+        valid = tf.cast((tf.reduce_sum(pos_mask, axis=1) > 0) & (tf.reduce_sum(neg_mask, axis=1) > 0),
+                        tf.float32)
+        per_anchor = tf.nn.relu(hardest_pos - hardest_neg + margin) * valid
+        return tf.reduce_sum(per_anchor) / tf.maximum(tf.reduce_sum(valid), 1.0)
+
+    loss.__name__ = "batch_hard_triplet_loss"
+    return loss
@@ -0,0 +1,289 @@
+import time
+import argparse
+import threading
+
+import cv2
+
+import app
+from pipeline import CaptureThread, DropOldestQueue, ThroughputCounter
+
+# -------------------------------------------------
+# MULTI-CAMERA RECOGNITION WITH ONE SHARED MODEL
+# -------------------------------------------------
+#   camera 0 capture --(newest frame)--\
+#   camera 1 capture --(newest frame)---> one batched inference worker --> per-camera results
+#   camera N capture --(newest frame)--/
+#
+# One process, one copy of TensorFlow and the model. Each camera keeps only
+# its newest frame for the worker (drop-oldest, size 1), and a batch takes at
+# most one frame per camera, starting at a rotating camera, so a fast camera
+# can never crowd out a slow one: when the worker falls behind, every camera
+# loses its older frames at the same rate. Detection and tracking stay per
+# camera; the face crops of the whole batch go through the model in a single
+# embedding call.
+#
+#   python src/multi_camera.py 0 1 rtsp://10.0.0.12/stream
+#   python src/multi_camera.py 0 1 --no-display          # server mode, stats only
+
+BATCH_WAIT_MS = 5.0           # after the first frame, wait this long for other cameras
+MAX_FRAMES_PER_BATCH = None   # None = one frame from every camera
+STATS_EVERY_SEC = app.STATS_EVERY_SEC
+
+
+class NotifyingQueue(DropOldestQueue):
+    """DropOldestQueue that also wakes the shared worker on every put()."""
+
+    def __init__(self, signal, maxsize=1):
+        super().__init__(maxsize)
+        self.signal = signal
+
+    def put(self, item):
+        super().put(item)
+        self.signal.set()
+
+
+class Camera:
+    """One video source: capture thread, tracker, detector and latest results."""
+
+    def __init__(self, index, source, signal, track=True):
+        self.index = index
+        self.source = source
+        self.cap = cv2.VideoCapture(source)
+        self.stopped = threading.Event()
+
+        self.display_frames = DropOldestQueue(1)
+        self.infer_frames = NotifyingQueue(signal, 1)
+        self.capture = CaptureThread(self.cap, [self.display_frames, self.infer_frames],
+                                     self.stopped, app.PROFILER)
+
+        self.tracker = app.make_tracker() if track else None
+        self.detector = app.make_detector()
+
+        self.counter = ThroughputCounter()   # recognized frames per second
+        self.latest_results = []
+        self.window = f"{app.WINDOW_NAME} [{index}: {source}]"
+
+    def stats(self):
+        return {
+            "capture_fps": self.capture.counter.rate(),
+            "recognition_fps": self.counter.rate(),
+            "dropped": self.infer_frames.dropped,
+        }
+
+
+class BatchedInferenceWorker(threading.Thread):
+    """
+    Collects the newest frame of each camera into a batch, runs detection and
+    tracking per camera, then embeds every face crop of the batch at once.
+    """
+
+    def __init__(self, cameras, signal, stop_event, batch_wait_ms=BATCH_WAIT_MS,
+                 max_frames=MAX_FRAMES_PER_BATCH):
+        super().__init__(name="batched-inference", daemon=True)
+        self.cameras = cameras
+        self.signal = signal
+        self.stop_event = stop_event
+        self.batch_wait = batch_wait_ms / 1000.0
+        self.max_frames = max_frames or len(cameras)
+        self.next_camera = 0
+
+        self.batches = 0
+        self.frames = 0
+        self.faces_embedded = 0
+
+    def _collect(self, batch, taken):
+        """Take the newest frame of each camera not in the batch yet, round-robin."""
+        n = len(self.cameras)
+        for k in range(n):
+            if len(batch) >= self.max_frames:
+                break
+            cam = self.cameras[(self.next_camera + k) % n]
+            if cam.index in taken:
+                continue
+            item = cam.infer_frames.get(timeout=0)
+            if item is not None:
+                batch.append((cam, item[1]))
+                taken.add(cam.index)
+
+    def next_batch(self):
+        """[(camera, frame)], at most one frame per camera; [] on timeout."""
+        if not self.signal.wait(timeout=0.1):
+            return []
+        self.signal.clear()
+
+        batch = []
+        taken = set()
+        self._collect(batch, taken)
+        deadline = time.perf_counter() + self.batch_wait
+        while batch and len(batch) < self.max_frames and not self.stop_event.is_set():
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0 or not self.signal.wait(timeout=remaining):
+                break
+            self.signal.clear()
+            self._collect(batch, taken)
+
+        # the next batch starts with the camera after this one's first
+        self.next_camera = (self.next_camera + 1) % len(self.cameras)
+        return batch
+
+    def process_batch(self, batch):
+        plans = [(cam, app.plan_frame(frame, cam.tracker, cam.detector)) for cam, frame in batch]
+
+        crops = [plan.crops[i] for _, plan in plans for i in plan.todo]
+        matches = app.match_faces(crops)
+
+        start = 0
+        for cam, plan in plans:
+            end = start + len(plan.todo)
+            results = app.finish_frame(plan, matches[start:end], cam.tracker)
+            start = end
+
+            app.log_unknown_faces(results, source=cam.index)  # track ids restart per camera
+            cam.latest_results = results
+            cam.counter.tick()
+            app.PROFILER.frame_done()
+
+        self.batches += 1
+        self.frames += len(batch)
+        self.faces_embedded += len(crops)
+
+    def run(self):
+        while not self.stop_event.is_set():
+            batch = self.next_batch()
+            if not batch or not app.is_ready():
+                continue
+            self.process_batch(batch)
+
+
+class MultiCameraServer:
+    def __init__(self, sources, track=True, batch_wait_ms=BATCH_WAIT_MS):
+        self.stop_event = threading.Event()
+        self.signal = threading.Event()
+        self.cameras = [Camera(i, src, self.signal, track) for i, src in enumerate(sources)]
+        self.worker = BatchedInferenceWorker(self.cameras, self.signal, self.stop_event, batch_wait_ms)
+
+    def open_cameras(self):
+        """Drop sources that failed to open; returns the remaining cameras."""
+        for cam in self.cameras:
+            if not cam.cap.isOpened():
+                print(f"[WARN] Cannot open camera {cam.index} ({cam.source}), skipping.")
+        self.cameras[:] = [cam for cam in self.cameras if cam.cap.isOpened()]
+        return self.cameras
+
+    def start(self):
+        for cam in self.cameras:
+            cam.capture.start()
+        self.worker.start()
+
+    def running(self):
+        return not self.stop_event.is_set() and any(not cam.stopped.is_set() for cam in self.cameras)
+
+    def print_stats(self):
+        for cam in self.cameras:
+            print("[STATS] camera {} ({}): capture {capture_fps:.1f} fps, recognition "
+                  "{recognition_fps:.1f} fps, dropped {dropped}".format(cam.index, cam.source, **cam.stats()))
+        w = self.worker
+        if w.batches:
+            print(f"[STATS] worker: {w.batches} batches, {w.frames / w.batches:.2f} frames "
+                  f"and {w.faces_embedded / w.batches:.2f} embedded faces per batch")
+
+    def stop(self):
+        self.stop_event.set()
+        for cam in self.cameras:
+            cam.stopped.set()
+        for cam in self.cameras:
+            cam.capture.join(timeout=1.0)
+            cam.cap.release()
+        self.worker.join(timeout=2.0)
+
+
+def show_cameras(server, overlay=True):
+    """Draw each camera's newest frame with its newest results; False when 'q' was pressed."""
+    for cam in server.cameras:
+        item = cam.display_frames.get(timeout=0)
+        if item is None:
+            continue
+
+        view = item[1].copy()
+        if app.is_ready():
+            app.draw_results(view, cam.latest_results)
+        else:
+            app.draw_warming_up(view)
+
+        if overlay:
+            stats = cam.stats()
+            cv2.putText(
+                view,
+                f"cam {cam.index} | cap {stats['capture_fps']:.1f} | rec {stats['recognition_fps']:.1f} fps"
+                f" | dropped {stats['dropped']}",
+                (10, 20),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.5,
+                (255, 255, 0),
+                1,
+            )
+        cv2.imshow(cam.window, view)
+
+    key = cv2.waitKey(1) & 0xFF
+    return key != ord("q")
+
+
+def parse_source(text):
+    """'0' -> camera index 0, anything else is a file / stream URL."""
+    return int(text) if text.isdigit() else text
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recognize faces on several cameras with one shared model.")
+    parser.add_argument("sources", nargs="+", help="camera indices, video files or stream URLs")
+    parser.add_argument("--no-display", action="store_true", help="no windows, print stats only")
+    parser.add_argument("--no-tracking", action="store_true", help="re-embed every face on every frame")
+    parser.add_argument("--no-overlay", action="store_true", help="do not draw the per-camera FPS overlay")
+    parser.add_argument("--batch-wait-ms", type=float, default=BATCH_WAIT_MS,
+                        help="how long the worker waits for other cameras to fill a batch")
+    parser.add_argument("--metrics-file", default=None,
+                        help="append per-stage p50/p95 + FPS as JSON lines every few seconds")
+    args = parser.parse_args()
+
+    server = MultiCameraServer([parse_source(s) for s in args.sources],
+                               track=not args.no_tracking, batch_wait_ms=args.batch_wait_ms)
+    if not server.open_cameras():
+        print("[ERROR] No camera could be opened.")
+        return
+
+    app.start_warm_up()
+    server.start()
+    print(f"[INFO] {len(server.cameras)} camera(s) running. "
+          + ("Press Ctrl+C to stop." if args.no_display else "Press 'q' to quit."))
+
+    warm_state = {}
+    last_report = time.perf_counter()
+    try:
+        while server.running():
+            if not app.check_warm_up(warm_state):
+                break
+
+            if args.no_display:
+                time.sleep(0.1)
+            elif not show_cameras(server, overlay=not args.no_overlay):
+                break
+
+            now = time.perf_counter()
+            if now - last_report >= STATS_EVERY_SEC:
+                last_report = now
+                server.print_stats()
+                if app.is_ready():
+                    app.report_profile(warm_state, args.metrics_file, force=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+    server.print_stats()
+    app.UNKNOWN_LOGGER.close()
+    if not args.no_display:
+        cv2.destroyAllWindows()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+import time
+import queue
+import threading
+from collections import deque
+
+# -------------------------------------------------
+# THREADED CAPTURE / INFERENCE / DISPLAY PIPELINE
+# -------------------------------------------------
+#   capture thread --(latest frame)--> display (main thread, camera rate)
+#                  \-(latest frame)--> inference worker --(latest result)--> display
+#
+# Queues are small and drop the OLDEST item when full, so a slow stage always
+# works on the newest frame instead of falling further and further behind.
+
+
+class DropOldestQueue:
+    """Bounded queue whose put() never blocks: it discards the oldest item."""
+
+    def __init__(self, maxsize=1):
+        self._q = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def put(self, item):
+        with self._lock:
+            while True:
+                try:
+                    self._q.put_nowait(item)
+                    return
+                except queue.Full:
+                    try:
+                        self._q.get_nowait()
+                        self.dropped += 1
+                    except queue.Empty:
+                        pass
+
+    def get(self, timeout=None):
+        """Next item, or None after `timeout` seconds."""
+        try:
+            return self._q.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class ThroughputCounter:
+    """Events per second over a sliding window (thread-safe)."""
+
+    def __init__(self, window=2.0):
+        self.window = window
+        self.total = 0
+        self._times = deque()
+        self._lock = threading.Lock()
+
+    def tick(self):
+        now = time.perf_counter()
+        with self._lock:
+            self.total += 1
+            self._times.append(now)
+            cutoff = now - self.window
+            while self._times and self._times[0] < cutoff:
+                self._times.popleft()
+
+    def rate(self):
+        with self._lock:
+            if len(self._times) < 2:
+                return 0.0
+            span = self._times[-1] - self._times[0]
+            return (len(self._times) - 1) / span if span > 0 else 0.0
+
+
+class CaptureThread(threading.Thread):
+    """Reads frames from a cv2.VideoCapture and fans them out to `outputs`."""
+
+    def __init__(self, cap, outputs, stop_event, profiler=None):
+        super().__init__(name="capture", daemon=True)
+        self.cap = cap
+        self.outputs = outputs
+        self.stop_event = stop_event
+        self.profiler = profiler
+        self.counter = ThroughputCounter()
+        self.frame_id = 0
+
+    def run(self):
+        while not self.stop_event.is_set():
+            start = time.perf_counter()
+            ret, frame = self.cap.read()
+            if self.profiler is not None:
+                self.profiler.record("capture", time.perf_counter() - start)
+            if not ret:
+                self.stop_event.set()
+                break
+            self.frame_id += 1
+            self.counter.tick()
+            for out in self.outputs:
+                out.put((self.frame_id, frame))
+
+
+class InferenceThread(threading.Thread):
+    """
+    Runs process_fn(frame) -> results on the newest captured frame and
+    publishes (frame_id, results) to `output`.
+    """
+
+    def __init__(self, process_fn, frames, output, stop_event):
+        super().__init__(name="inference", daemon=True)
+        self.process_fn = process_fn
+        self.frames = frames
+        self.output = output
+        self.stop_event = stop_event
+        self.counter = ThroughputCounter()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            item = self.frames.get(timeout=0.1)
+            if item is None:
+                continue
+            frame_id, frame = item
+            results = self.process_fn(frame)
+            self.counter.tick()
+            self.output.put((frame_id, results))
+
+
+class RecognitionPipeline:
+    """
+    Wires the capture and inference threads together. The display stage runs
+    on the caller's thread (OpenCV GUI calls must stay on the main thread).
+    With a profiling.FrameProfiler, cap.read() time is recorded as "capture".
+
+        pipe = RecognitionPipeline(cap, process_fn)
+        pipe.start()
+        while pipe.running():
+            frame, results = pipe.next_display(timeout=0.5)
+            ...
+            pipe.display_counter.tick()
+        pipe.stop()
+    """
+
+    def __init__(self, cap, process_fn, queue_size=1, profiler=None):
+        self.stop_event = threading.Event()
+        self.display_frames = DropOldestQueue(queue_size)
+        self.infer_frames = DropOldestQueue(queue_size)
+        self.results = DropOldestQueue(queue_size)
+
+        self.capture = CaptureThread(cap, [self.display_frames, self.infer_frames], self.stop_event,
+                                     profiler)
+        self.inference = InferenceThread(process_fn, self.infer_frames, self.results, self.stop_event)
+        self.display_counter = ThroughputCounter()
+        self.latest_results = []
+        self.latest_result_id = 0
+
+    def start(self):
+        self.capture.start()
+        self.inference.start()
+
+    def running(self):
+        return not self.stop_event.is_set()
+
+    def next_display(self, timeout=0.5):
+        """
+        Newest captured frame plus the newest recognition results.
+        Results may belong to a slightly older frame; they are reused until
+        the worker publishes new ones. Returns (None, results) on timeout.
+        """
+        item = self.display_frames.get(timeout=timeout)
+
+        while True:
+            res = self.results.get(timeout=0)
+            if res is None:
+                break
+            self.latest_result_id, self.latest_results = res
+
+        if item is None:
+            return None, self.latest_results
+        return item[1], self.latest_results
+
+    def stats(self):
+        """Per-stage throughput (frames/s) and dropped-frame counts."""
+        return {
+            "capture_fps": self.capture.counter.rate(),
+            "inference_fps": self.inference.counter.rate(),
+            "display_fps": self.display_counter.rate(),
+            "dropped_display": self.display_frames.dropped,
+            "dropped_inference": self.infer_frames.dropped,
+        }
+
+    def stop(self):
+        self.stop_event.set()
+        self.capture.join(timeout=1.0)
+        self.inference.join(timeout=2.0)
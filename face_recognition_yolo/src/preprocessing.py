@@ -0,0 +1,62 @@
+import threading
+
+import cv2
+import numpy as np
+
+# -------------------------------------------------
+# FUSED FACE PREPROCESSING INTO A REUSED BATCH BUFFER
+# -------------------------------------------------
+# Every face of a frame is written straight into one preallocated
+# (N, 160, 160, 3) float32 batch:
+#   1. cv2.resize into a reused uint8 slot (no new array)
+#   2. one numpy pass that swaps BGR -> RGB (reversed channel view) and
+#      scales to [0, 1] directly into the float32 batch slot
+# MobileNetV2 was trained on RGB (ImageDataGenerator loads images with PIL),
+# while OpenCV crops are BGR, so the channel swap is part of the contract.
+
+SCALE = np.float32(1.0 / 255.0)
+
+
+class FaceBatchBuffer:
+    """Grow-only batch buffer; fill() returns a view valid until the next fill()."""
+
+    def __init__(self, img_size=160, capacity=8, rgb=True):
+        self.img_size = img_size
+        self.rgb = rgb
+        self._alloc(capacity)
+
+    def _alloc(self, capacity):
+        s = self.img_size
+        self.capacity = capacity
+        self.batch = np.empty((capacity, s, s, 3), dtype=np.float32)
+        self._resized = np.empty((capacity, s, s, 3), dtype=np.uint8)
+
+    def fill(self, crops):
+        n = len(crops)
+        if n > self.capacity:
+            self._alloc(max(n, 2 * self.capacity))
+
+        size = (self.img_size, self.img_size)
+        for i, crop in enumerate(crops):
+            resized = self._resized[i]
+            cv2.resize(crop, size, dst=resized)
+            src = resized[:, :, ::-1] if self.rgb else resized
+            np.multiply(src, SCALE, out=self.batch[i], dtype=np.float32)
+
+        return self.batch[:n]
+
+
+_local = threading.local()
+
+
+def preprocess_faces(crops, img_size=160, rgb=True):
+    """
+    Preprocess BGR face crops into this thread's reused (N, S, S, 3) buffer.
+    The returned array is overwritten by the next call on the same thread;
+    copy it if it must outlive that.
+    """
+    buf = getattr(_local, "buffer", None)
+    if buf is None or buf.img_size != img_size or buf.rgb != rgb:
+        buf = FaceBatchBuffer(img_size, rgb=rgb)
+        _local.buffer = buf
+    return buf.fill(crops)
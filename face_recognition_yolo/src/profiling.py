@@ -0,0 +1,107 @@
+import json
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+from pipeline import ThroughputCounter
+
+# -------------------------------------------------
+# PER-STAGE LATENCY PROFILING
+# -------------------------------------------------
+# Every stage of the recognition loop records its duration into a rolling
+# window of the last `window` samples; p50 / p95 are computed from that
+# window on demand (overlay, [PROFILE] lines, metrics file).
+#
+#   with PROFILER.stage("detect"):
+#       faces = detector.detect(frame)
+#   PROFILER.frame_done()
+
+STAGES = ("capture", "detect", "preprocess", "embed", "match", "draw", "log")
+
+
+class RollingHistogram:
+    """Last `window` latency samples in milliseconds (thread-safe)."""
+
+    def __init__(self, window=300):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def add(self, ms):
+        with self._lock:
+            self._samples.append(ms)
+            self.count += 1
+
+    def summary(self):
+        """{"p50", "p95", "mean", "max", "count"} in ms over the window (None if empty)."""
+        with self._lock:
+            if not self._samples:
+                return None
+            samples = np.fromiter(self._samples, dtype=np.float64, count=len(self._samples))
+            count = self.count
+        p50, p95 = np.percentile(samples, (50, 95))
+        return {
+            "p50": float(p50),
+            "p95": float(p95),
+            "mean": float(samples.mean()),
+            "max": float(samples.max()),
+            "count": count,
+        }
+
+
+class FrameProfiler:
+    """Rolling latency histograms per stage plus the processed-frame rate."""
+
+    def __init__(self, stages=STAGES, window=300, enabled=True):
+        self.window = window
+        self.enabled = enabled
+        self.histograms = {name: RollingHistogram(window) for name in stages}
+        self.fps = ThroughputCounter()
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        if not self.enabled:
+            return
+        hist = self.histograms.get(name)
+        if hist is None:
+            with self._lock:
+                hist = self.histograms.setdefault(name, RollingHistogram(self.window))
+        hist.add(seconds * 1000.0)
+
+    @contextmanager
+    def stage(self, name):
+        """Time the body of a `with` block as one sample of `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def frame_done(self):
+        self.fps.tick()
+
+    def summary(self):
+        """{"fps": float, "stages": {name: summary}} for stages with samples."""
+        stages = {}
+        for name, hist in list(self.histograms.items()):
+            s = hist.summary()
+            if s is not None:
+                stages[name] = s
+        return {"fps": self.fps.rate(), "stages": stages}
+
+    def format_lines(self):
+        """One 'stage  p50 / p95 ms' line per stage, for the overlay and the console."""
+        summary = self.summary()
+        lines = [f"{summary['fps']:.1f} fps"]
+        for name, s in summary["stages"].items():
+            lines.append(f"{name:<10} {s['p50']:6.1f} / {s['p95']:6.1f} ms")
+        return lines
+
+    def dump(self, path):
+        """Append the current summary as one JSON line to `path`."""
+        record = {"time": time.time(), **self.summary()}
+        with open(path, "a") as f:
+            f.write(json.dumps(record) + "\n")
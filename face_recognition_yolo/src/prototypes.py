@@ -0,0 +1,80 @@
+import numpy as np
+
+# -------------------------------------------------
+# PROTOTYPE SELECTION
+# -------------------------------------------------
+# Instead of collapsing a person to one mean embedding, keep k unit-length
+# prototypes that cover different poses / lighting. Matching then takes
+# the max similarity over a person's prototypes (see face_index.py).
+
+PROTOTYPE_METHODS = ("kmeans", "fps")
+
+
+def _normalize_rows(x):
+    return x / (np.linalg.norm(x, axis=1, keepdims=True) + 1e-10)
+
+
+def mean_prototype(embs):
+    """The old behaviour: one normalized mean embedding, shape (1, D)."""
+    return _normalize_rows(np.mean(embs, axis=0, keepdims=True))
+
+
+def farthest_point_prototypes(embs, k):
+    """
+    Farthest-point sampling: start from the sample closest to the mean,
+    then repeatedly add the sample least similar to everything chosen so far.
+    """
+    start = int(np.argmax(embs @ mean_prototype(embs)[0]))
+    chosen = [start]
+    best_sim = embs @ embs[start]  # similarity to the nearest chosen point
+
+    for _ in range(1, k):
+        nxt = int(np.argmin(best_sim))
+        chosen.append(nxt)
+        best_sim = np.maximum(best_sim, embs @ embs[nxt])
+
+    return embs[chosen].copy()
+
+
+def kmeans_prototypes(embs, k, iters=20):
+    """
+    Spherical k-means (cosine distance) with farthest-point initialization.
+    Returns k normalized cluster centres.
+    """
+    centres = farthest_point_prototypes(embs, k)
+
+    for _ in range(iters):
+        assign = np.argmax(embs @ centres.T, axis=1)
+        new_centres = np.zeros_like(centres)
+        np.add.at(new_centres, assign, embs)
+
+        # keep the old centre for clusters that lost all their members
+        empty = np.bincount(assign, minlength=k) == 0
+        new_centres[empty] = centres[empty]
+        new_centres = _normalize_rows(new_centres)
+
+        if np.allclose(new_centres, centres, atol=1e-6):
+            break
+        centres = new_centres
+
+    return centres
+
+
+def select_prototypes(embs, k=1, method="kmeans"):
+    """
+    Pick up to k prototypes from one person's (M, D) training embeddings.
+    k=1 gives the normalized mean, exactly like the single-vector database.
+    """
+    embs = _normalize_rows(np.asarray(embs, dtype=np.float32).reshape(len(embs), -1))
+
+    if k <= 1:
+        return mean_prototype(embs).astype(np.float32)
+    if len(embs) <= k:
+        return embs.copy()
+
+    if method == "kmeans":
+        return kmeans_prototypes(embs, k).astype(np.float32)
+    if method == "fps":
+        return farthest_point_prototypes(embs, k).astype(np.float32)
+
+    raise ValueError(f"Unknown prototype method '{method}', use one of {PROTOTYPE_METHODS}.")
@@ -1,10 +1,20 @@
+import time
+
+_T_IMPORT = time.perf_counter()
+
 import os
 import json
+import threading
 from datetime import datetime
 
 import cv2
 import numpy as np
-import tensorflow as tf
+
+from face_db_cache import load_or_build_face_db
+from incremental_index import IncrementalFaceIndexer
+from inference_backends import load_embedder
+from preprocessing import preprocess_faces
+from unknown_logger import UnknownFaceLogger
 
 # -------------------------------------------------
 # PATHS (relative to project root)
@@ -21,137 +31,179 @@ os.makedirs(SCREENSHOT_DIR, exist_ok=True)
 
 MODEL_PATH = os.path.join(MODELS_DIR, "face_cnn_mobilenetv2.h5")
 CLASS_INDICES_PATH = os.path.join(MODELS_DIR, "class_indices.json")
+# cached face database (face_db.npy + face_db.json), next to the model
+FACE_DB_CACHE_PREFIX = os.path.join(MODELS_DIR, "face_db")
 
 # -------------------------------------------------
 # SETTINGS
 # -------------------------------------------------
 IMG_SIZE = 160
+KERAS_MODE = "function"  # how the Keras model is invoked, see inference_backends.KERAS_MODES
 
 # cosine similarity in [0,1]; closer to 1 → more similar
 SIM_THRESHOLD = 0.65  # if best similarity < this => Unknown
 
+# Prototypes kept per person in the face database (1 = single mean embedding).
+# With k > 1, matching takes the max similarity over a person's prototypes.
+NUM_PROTOTYPES = 1
+PROTOTYPE_METHOD = "kmeans"   # "kmeans" or "fps" (farthest-point sampling)
+
 # OpenCV Haar cascade for face detection
 HAAR_PATH = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
-face_cascade = cv2.CascadeClassifier(HAAR_PATH)
 
 # -------------------------------------------------
-# LOAD CNN MODEL + CREATE EMBEDDING MODEL
+# LAZY LOADING (model, classes, cascade, face database)
 # -------------------------------------------------
-print("[INFO] Loading CNN face recognition model...")
-base_model = tf.keras.models.load_model(MODEL_PATH)
-
-# Find the 128-unit Dense layer to use as embedding output
-embedding_layer = None
-for layer in reversed(base_model.layers):
-    # In Keras 3, Dense has 'units' instead of reliable 'output_shape' here
-    if isinstance(layer, tf.keras.layers.Dense) and getattr(layer, "units", None) == 128:
-        embedding_layer = layer
-        break
-
-if embedding_layer is None:
-    raise RuntimeError("Could not find a 128-unit Dense layer for embeddings. "
-                       "Make sure train_cnn.py uses Dense(128) before the final output layer.")
-
-embedding_model = tf.keras.Model(
-    inputs=base_model.input,
-    outputs=embedding_layer.output
-)
+# Nothing heavy happens at import time: TensorFlow is imported and the model
+# loaded on first use. main() opens the camera first and runs warm_up() in a
+# background thread, showing a "warming up" overlay until it finishes.
+STARTUP_TIMES = {}
+_LOAD_LOCK = threading.RLock()
+_loaded = {}
+_warmup_done = threading.Event()
+_warmup_error = []
+
+
+def _lazy(name, loader):
+    """Create a resource once, recording how long the loader took."""
+    if name not in _loaded:
+        with _LOAD_LOCK:
+            if name not in _loaded:
+                start = time.perf_counter()
+                _loaded[name] = loader()
+                STARTUP_TIMES[name] = time.perf_counter() - start
+    return _loaded[name]
+
+
+def _load_embedder():
+    # same Dense(128) cut and traced call as app.py (inference_backends.py)
+    print("[INFO] Loading CNN face recognition model...")
+    return load_embedder("keras", keras_model_path=MODEL_PATH, keras_mode=KERAS_MODE)
+
+
+def _load_class_indices():
+    # (Optional) load mapping just for reference / debugging
+    with open(CLASS_INDICES_PATH, "r") as f:
+        class_indices = json.load(f)
+    idx2class = {v: k for k, v in class_indices.items()}
+    print("[INFO] Known classes (from training):", idx2class)
+    return idx2class
+
+
+def get_face_cascade():
+    return _lazy("cascade", lambda: cv2.CascadeClassifier(HAAR_PATH))
+
+
+def get_embedder():
+    return _lazy("model", _load_embedder)
+
 
-# (Optional) load mapping just for reference / debugging
-with open(CLASS_INDICES_PATH, "r") as f:
-    class_indices = json.load(f)
-idx2class = {v: k for k, v in class_indices.items()}
-print("[INFO] Known classes (from training):", idx2class)
+def get_face_db():
+    return _lazy("face_db", _load_face_db)
+
+
+def warm_up():
+    """Load the cascade, model, class names and face database, in that order."""
+    try:
+        get_face_cascade()
+        get_embedder()
+        _lazy("class_indices", _load_class_indices)
+        get_face_db()
+    except Exception as exc:  # reported by the main loop
+        _warmup_error.append(exc)
+    finally:
+        _warmup_done.set()
+
+
+def print_startup_report():
+    print("[STARTUP] Phase timings:")
+    for phase, secs in STARTUP_TIMES.items():
+        print(f"[STARTUP]   {phase:<18} {secs * 1000.0:9.1f} ms")
+
+
+STARTUP_TIMES["imports"] = time.perf_counter() - _T_IMPORT
 
 # -------------------------------------------------
 # HELPER FUNCTIONS
 # -------------------------------------------------
 def preprocess_face(face_img):
-    """Resize and normalize cropped face for embedding model."""
-    face_resized = cv2.resize(face_img, (IMG_SIZE, IMG_SIZE))
-    face_resized = face_resized.astype("float32") / 255.0
-    face_resized = np.expand_dims(face_resized, axis=0)  # (1, H, W, 3)
-    return face_resized
+    """Resize, BGR -> RGB and normalize cropped face for embedding model."""
+    return preprocess_faces([face_img], IMG_SIZE).copy()  # (1, H, W, 3)
 
 
 def get_embedding(face_img):
     """Get 128-d normalized embedding vector for a face."""
-    inp = preprocess_face(face_img)
-    emb = embedding_model.predict(inp, verbose=0)[0]  # (128,)
-    norm = np.linalg.norm(emb) + 1e-10
-    return emb / norm
+    return get_embeddings([face_img])[0]
+
+
+def get_embeddings(face_imgs):
+    """Batched get_embedding(): one model call for N faces -> (N, 128)."""
+    batch = preprocess_faces(face_imgs, IMG_SIZE)
+    embs = get_embedder().embed(batch)
+    norms = np.linalg.norm(embs, axis=1, keepdims=True) + 1e-10
+    return embs / norms
 
 
 def cosine_similarity(a, b):
     return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b) + 1e-10))
 
 
-def log_unknown_face(face_img, best_sim):
-    ts = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-    img_path = os.path.join(LOG_DIR, f"unknown_{ts}.jpg")
-    cv2.imwrite(img_path, face_img)
+# background writer for logs/unknown_faces (see unknown_logger.py), so the
+# frame loop never writes to disk
+UNKNOWN_LOGGER = UnknownFaceLogger(LOG_DIR)
 
-    log_file = os.path.join(LOG_DIR, "unknown_log.txt")
-    with open(log_file, "a") as f:
-        f.write(f"{ts}, best_sim={best_sim:.4f}, file={img_path}\n")
+
+def log_unknown_face(face_img, best_sim, box=None):
+    """Queue an unknown face for the background logger (never blocks)."""
+    UNKNOWN_LOGGER.submit(face_img, best_sim, box=box)
 
 
 # -------------------------------------------------
 # BUILD FACE DATABASE FROM TRAIN IMAGES
 # -------------------------------------------------
+def crop_largest_face(img):
+    """Detect faces in a BGR image and return the largest crop (or None)."""
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    faces = get_face_cascade().detectMultiScale(
+        gray,
+        scaleFactor=1.1,
+        minNeighbors=5,
+        minSize=(60, 60),
+    )
+
+    if len(faces) == 0:
+        return None
+
+    # Take the largest detected face (if multiple)
+    faces = sorted(faces, key=lambda b: b[2] * b[3], reverse=True)
+    (x, y, w, h) = faces[0]
+    return img[y:y + h, x:x + w]
+
+
+# Per-image embeddings live in models/face_db_images.npz/.json, so adding
+# one photo to dataset_faces/train/<person>/ embeds only that photo.
+FACE_DB_INDEXER = IncrementalFaceIndexer(
+    DATASET_TRAIN_DIR,
+    FACE_DB_CACHE_PREFIX + "_images",
+    MODEL_PATH,
+    crop_fn=crop_largest_face,
+    embed_fn=get_embeddings,
+    settings={"img_size": IMG_SIZE, "color": "rgb"},
+    num_prototypes=NUM_PROTOTYPES,
+    prototype_method=PROTOTYPE_METHOD,
+)
+
+
 def build_face_database():
     """
     For each person folder in dataset_faces/train,
-    compute average embedding vector from all images.
-    Returns: dict{name: embedding_vector}
+    compute average embedding vector (or NUM_PROTOTYPES prototypes) from all images.
+    Only new or changed images are embedded; unchanged persons keep
+    their stored prototypes (see incremental_index.py).
+    Returns: dict{name: (k, 128) embeddings}
     """
     print("[INFO] Building face database from training images...")
-    face_db = {}
-    exts = (".jpg", ".jpeg", ".png", ".bmp")
-
-    for person_name in sorted(os.listdir(DATASET_TRAIN_DIR)):
-        person_dir = os.path.join(DATASET_TRAIN_DIR, person_name)
-        if not os.path.isdir(person_dir):
-            continue
-
-        embeddings = []
-        for fname in os.listdir(person_dir):
-            if not fname.lower().endswith(exts):
-                continue
-
-            img_path = os.path.join(person_dir, fname)
-            img = cv2.imread(img_path)
-            if img is None:
-                continue
-
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            faces = face_cascade.detectMultiScale(
-                gray,
-                scaleFactor=1.1,
-                minNeighbors=5,
-                minSize=(60, 60),
-            )
-
-            if len(faces) == 0:
-                continue
-
-            # Take the largest detected face (if multiple)
-            faces = sorted(faces, key=lambda b: b[2] * b[3], reverse=True)
-            (x, y, w, h) = faces[0]
-            face_color = img[y:y + h, x:x + w]
-
-            emb = get_embedding(face_color)
-            embeddings.append(emb)
-
-        if len(embeddings) == 0:
-            print(f"[WARN] No faces found for person '{person_name}', skipping.")
-            continue
-
-        mean_emb = np.mean(embeddings, axis=0)
-        # normalize mean embedding too
-        mean_emb = mean_emb / (np.linalg.norm(mean_emb) + 1e-10)
-        face_db[person_name] = mean_emb
-        print(f"[INFO] Added '{person_name}' with {len(embeddings)} samples.")
+    face_db = FACE_DB_INDEXER.update()
 
     if not face_db:
         print("[ERROR] Face database is empty! Check your dataset.")
@@ -161,7 +213,16 @@ def build_face_database():
     return face_db
 
 
-FACE_DB = build_face_database()
+def _load_face_db():
+    # Loads models/face_db.npy when the model and dataset are unchanged,
+    # otherwise rebuilds from dataset_faces/train and refreshes the cache.
+    return load_or_build_face_db(
+        build_face_database,
+        MODEL_PATH,
+        DATASET_TRAIN_DIR,
+        FACE_DB_CACHE_PREFIX,
+        settings={"img_size": IMG_SIZE, "color": "rgb", "prototypes": NUM_PROTOTYPES, "method": PROTOTYPE_METHOD},
+    )
 
 
 # -------------------------------------------------
@@ -169,22 +230,15 @@ FACE_DB = build_face_database()
 # -------------------------------------------------
 def recognize_face(face_img):
     """
-    Compute embedding for face_img and compare with all persons in FACE_DB.
+    Compute embedding for face_img and compare with all persons in the face database.
     Returns (label, best_sim).
     """
-    if not FACE_DB:
+    face_db = get_face_db()
+    if len(face_db) == 0:
         return "Unknown", 0.0
 
     emb = get_embedding(face_img)
-
-    best_name = None
-    best_sim = -1.0
-
-    for name, ref_emb in FACE_DB.items():
-        sim = cosine_similarity(emb, ref_emb)
-        if sim > best_sim:
-            best_sim = sim
-            best_name = name
+    best_name, best_sim, _ = face_db.match(emb[np.newaxis])[0]
 
     # Decide if it is known or unknown
     if best_sim < SIM_THRESHOLD:
@@ -197,28 +251,54 @@ def recognize_face(face_img):
 # MAIN LOOP
 # -------------------------------------------------
 def main():
+    start = time.perf_counter()
     cap = cv2.VideoCapture(0)
+    STARTUP_TIMES["camera_open"] = time.perf_counter() - start
 
     if not cap.isOpened():
         print("[ERROR] Cannot open webcam.")
         return
 
+    # load the model and face database while the camera is already showing
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
     print("[INFO] Press 'q' to quit, 's' to save screenshot.")
     print(f"[INFO] Similarity threshold for known faces: {SIM_THRESHOLD}")
 
+    reported = False
     while True:
         ret, frame = cap.read()
         if not ret:
             break
 
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if _warmup_done.is_set() and not reported:
+            reported = True
+            if _warmup_error:
+                print(f"[ERROR] Startup failed: {_warmup_error[0]}")
+                break
+            STARTUP_TIMES["ready_after_start"] = time.perf_counter() - _T_IMPORT
+            print_startup_report()
 
-        faces = face_cascade.detectMultiScale(
-            gray,
-            scaleFactor=1.1,
-            minNeighbors=5,
-            minSize=(60, 60),
-        )
+        if not _warmup_done.is_set():
+            cv2.putText(
+                frame,
+                "Warming up... (loading model and face database)",
+                (10, frame.shape[0] - 15),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.6,
+                (0, 255, 255),
+                2,
+            )
+            faces = []
+        else:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+            faces = get_face_cascade().detectMultiScale(
+                gray,
+                scaleFactor=1.1,
+                minNeighbors=5,
+                minSize=(60, 60),
+            )
 
         for (x, y, w, h) in faces:
             x1, y1 = x, y
@@ -229,6 +309,9 @@ def main():
                 continue
 
             label, sim = recognize_face(face_color)
+            if label == "Unknown":
+                # before drawing: submit() copies the crop, the box is drawn into the frame
+                log_unknown_face(face_color, sim, (x1, y1, x2, y2))
 
             color = (0, 255, 0) if label != "Unknown" else (0, 0, 255)
 
@@ -244,10 +327,9 @@ def main():
                 2,
             )
 
-            if label == "Unknown":
-                log_unknown_face(face_color, sim)
-
         cv2.imshow("Real-Time Face Recognition (Embedding + NN)", frame)
+        if "first_window" not in STARTUP_TIMES:
+            STARTUP_TIMES["first_window"] = time.perf_counter() - _T_IMPORT
         key = cv2.waitKey(1) & 0xFF
 
         if key == ord("q"):
@@ -259,6 +341,7 @@ def main():
             print("[INFO] Screenshot saved:", path)
 
     cap.release()
+    UNKNOWN_LOGGER.close()
     cv2.destroyAllWindows()
 
 
@@ -0,0 +1,327 @@
+import os
+import json
+import time
+import socket
+import argparse
+import threading
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+from urllib.parse import urlparse, parse_qs
+
+import cv2
+import numpy as np
+
+import app
+from detection import HaarFaceDetector
+from profiling import RollingHistogram
+
+# -------------------------------------------------
+# LOCAL "WHO IS THIS FACE" SERVICE WITH MICRO-BATCHING
+# -------------------------------------------------
+# HTTP over TCP (default 127.0.0.1:8765) or a Unix socket (--unix PATH).
+#
+#   POST /recognize              body = JPEG/PNG bytes of a face crop
+#   POST /recognize?mode=frame   body = whole frame; faces are detected first
+#   GET  /health                 readiness + batching statistics
+#
+# Response:
+#   {"faces": [{"box": [x1, y1, x2, y2], "label": "alice", "sim": 0.91,
+#               "second": 0.42, "margin": 0.49}], "latency_ms": 7.3}
+#
+# Request threads decode and detect in parallel, then hand their crops to a
+# MicroBatcher: it collects crops from concurrent requests for up to
+# --max-wait-ms (or until --max-batch crops) and runs the embedding model
+# once for all of them.
+#
+#   python src/recognition_service.py --port 8765
+#   python src/recognition_service.py --unix /tmp/face.sock --max-wait-ms 3
+
+HOST = "127.0.0.1"
+PORT = 8765
+MAX_BATCH = 32
+MAX_WAIT_MS = 5.0
+MAX_BODY_BYTES = 20 * 1024 * 1024
+
+
+class MicroBatcher:
+    """
+    Runs batch_fn(items) -> results on items submitted by many threads.
+    A batch is closed when it holds `max_batch` items or `max_wait_ms`
+    passed since its first item arrived.
+    """
+
+    def __init__(self, batch_fn, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS):
+        self.batch_fn = batch_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._pending = []            # [(items, future)]
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+
+        self.batch_sizes = RollingHistogram(window=1000)
+        self.batch_latency = RollingHistogram(window=1000)
+        self.batches = 0
+        self.items = 0
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._thread.join(timeout=2.0)
+
+    def submit(self, items):
+        """Blocks until the batch containing `items` ran; returns their results."""
+        if not items:
+            return []
+        future = Future()
+        with self._cond:
+            self._pending.append((items, future))
+            self._cond.notify_all()
+        return future.result()
+
+    def _pending_items(self):
+        return sum(len(items) for items, _ in self._pending)
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._pending and not self._stopped:
+                self._cond.wait()
+            if self._stopped:
+                return []
+
+            deadline = time.perf_counter() + self.max_wait
+            while self._pending_items() < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0 or self._stopped:
+                    break
+                self._cond.wait(timeout=remaining)
+
+            # whole requests only; a request larger than max_batch runs alone
+            batch = [self._pending.pop(0)]
+            count = len(batch[0][0])
+            while self._pending and count + len(self._pending[0][0]) <= self.max_batch:
+                count += len(self._pending[0][0])
+                batch.append(self._pending.pop(0))
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+
+            items = [item for request_items, _ in batch for item in request_items]
+            start = time.perf_counter()
+            try:
+                results = self.batch_fn(items)
+            except Exception as exc:
+                for _, future in batch:
+                    future.set_exception(exc)
+                continue
+            self.batch_latency.add((time.perf_counter() - start) * 1000.0)
+            self.batch_sizes.add(len(items))
+            self.batches += 1
+            self.items += len(items)
+
+            pos = 0
+            for request_items, future in batch:
+                future.set_result(results[pos:pos + len(request_items)])
+                pos += len(request_items)
+
+
+# -------------------------------------------------
+# RECOGNITION
+# -------------------------------------------------
+_local = threading.local()
+
+
+def _detector():
+    """
+    Haar: one cascade per request thread (detectMultiScale is not shared).
+    YOLO: app's shared network, which serializes its own forward passes.
+    """
+    if app.DETECTOR_BACKEND != "haar":
+        return app.DETECTOR
+    detector = getattr(_local, "detector", None)
+    if detector is None:
+        detector = HaarFaceDetector(cv2.CascadeClassifier(app.HAAR_PATH))
+        _local.detector = detector
+    return detector
+
+
+def recognize_batch(crops):
+    """Embed all crops at once -> [(label, best_sim, second_sim)]."""
+    embs = app.get_embeddings(crops)
+    results = []
+    for best_name, best_sim, second_sim in app.get_face_db().match(embs):
+        label, _ = app.decide_label(best_name, best_sim, second_sim)
+        results.append((label, float(best_sim), float(second_sim)))
+    return results
+
+
+def find_faces(img, mode):
+    """[(box, crop)] for a decoded image: the whole image for mode=crop."""
+    if mode == "crop":
+        h, w = img.shape[:2]
+        return [((0, 0, w, h), img)]
+
+    faces = []
+    for (x, y, w, h) in _detector().detect(img, app.DETECTION_SCALE):
+        crop = img[y:y + h, x:x + w]
+        if crop.size:
+            faces.append(((int(x), int(y), int(x + w), int(y + h)), crop))
+    return faces
+
+
+def face_record(box, label, sim, second):
+    # second is -1 when the database holds a single person
+    return {
+        "box": list(box),
+        "label": label,
+        "sim": round(sim, 4),
+        "second": round(second, 4) if second >= 0 else None,
+        "margin": round(sim - second, 4) if second >= 0 else None,
+    }
+
+
+class RecognitionHandler(BaseHTTPRequestHandler):
+    server_version = "FaceRecognition/1.0"
+    protocol_version = "HTTP/1.1"     # keep-alive for the load generator
+
+    def address_string(self):
+        # Unix sockets have no client address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if urlparse(self.path).path != "/health":
+            self._send_json(404, {"error": "not found"})
+            return
+
+        batcher = self.server.batcher
+        error = app.warm_up_error()
+        self._send_json(200, {
+            "ready": app.is_ready(),
+            "error": str(error) if error else None,
+            "persons": len(app.get_face_db()) if app.is_ready() else None,
+            "batches": batcher.batches,
+            "items": batcher.items,
+            "batch_size": batcher.batch_sizes.summary(),
+            "batch_ms": batcher.batch_latency.summary(),
+        })
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/recognize":
+            self._send_json(404, {"error": "not found"})
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        if length <= 0 or length > MAX_BODY_BYTES:
+            self._send_json(400, {"error": "missing or oversized image body"})
+            return
+        data = self.rfile.read(length)
+
+        if not app.is_ready():
+            self._send_json(503, {"error": "warming up"})
+            return
+
+        mode = parse_qs(url.query).get("mode", ["crop"])[0]
+        if mode not in ("crop", "frame"):
+            self._send_json(400, {"error": "mode must be 'crop' or 'frame'"})
+            return
+
+        start = time.perf_counter()
+        img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            self._send_json(400, {"error": "could not decode image"})
+            return
+
+        faces = find_faces(img, mode)
+        try:
+            matches = self.server.batcher.submit([crop for _, crop in faces])
+        except Exception as exc:
+            self._send_json(500, {"error": str(exc)})
+            return
+
+        self._send_json(200, {
+            "faces": [face_record(box, *m) for (box, _), m in zip(faces, matches)],
+            "latency_ms": round((time.perf_counter() - start) * 1000.0, 2),
+        })
+
+
+class ThreadingUnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(batcher, port=PORT, host=HOST, unix_path=None, verbose=False):
+    if unix_path:
+        if os.path.exists(unix_path):
+            os.remove(unix_path)
+        server = ThreadingUnixHTTPServer(unix_path, RecognitionHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), RecognitionHandler)
+        server.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    server.batcher = batcher
+    server.verbose = verbose
+    return server
+
+
+def _report_warm_up():
+    """Print the startup report (or the startup error) once warm-up finished."""
+    state = {}
+    while not state.get("reported"):
+        app.check_warm_up(state)
+        time.sleep(0.2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local face recognition service with request batching.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--unix", default=None, help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH, help="max face crops per model call")
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS,
+                        help="how long to gather concurrent requests (0 = no batching delay)")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+
+    batcher = MicroBatcher(recognize_batch, args.max_batch, args.max_wait_ms)
+    server = make_server(batcher, args.port, args.host, args.unix, args.verbose)
+
+    app.start_warm_up()
+    threading.Thread(target=_report_warm_up, daemon=True).start()
+    batcher.start()
+    where = args.unix or f"http://{args.host}:{args.port}"
+    print(f"[INFO] Serving face recognition on {where} (max batch {args.max_batch}, "
+          f"wait {args.max_wait_ms} ms). Ctrl+C to stop.")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.stop()
+        if args.unix and os.path.exists(args.unix):
+            os.remove(args.unix)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+from collections import Counter, deque
+
+# -------------------------------------------------
+# TEMPORAL SMOOTHING OF IDENTITY DECISIONS PER TRACK
+# -------------------------------------------------
+# Every embedding of a track casts one vote: the best-matching name if it
+# passes the similarity / margin rules, otherwise "Unknown". The track's
+# label only changes when another label holds `min_votes` of the last
+# `window` votes, and the name a track already carries is judged against
+# thresholds lowered by `hysteresis`, so a face hovering around
+# SIM_THRESHOLD keeps its name instead of flickering to "Unknown".
+#
+# The smoother also tells the tracker how often a track needs the CNN:
+#   track.settled  : False until the track has `window` votes (embed often)
+#   track.confident: all recent votes agree (embed rarely)
+
+UNKNOWN = "Unknown"
+
+
+class TrackIdentity:
+    """Vote history and smoothed similarity of one track."""
+
+    def __init__(self, window):
+        self.votes = deque(maxlen=window)
+        self.label = None
+        self.sim = 0.0
+
+
+class IdentitySmoother:
+    def __init__(self, sim_threshold, margin_threshold, window=5, min_votes=3,
+                 hysteresis=0.05, ema_alpha=0.5):
+        """
+        window    : votes kept per track
+        min_votes : votes a new label needs (out of `window`) to take over
+        hysteresis: how much lower the thresholds are for the current label
+        ema_alpha : weight of the newest similarity in the displayed value
+        """
+        self.sim_threshold = sim_threshold
+        self.margin_threshold = margin_threshold
+        self.window = window
+        self.min_votes = min_votes
+        self.hysteresis = hysteresis
+        self.ema_alpha = ema_alpha
+
+    def vote(self, current, name, best_sim, second_sim):
+        """One frame's decision, with the lowered thresholds for the current name."""
+        keep = name is not None and name == current
+        sim_thr = self.sim_threshold - (self.hysteresis if keep else 0.0)
+        margin_thr = max(self.margin_threshold - (self.hysteresis if keep else 0.0), 0.0)
+
+        if best_sim < sim_thr:
+            return UNKNOWN
+        if second_sim > 0 and (best_sim - second_sim) < margin_thr:
+            return UNKNOWN
+        return name
+
+    def update(self, track, name, best_sim, second_sim):
+        """
+        Add the raw match of a fresh embedding to `track`.
+        Returns the smoothed (label, sim) and updates track.settled / track.confident.
+        """
+        ident = track.identity
+        if ident is None:
+            ident = track.identity = TrackIdentity(self.window)
+
+        vote = self.vote(ident.label, name, best_sim, second_sim)
+        ident.votes.append(vote)
+        counts = Counter(ident.votes)
+
+        if ident.label is None:
+            # first embedding: show it right away, votes take over from here
+            ident.label, ident.sim = vote, best_sim
+        else:
+            leader, n = counts.most_common(1)[0]
+            if leader != ident.label and n >= self.min_votes:
+                ident.label, ident.sim = leader, best_sim
+            elif vote == ident.label:
+                ident.sim = self.ema_alpha * best_sim + (1.0 - self.ema_alpha) * ident.sim
+
+        track.settled = len(ident.votes) >= self.window
+        track.confident = track.settled and counts[ident.label] == len(ident.votes)
+        return ident.label, ident.sim
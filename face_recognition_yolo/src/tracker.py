@@ -0,0 +1,133 @@
+import numpy as np
+
+# -------------------------------------------------
+# LIGHTWEIGHT IoU FACE TRACKER
+# -------------------------------------------------
+# Associates detection boxes across frames by IoU and caches each track's
+# label / similarity, so a face is re-embedded only every N frames or when
+# its box moved or resized a lot since the last embedding. With identity
+# smoothing (smoothing.py), new tracks are embedded every `settle_every`
+# frames until their label settles, and tracks whose recent votes all agree
+# only every `confident_every` frames.
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """Pairwise IoU of (A, 4) and (B, 4) boxes in (x1, y1, x2, y2) form."""
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+
+    ix1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    iy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    ix2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    iy2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return inter / np.maximum(union, 1e-6)
+
+
+class Track:
+    def __init__(self, track_id, box):
+        self.id = track_id
+        self.box = box
+        self.label = None
+        self.sim = 0.0
+        self.embed_box = None        # box at the time of the last embedding
+        self.frames_since_embed = 0
+        self.missed = 0              # consecutive frames without a detection
+        self.identity = None         # smoothing.TrackIdentity, if smoothing is on
+        self.settled = True          # set by the smoother
+        self.confident = False
+
+
+class FaceTracker:
+    def __init__(self, match_iou=0.3, reembed_every=15, reembed_iou=0.6, max_missed=5,
+                 settle_every=None, confident_every=None):
+        """
+        match_iou      : minimum IoU to continue a track with a new box
+        reembed_every  : re-run the CNN on a track every N frames
+        reembed_iou    : ... or sooner when IoU(box, box at last embedding) drops below this
+        max_missed     : frames a track survives without a matching detection
+        settle_every   : interval for tracks that are not settled yet (default reembed_every)
+        confident_every: interval for confident tracks (default reembed_every)
+        """
+        self.match_iou = match_iou
+        self.reembed_every = reembed_every
+        self.settle_every = settle_every or reembed_every
+        self.confident_every = confident_every or reembed_every
+        self.reembed_iou = reembed_iou
+        self.max_missed = max_missed
+        self.tracks = []
+        self._next_id = 1
+
+        # counters for "how many CNN calls did tracking save"
+        self.num_detections = 0
+        self.num_embeddings = 0
+
+    def update(self, boxes):
+        """
+        Feed this frame's (x1, y1, x2, y2) boxes.
+        Returns a list of (track, needs_embedding), one per box, in box order.
+        """
+        boxes = [tuple(int(v) for v in b) for b in boxes]
+        assigned = [None] * len(boxes)
+
+        if boxes and self.tracks:
+            ious = iou_matrix(boxes, [t.box for t in self.tracks])
+            # greedy assignment, highest IoU first
+            for flat in np.argsort(-ious, axis=None):
+                bi, ti = np.unravel_index(flat, ious.shape)
+                if ious[bi, ti] < self.match_iou:
+                    break
+                track = self.tracks[ti]
+                if assigned[bi] is not None or track.missed < 0:
+                    continue
+                assigned[bi] = track
+                track.missed = -1  # mark as taken for this frame
+
+        for track in self.tracks:
+            track.missed = 0 if track.missed < 0 else track.missed + 1
+        self.tracks = [t for t in self.tracks if t.missed <= self.max_missed]
+
+        out = []
+        for bi, box in enumerate(boxes):
+            track = assigned[bi]
+            if track is None:
+                track = Track(self._next_id, box)
+                self._next_id += 1
+                self.tracks.append(track)
+
+            track.box = box
+            track.frames_since_embed += 1
+            out.append((track, self._needs_embedding(track)))
+
+        self.num_detections += len(boxes)
+        return out
+
+    def _needs_embedding(self, track):
+        if track.label is None or track.embed_box is None:
+            return True
+        if track.frames_since_embed >= self._interval(track):
+            return True
+        return iou_matrix([track.box], [track.embed_box])[0, 0] < self.reembed_iou
+
+    def _interval(self, track):
+        if not track.settled:
+            return self.settle_every
+        if track.confident:
+            return self.confident_every
+        return self.reembed_every
+
+    def set_result(self, track, label, sim):
+        """Store a fresh recognition result for a track."""
+        track.label = label
+        track.sim = sim
+        track.embed_box = track.box
+        track.frames_since_embed = 0
+        self.num_embeddings += 1
+
+    def embed_ratio(self):
+        """Fraction of detections that went through the CNN."""
+        return self.num_embeddings / max(self.num_detections, 1)
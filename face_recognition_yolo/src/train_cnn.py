@@ -1,11 +1,21 @@
 import os
 import json
+import math
+import time
+import hashlib
+import argparse
+
+import numpy as np
 import tensorflow as tf
+from tensorflow.keras import mixed_precision
 from tensorflow.keras.preprocessing.image import ImageDataGenerator
 from tensorflow.keras.applications import MobileNetV2
-from tensorflow.keras.layers import GlobalAveragePooling2D, Dense, Dropout
+from tensorflow.keras.layers import BatchNormalization, GlobalAveragePooling2D, Dense, Dropout, Input
+from tensorflow.keras.layers import UnitNormalization
 from tensorflow.keras.models import Model
-from tensorflow.keras.callbacks import ModelCheckpoint, EarlyStopping
+from tensorflow.keras.callbacks import Callback, ModelCheckpoint, EarlyStopping
+
+from metric_learning import METRIC_LOSSES, CosineClassifier, additive_margin_loss, batch_hard_triplet_loss
 
 # ------------ PATHS (relative to project root) -------------
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))  # face_recognition_yolo/
@@ -19,42 +29,254 @@ os.makedirs(MODELS_DIR, exist_ok=True)
 MODEL_PATH = os.path.join(MODELS_DIR, "face_cnn_mobilenetv2.h5")
 CLASS_INDICES_PATH = os.path.join(MODELS_DIR, "class_indices.json")
 
+# best weights of each stage; stage 2 starts from STAGE1_WEIGHTS_PATH
+STAGE1_WEIGHTS_PATH = os.path.join(MODELS_DIR, "face_cnn_stage1.weights.h5")
+STAGE2_WEIGHTS_PATH = os.path.join(MODELS_DIR, "face_cnn_stage2.weights.h5")
+
+# precomputed backbone features (--features)
+FEATURES_DIR = os.path.join(MODELS_DIR, "features")
+HEAD_WEIGHTS_PATH = os.path.join(FEATURES_DIR, "head_best.weights.h5")
+
 # ------------ HYPERPARAMETERS ------------------------------
 IMG_SIZE = 160
 BATCH_SIZE = 16
-EPOCHS = 20
+EPOCHS = 25
 
-def build_model(num_classes: int) -> Model:
+# Input pipeline: "tfdata" (parallel decode + batched augmentation) or
+# "generator" (the old ImageDataGenerator.flow_from_directory, for comparison)
+DATA_PIPELINE = "tfdata"
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp")
+AUTOTUNE = tf.data.AUTOTUNE
+
+# Augmentation, same ranges as the ImageDataGenerator setup
+ROTATION_DEG = 20
+SHIFT_RANGE = 0.2
+ZOOM_RANGE = 0.2
+
+# Feature mode: the frozen backbone runs once over FEATURE_VIEWS views of every
+# training image (view 0 unaugmented, the rest augmented), the pooled
+# 1280-d features go to a memory-mapped .npy and only the head is trained.
+TRAIN_ON_FEATURES = False
+FEATURE_VIEWS = 10
+FEATURE_BATCH_SIZE = 64
+FEATURE_DIM = 1280
+
+# Second stage: unfreeze the top FINE_TUNE_BLOCKS of MobileNetV2's 16 inverted
+# residual blocks (plus the final 1x1 conv) and train with a much lower LR.
+# 0 = frozen backbone only (default; opt in with --fine-tune-blocks 3).
+# BatchNorm layers stay frozen.
+FINE_TUNE_BLOCKS = 0
+FINE_TUNE_EPOCHS = 10
+FINE_TUNE_LR = 1e-5
+# "auto": mixed_bfloat16 on CPUs with native bf16 (AVX512_BF16 / AMX),
+# mixed_float16 on GPU, float32 otherwise. The saved model is always float32.
+FINE_TUNE_PRECISION = "auto"
+MOBILENETV2_BLOCKS = 16
+
+# Training objective for the 128-d layer:
+#   "softmax"           : classifier, Dense(128, relu) is a by-product (default)
+#   "arcface"/"cosface" : additive-margin cosine softmax on L2-normalized Dense(128)
+#   "triplet"           : batch-hard triplet loss on L2-normalized Dense(128),
+#                         batches of TRIPLET_PEOPLE x TRIPLET_IMAGES images
+# Metric losses save only the embedding network (up to UnitNormalization).
+LOSS = "softmax"
+LOSSES = ("softmax",) + METRIC_LOSSES
+TRIPLET_PEOPLE = 8
+TRIPLET_IMAGES = 4
+
+
+def build_model(num_classes: int, backbone_weights="imagenet", loss=LOSS) -> Model:
     base_model = MobileNetV2(
         input_shape=(IMG_SIZE, IMG_SIZE, 3),
         include_top=False,
-        weights="imagenet"
+        weights=backbone_weights
     )
-    base_model.trainable = False  # freeze for now (transfer learning)
+
+    # First stage: keep base frozen
+    base_model.trainable = False
 
     x = base_model.output
     x = GlobalAveragePooling2D()(x)
     x = Dropout(0.3)(x)
-    x = Dense(128, activation="relu")(x)
-    x = Dropout(0.3)(x)
-    outputs = Dense(num_classes, activation="softmax")(x)
+    if loss == "softmax":
+        x = Dense(128, activation="relu")(x)
+        x = Dropout(0.3)(x)
+        # softmax in float32 even under a mixed-precision policy
+        outputs = Dense(num_classes, activation="softmax", dtype="float32")(x)
+    else:
+        # linear Dense(128) (app.py cuts here and L2-normalizes itself)
+        x = Dense(128)(x)
+        x = UnitNormalization(dtype="float32")(x)
+        outputs = x if loss == "triplet" else CosineClassifier(num_classes)(x)
 
     model = Model(inputs=base_model.input, outputs=outputs)
+    compile_model(model, loss)
+    return model
+
+
+def compile_model(model, loss=LOSS, lr=1e-3):
+    if loss == "softmax":
+        loss_fn, metrics = "categorical_crossentropy", ["accuracy"]
+    elif loss == "triplet":
+        loss_fn, metrics = batch_hard_triplet_loss(), []
+    else:
+        loss_fn = additive_margin_loss(loss)
+        # closed-set accuracy of the nearest class centre
+        metrics = [tf.keras.metrics.CategoricalAccuracy(name="accuracy")]
     model.compile(
-        optimizer=tf.keras.optimizers.Adam(1e-3),
-        loss="categorical_crossentropy",
-        metrics=["accuracy"]
+        optimizer=tf.keras.optimizers.Adam(lr),
+        loss=loss_fn,
+        metrics=metrics
     )
-    return model
 
-def main():
-    # --------- DATA GENERATORS ----------
+
+def monitor_for(loss):
+    """(metric, mode) used for checkpoints and early stopping."""
+    return ("val_loss", "min") if loss == "triplet" else ("val_accuracy", "max")
+
+
+def save_for_inference(model, loss):
+    """
+    Write MODEL_PATH in the form app.py loads: the whole classifier for
+    "softmax", the embedding network only (no custom layers) otherwise.
+    """
+    if loss != "softmax":
+        norm = next(l for l in model.layers if isinstance(l, UnitNormalization))
+        model = Model(inputs=model.input, outputs=norm.output)
+    model.save(MODEL_PATH, include_optimizer=False)
+    print(f"[INFO] Saved {'classifier' if loss == 'softmax' else 'embedding model'} to {MODEL_PATH}")
+
+
+# ------------ tf.data INPUT PIPELINE -----------------------
+def list_image_files(directory, class_names=None):
+    """
+    (paths, labels, class_names) for directory/<class>/<image>.
+    Classes are the sorted sub-folder names, like flow_from_directory,
+    so class_indices.json keeps the same meaning.
+    """
+    if class_names is None:
+        class_names = sorted(d for d in os.listdir(directory)
+                             if os.path.isdir(os.path.join(directory, d)))
+    paths = []
+    labels = []
+    for label, name in enumerate(class_names):
+        class_dir = os.path.join(directory, name)
+        if not os.path.isdir(class_dir):
+            continue
+        for fname in sorted(os.listdir(class_dir)):
+            if fname.lower().endswith(IMAGE_EXTS):
+                paths.append(os.path.join(class_dir, fname))
+                labels.append(label)
+    return paths, labels, class_names
+
+
+def decode_image(path, label, num_classes):
+    """JPEG/PNG file -> (IMG_SIZE, IMG_SIZE, 3) float32 RGB in [0, 1], one-hot label."""
+    img = tf.io.decode_image(tf.io.read_file(path), channels=3, expand_animations=False)
+    img = tf.image.resize(img, (IMG_SIZE, IMG_SIZE))
+    return img / 255.0, tf.one_hot(label, num_classes)
+
+
+def random_affine(images):
+    """
+    Rotation, shift, zoom and horizontal flip for a whole batch with ONE
+    projective-transform op (a different random transform per image).
+    """
+    b = tf.shape(images)[0]
+    size = float(IMG_SIZE)
+    centre = (size - 1.0) / 2.0
+
+    angle = tf.random.uniform([b], -ROTATION_DEG, ROTATION_DEG) * (math.pi / 180.0)
+    zoom = tf.random.uniform([b], 1.0 - ZOOM_RANGE, 1.0 + ZOOM_RANGE)
+    tx = tf.random.uniform([b], -SHIFT_RANGE, SHIFT_RANGE) * size
+    ty = tf.random.uniform([b], -SHIFT_RANGE, SHIFT_RANGE) * size
+    flip = tf.where(tf.random.uniform([b]) < 0.5, -1.0, 1.0)
+
+    # output pixel p -> input pixel M (p - c) + c - t, M = rotation @ flip / zoom
+    cos, sin = tf.cos(angle) / zoom, tf.sin(angle) / zoom
+    a0, a1 = flip * cos, -sin
+    b0, b1 = flip * sin, cos
+    a2 = centre - (a0 * centre + a1 * centre) - tx
+    b2 = centre - (b0 * centre + b1 * centre) - ty
+    zeros = tf.zeros([b])
+    transforms = tf.stack([a0, a1, a2, b0, b1, b2, zeros, zeros], axis=1)
+
+    return tf.raw_ops.ImageProjectiveTransformV3(
+        images=images,
+        transforms=transforms,
+        output_shape=tf.constant([IMG_SIZE, IMG_SIZE]),
+        fill_value=0.0,
+        interpolation="BILINEAR",
+        fill_mode="NEAREST",
+    )
+
+
+def make_dataset(directory, training, class_names=None, shuffle=None, augment=None, cache=None):
+    """
+    Batched (images, one-hot labels) dataset.
+    Files are decoded in parallel; training batches are shuffled and
+    augmented per batch, validation images are decoded once and cached.
+    shuffle / augment / cache default to training / training / not training.
+    Returns (dataset, class_names, num_images).
+    """
+    shuffle = training if shuffle is None else shuffle
+    augment = training if augment is None else augment
+    cache = (not training) if cache is None else cache
+
+    paths, labels, class_names = list_image_files(directory, class_names)
+    num_classes = len(class_names)
+
+    ds = tf.data.Dataset.from_tensor_slices((paths, labels))
+    if shuffle:
+        ds = ds.shuffle(len(paths), reshuffle_each_iteration=True)
+    ds = ds.map(lambda p, y: decode_image(p, y, num_classes), num_parallel_calls=AUTOTUNE)
+    if cache:
+        ds = ds.cache()
+    ds = ds.batch(BATCH_SIZE)
+    if augment:
+        ds = ds.map(lambda x, y: (random_affine(x), y), num_parallel_calls=AUTOTUNE)
+    return ds.prefetch(AUTOTUNE), class_names, len(paths)
+
+
+def make_pk_dataset(directory, class_names, people=TRIPLET_PEOPLE, images=TRIPLET_IMAGES):
+    """
+    Augmented training batches of `images` images for each of `people`
+    random people (what batch-hard triplet mining needs). Returns
+    (dataset, num_images); one epoch is about one pass over the images.
+    """
+    paths, labels, _ = list_image_files(directory, class_names)
+    num_classes = len(class_names)
+
+    per_class = []
+    for c in range(num_classes):
+        class_paths = [p for p, y in zip(paths, labels) if y == c]
+        if class_paths:
+            per_class.append(tf.data.Dataset.from_tensor_slices((class_paths, [c] * len(class_paths)))
+                             .shuffle(len(class_paths), reshuffle_each_iteration=True).repeat())
+    people = min(people, len(per_class))
+
+    # `people` distinct classes per batch, each picked `images` times in a row
+    choices = (tf.data.Dataset.from_tensors(0).repeat()
+               .map(lambda _: tf.random.shuffle(tf.range(len(per_class), dtype=tf.int64))[:people])
+               .unbatch()
+               .flat_map(lambda c: tf.data.Dataset.from_tensors(c).repeat(images)))
+    ds = tf.data.Dataset.choose_from_datasets(per_class, choices)
+
+    batch = people * images
+    ds = ds.map(lambda p, y: decode_image(p, y, num_classes), num_parallel_calls=AUTOTUNE)
+    ds = ds.batch(batch, drop_remainder=True).take(max(len(paths) // batch, 1))
+    ds = ds.map(lambda x, y: (random_affine(x), y), num_parallel_calls=AUTOTUNE)
+    return ds.prefetch(AUTOTUNE), len(paths)
+
+
+def make_generators():
+    """The old ImageDataGenerator pipeline, same return shape as the tf.data one."""
     train_datagen = ImageDataGenerator(
         rescale=1.0 / 255,
-        rotation_range=20,
-        width_shift_range=0.2,
-        height_shift_range=0.2,
-        zoom_range=0.2,
+        rotation_range=ROTATION_DEG,
+        width_shift_range=SHIFT_RANGE,
+        height_shift_range=SHIFT_RANGE,
+        zoom_range=ZOOM_RANGE,
         horizontal_flip=True
     )
 
@@ -73,153 +295,398 @@ def main():
         batch_size=BATCH_SIZE,
         class_mode="categorical"
     )
-
-    num_classes = len(train_gen.class_indices)
-    print("Classes:", train_gen.class_indices)
-
-    # save mapping for inference
-    with open(CLASS_INDICES_PATH, "w") as f:
-        json.dump(train_gen.class_indices, f)
-
-    model = build_model(num_classes)
-
+    return train_gen, val_gen, train_gen.class_indices, train_gen.samples
+
+
+def make_tf_datasets(loss=LOSS):
+    train_ds, class_names, num_train = make_dataset(TRAIN_DIR, training=True)
+    val_ds, _, _ = make_dataset(VAL_DIR, training=False, class_names=class_names,
+                                shuffle=loss == "triplet")  # triplet batches need several people
+    if loss == "triplet":
+        train_ds, num_train = make_pk_dataset(TRAIN_DIR, class_names)
+    class_indices = {name: i for i, name in enumerate(class_names)}
+    return train_ds, val_ds, class_indices, num_train
+
+
+# ------------ PRECOMPUTED FEATURES -----------------------
+def feature_extractor(model):
+    """Image -> pooled 1280-d backbone features (the GlobalAveragePooling2D output)."""
+    gap = next(l for l in model.layers if isinstance(l, GlobalAveragePooling2D))
+    return Model(inputs=model.input, outputs=gap.output)
+
+
+def head_model(model, loss=LOSS):
+    """Pooled features -> head output, SHARING the head layers (and weights) of `model`."""
+    layers = model.layers
+    start = next(i for i, l in enumerate(layers) if isinstance(l, GlobalAveragePooling2D)) + 1
+    inputs = Input(shape=(FEATURE_DIM,))
+    x = inputs
+    for layer in layers[start:]:
+        x = layer(x)
+    head = Model(inputs=inputs, outputs=x)
+    compile_model(head, loss)
+    return head
+
+
+def feature_signature(directory, class_names, views):
+    """Changes whenever an image, the class list or the view setup changes."""
+    paths, _, _ = list_image_files(directory, class_names)
+    h = hashlib.sha1()
+    h.update(json.dumps([class_names, views, IMG_SIZE, ROTATION_DEG, SHIFT_RANGE, ZOOM_RANGE]).encode())
+    for path in paths:
+        st = os.stat(path)
+        h.update(f"{path}|{st.st_size}|{st.st_mtime_ns}\n".encode())
+    return h.hexdigest()
+
+
+def extract_features(extractor, directory, class_names, views, name):
+    """
+    (features, one-hot labels) for `views` passes over `directory`; features
+    are a read-only memmap of shape (views * N, 1280). Cached in FEATURES_DIR
+    and only recomputed when the images or the view setup change.
+    """
+    os.makedirs(FEATURES_DIR, exist_ok=True)
+    feats_path = os.path.join(FEATURES_DIR, f"{name}_features.npy")
+    labels_path = os.path.join(FEATURES_DIR, f"{name}_labels.npy")
+    meta_path = os.path.join(FEATURES_DIR, f"{name}_meta.json")
+
+    signature = feature_signature(directory, class_names, views)
+    if os.path.exists(meta_path) and os.path.exists(feats_path) and os.path.exists(labels_path):
+        with open(meta_path) as f:
+            if json.load(f).get("signature") == signature:
+                print(f"[INFO] Using cached {name} features from {feats_path}")
+                return np.load(feats_path, mmap_mode="r"), np.load(labels_path)
+
+    _, labels, _ = list_image_files(directory, class_names)
+    n = len(labels)
+    start = time.perf_counter()
+    feats = np.lib.format.open_memmap(feats_path, mode="w+", dtype=np.float32,
+                                      shape=(views * n, FEATURE_DIM))
+    for view in range(views):
+        # view 0 is the plain image, every further view a fresh random augmentation
+        ds, _, _ = make_dataset(directory, training=False, class_names=class_names,
+                                augment=view > 0, cache=False)
+        row = view * n
+        for images, _ in ds:
+            out = extractor(images, training=False).numpy()
+            feats[row:row + len(out)] = out
+            row += len(out)
+    feats.flush()
+    del feats
+
+    onehot = np.eye(len(class_names), dtype=np.float32)[np.tile(labels, views)]
+    np.save(labels_path, onehot)
+    with open(meta_path, "w") as f:
+        json.dump({"signature": signature, "views": views, "images": n}, f)
+
+    elapsed = time.perf_counter() - start
+    print(f"[INFO] Extracted {views} x {n} {name} feature rows in {elapsed:.1f}s "
+          f"({views * n / elapsed:.1f} images/sec)")
+    return np.load(feats_path, mmap_mode="r"), onehot
+
+
+def train_on_features(model, class_names, views=FEATURE_VIEWS, loss=LOSS):
+    """
+    Train only the head of `model` on cached backbone features, then save the
+    FULL model (backbone + trained head) to MODEL_PATH, like the image mode.
+    """
+    extractor = feature_extractor(model)
+    x_train, y_train = extract_features(extractor, TRAIN_DIR, class_names, views, "train")
+    x_val, y_val = extract_features(extractor, VAL_DIR, class_names, 1, "val")
+
+    head = head_model(model, loss)
+    monitor, mode = monitor_for(loss)
     ckpt = ModelCheckpoint(
-        MODEL_PATH,
-        monitor="val_accuracy",
-        mode="max",
+        HEAD_WEIGHTS_PATH,
+        monitor=monitor,
+        mode=mode,
         save_best_only=True,
+        save_weights_only=True,
         verbose=1
     )
-
     early = EarlyStopping(
-        monitor="val_accuracy",
-        patience=5,
+        monitor=monitor,
+        mode=mode,
+        patience=7,
         restore_best_weights=True
     )
+    throughput = ThroughputLogger(len(x_train), "features")
 
-    history = model.fit(
-        train_gen,
+    head.fit(
+        x_train, y_train,
+        batch_size=FEATURE_BATCH_SIZE,
         epochs=EPOCHS,
-        validation_data=val_gen,
-        callbacks=[ckpt, early]
+        shuffle=True,
+        validation_data=(x_val, y_val),
+        callbacks=[ckpt, early, throughput]
     )
+    if os.path.exists(HEAD_WEIGHTS_PATH):
+        head.load_weights(HEAD_WEIGHTS_PATH)
+    model.save_weights(STAGE1_WEIGHTS_PATH)
 
-    val_loss, val_acc = model.evaluate(val_gen)
-    print(f"Final validation accuracy: {val_acc:.4f}")
+    # the head layers are shared, so `model` now carries the best head weights
+    save_for_inference(model, loss)
 
-if __name__ == "__main__":
-    main()
-import os
-import json
-import tensorflow as tf
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
-from tensorflow.keras.applications import MobileNetV2
-from tensorflow.keras.layers import GlobalAveragePooling2D, Dense, Dropout
-from tensorflow.keras.models import Model
-from tensorflow.keras.callbacks import ModelCheckpoint, EarlyStopping
+    results = head.evaluate(x_val, y_val, batch_size=FEATURE_BATCH_SIZE, return_dict=True)
+    print(f"Final validation {monitor[4:]}: {results[monitor[4:]]:.4f}")
 
-# ------------ PATHS (relative to project root) -------------
-BASE_DIR = os.path.dirname(os.path.dirname(__file__))  # face_recognition_yolo/
 
-TRAIN_DIR = os.path.join(BASE_DIR, "dataset_faces", "train")
-VAL_DIR   = os.path.join(BASE_DIR, "dataset_faces", "val")
+# ------------ STAGE 1: FROZEN BACKBONE ---------------------
+def train_stage_one(model, train_data, val_data, num_train, label, loss=LOSS):
+    """Train the head end-to-end on images; best model -> MODEL_PATH and STAGE1_WEIGHTS_PATH."""
+    monitor, mode = monitor_for(loss)
+    ckpt = ModelCheckpoint(
+        STAGE1_WEIGHTS_PATH,
+        monitor=monitor,
+        mode=mode,
+        save_best_only=True,
+        save_weights_only=True,
+        verbose=1
+    )
 
-MODELS_DIR = os.path.join(BASE_DIR, "models")
-os.makedirs(MODELS_DIR, exist_ok=True)
+    early = EarlyStopping(
+        monitor=monitor,
+        mode=mode,
+        patience=7,
+        restore_best_weights=True
+    )
 
-MODEL_PATH = os.path.join(MODELS_DIR, "face_cnn_mobilenetv2.h5")
-CLASS_INDICES_PATH = os.path.join(MODELS_DIR, "class_indices.json")
+    throughput = ThroughputLogger(num_train, label)
 
-# ------------ HYPERPARAMETERS ------------------------------
-IMG_SIZE = 160
-BATCH_SIZE = 16
-EPOCHS = 25
+    history = model.fit(
+        train_data,
+        epochs=EPOCHS,
+        validation_data=val_data,
+        callbacks=[ckpt, early, throughput]
+    )
 
-def build_model(num_classes: int) -> Model:
-    base_model = MobileNetV2(
-        input_shape=(IMG_SIZE, IMG_SIZE, 3),
-        include_top=False,
-        weights="imagenet"
+    if os.path.exists(STAGE1_WEIGHTS_PATH):
+        model.load_weights(STAGE1_WEIGHTS_PATH)
+    save_for_inference(model, loss)
+
+    results = model.evaluate(val_data, return_dict=True)
+    print(f"Final validation {monitor[4:]}: {results[monitor[4:]]:.4f}")
+    if throughput.rates:
+        print(f"[INFO] Mean training throughput ({label}): "
+              f"{sum(throughput.rates) / len(throughput.rates):.1f} images/sec")
+
+
+# ------------ STAGE 2: FINE-TUNE TOP BLOCKS ----------------
+def pick_precision(mode=FINE_TUNE_PRECISION):
+    """Keras mixed-precision policy name for `mode` ("auto" looks at the hardware)."""
+    if mode != "auto":
+        return mode
+    if tf.config.list_physical_devices("GPU"):
+        return "mixed_float16"
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = f.read()
+    except OSError:
+        return "float32"
+    # without native bf16 instructions, bfloat16 on CPU is emulated and slower
+    return "mixed_bfloat16" if ("avx512_bf16" in flags or "amx_bf16" in flags) else "float32"
+
+
+def unfreeze_top_blocks(model, blocks):
+    """
+    Make the top `blocks` MobileNetV2 blocks and the final 1x1 conv trainable
+    (BatchNorm excluded, its statistics stay ImageNet's). Returns their count.
+    """
+    first = MOBILENETV2_BLOCKS - blocks + 1
+    count = 0
+    for layer in model.layers:
+        name = layer.name
+        if name.startswith("block_"):
+            top = int(name.split("_")[1]) >= first
+        else:
+            top = name in ("Conv_1", "out_relu")
+        if top and blocks > 0 and not isinstance(layer, BatchNormalization):
+            layer.trainable = True
+            count += 1
+    return count
+
+
+def fine_tune(num_classes, train_data, val_data, num_train, blocks, precision, label, loss=LOSS):
+    """
+    Second stage from STAGE1_WEIGHTS_PATH, reusing the stage-1 input pipeline.
+    MODEL_PATH is only replaced when the validation metric beats stage 1.
+    """
+    mixed_precision.set_global_policy(precision)
+    model = build_model(num_classes, backbone_weights=None, loss=loss)
+    model.load_weights(STAGE1_WEIGHTS_PATH)
+    layers = unfreeze_top_blocks(model, blocks)
+    print(f"[INFO] Stage 2: top {blocks} blocks ({layers} layers) trainable, "
+          f"lr {FINE_TUNE_LR}, policy {precision}")
+
+    compile_model(model, loss, FINE_TUNE_LR)
+    monitor, mode = monitor_for(loss)
+    stage1_value = model.evaluate(val_data, return_dict=True)[monitor[4:]]
+    print(f"[INFO] Stage 1 validation {monitor[4:]}: {stage1_value:.4f}")
+
+    if os.path.exists(STAGE2_WEIGHTS_PATH):
+        os.remove(STAGE2_WEIGHTS_PATH)
+    ckpt = ModelCheckpoint(
+        STAGE2_WEIGHTS_PATH,
+        monitor=monitor,
+        mode=mode,
+        save_best_only=True,
+        save_weights_only=True,
+        initial_value_threshold=stage1_value,
+        verbose=1
+    )
+    early = EarlyStopping(
+        monitor=monitor,
+        mode=mode,
+        patience=4,
+        restore_best_weights=True
     )
+    throughput = ThroughputLogger(num_train, f"{label}, stage 2")
 
-    # First stage: keep base frozen
-    base_model.trainable = False
+    model.fit(
+        train_data,
+        epochs=FINE_TUNE_EPOCHS,
+        validation_data=val_data,
+        callbacks=[ckpt, early, throughput]
+    )
 
-    x = base_model.output
-    x = GlobalAveragePooling2D()(x)
-    x = Dropout(0.3)(x)
-    x = Dense(128, activation="relu")(x)
-    x = Dropout(0.3)(x)
-    outputs = Dense(num_classes, activation="softmax")(x)
+    if not os.path.exists(STAGE2_WEIGHTS_PATH):
+        print("[WARN] Stage 2 did not beat stage 1, keeping the stage-1 model.")
+        mixed_precision.set_global_policy("float32")
+        return
 
-    model = Model(inputs=base_model.input, outputs=outputs)
-    model.compile(
-        optimizer=tf.keras.optimizers.Adam(1e-3),
-        loss="categorical_crossentropy",
-        metrics=["accuracy"]
-    )
-    return model
+    # rebuild in float32 so app.py loads a plain float32 model
+    model.load_weights(STAGE2_WEIGHTS_PATH)
+    weights = model.get_weights()
+    mixed_precision.set_global_policy("float32")
+    final = build_model(num_classes, backbone_weights=None, loss=loss)
+    final.set_weights(weights)
+    save_for_inference(final, loss)
 
+    results = final.evaluate(val_data, return_dict=True)
+    print(f"Final validation {monitor[4:]} (stage 2): {results[monitor[4:]]:.4f}")
 
-def main():
-    # --------- DATA GENERATORS ----------
-    train_datagen = ImageDataGenerator(
-        rescale=1.0 / 255,
-        rotation_range=20,
-        width_shift_range=0.2,
-        height_shift_range=0.2,
-        zoom_range=0.2,
-        horizontal_flip=True
-    )
 
-    val_datagen = ImageDataGenerator(rescale=1.0 / 255)
+class ThroughputLogger(Callback):
+    """Logs training images/sec per epoch (validation time excluded)."""
 
-    train_gen = train_datagen.flow_from_directory(
-        TRAIN_DIR,
-        target_size=(IMG_SIZE, IMG_SIZE),
-        batch_size=BATCH_SIZE,
-        class_mode="categorical"
-    )
+    def __init__(self, num_images, label):
+        super().__init__()
+        self.num_images = num_images
+        self.label = label
+        self.rates = []
 
-    val_gen = val_datagen.flow_from_directory(
-        VAL_DIR,
-        target_size=(IMG_SIZE, IMG_SIZE),
-        batch_size=BATCH_SIZE,
-        class_mode="categorical"
-    )
+    def on_epoch_begin(self, epoch, logs=None):
+        self._start = time.perf_counter()
+        self._train_time = None
 
-    num_classes = len(train_gen.class_indices)
-    print("Classes:", train_gen.class_indices)
+    def on_test_begin(self, logs=None):
+        if self._train_time is None:
+            self._train_time = time.perf_counter() - self._start
 
-    # save mapping for inference
-    with open(CLASS_INDICES_PATH, "w") as f:
-        json.dump(train_gen.class_indices, f)
+    def on_epoch_end(self, epoch, logs=None):
+        train_time = self._train_time or (time.perf_counter() - self._start)
+        rate = self.num_images / train_time
+        self.rates.append(rate)
+        print(f"[INFO] Epoch {epoch + 1}: {rate:.1f} images/sec ({self.label}, {train_time:.1f}s)")
 
-    model = build_model(num_classes)
 
-    ckpt = ModelCheckpoint(
-        MODEL_PATH,
-        monitor="val_accuracy",
-        mode="max",
-        save_best_only=True,
-        verbose=1
-    )
+def time_input_pipeline(dataset, num_images, epochs=2):
+    """images/sec of the input pipeline alone (no model), per pass."""
+    steps = math.ceil(num_images / BATCH_SIZE)
+    for epoch in range(epochs):
+        start = time.perf_counter()
+        for step, _ in enumerate(dataset):
+            if step + 1 >= steps:  # generators loop forever
+                break
+        elapsed = time.perf_counter() - start
+        print(f"[INFO] Input pass {epoch + 1}: {num_images / elapsed:.1f} images/sec")
 
-    early = EarlyStopping(
-        monitor="val_accuracy",
-        patience=7,
-        restore_best_weights=True
-    )
 
-    history = model.fit(
-        train_gen,
-        epochs=EPOCHS,
-        validation_data=val_gen,
-        callbacks=[ckpt, early]
-    )
+def print_stage_times(stage_times):
+    print("[INFO] Wall-clock time per stage:")
+    for name, seconds in stage_times:
+        print(f"         {name:<40} {seconds / 60:6.1f} min")
+
 
-    val_loss, val_acc = model.evaluate(val_gen)
-    print(f"Final validation accuracy: {val_acc:.4f}")
+def main():
+    parser = argparse.ArgumentParser(description="Train the MobileNetV2 face classifier.")
+    parser.add_argument("--pipeline", choices=("tfdata", "generator"), default=DATA_PIPELINE,
+                        help="input pipeline (both log images/sec)")
+    parser.add_argument("--input-only", action="store_true",
+                        help="only time the input pipeline, do not train")
+    parser.add_argument("--features", action="store_true", default=TRAIN_ON_FEATURES,
+                        help="run the frozen backbone once and train the head on cached features")
+    parser.add_argument("--views", type=int, default=FEATURE_VIEWS,
+                        help="views per training image in --features mode (view 0 unaugmented)")
+    parser.add_argument("--fine-tune-blocks", type=int, default=FINE_TUNE_BLOCKS,
+                        help="MobileNetV2 blocks to unfreeze in stage 2, e.g. 3 (default 0 = no stage 2)")
+    parser.add_argument("--precision", default=FINE_TUNE_PRECISION,
+                        choices=("auto", "float32", "mixed_bfloat16", "mixed_float16"),
+                        help="mixed-precision policy for stage 2")
+    parser.add_argument("--resume", action="store_true",
+                        help="skip stage 1 and fine-tune from the stage-1 checkpoint")
+    parser.add_argument("--loss", choices=LOSSES, default=LOSS,
+                        help="softmax classifier, or a metric loss on the L2-normalized Dense(128)")
+    args = parser.parse_args()
+
+    stage_times = []
+    train_data = val_data = None
+
+    # --------- STAGE 1 (features) ----------
+    if args.features and not args.resume and not args.input_only:
+        class_names = list_image_files(TRAIN_DIR)[2]
+        class_indices = {name: i for i, name in enumerate(class_names)}
+        print("Classes:", class_indices)
+        with open(CLASS_INDICES_PATH, "w") as f:
+            json.dump(class_indices, f)
+
+        start = time.perf_counter()
+        train_on_features(build_model(len(class_names), loss=args.loss), class_names, args.views, args.loss)
+        stage_times.append(("stage 1 (frozen backbone, features)", time.perf_counter() - start))
+        if args.fine_tune_blocks <= 0:
+            print_stage_times(stage_times)
+            return
+
+    # --------- INPUT PIPELINE ----------
+    # built once and shared by both stages (the validation cache survives)
+    if args.pipeline == "tfdata" or args.features or args.loss == "triplet":
+        train_data, val_data, class_indices, num_train = make_tf_datasets(args.loss)
+        label = "tfdata"
+    else:
+        train_data, val_data, class_indices, num_train = make_generators()
+        label = args.pipeline
+
+    num_classes = len(class_indices)
+    print("Classes:", class_indices)
+
+    if args.input_only:
+        time_input_pipeline(train_data, num_train)
+        return
+
+    # --------- STAGE 1 (images) ----------
+    if not args.features and not args.resume:
+        # save mapping for inference
+        with open(CLASS_INDICES_PATH, "w") as f:
+            json.dump(class_indices, f)
+
+        start = time.perf_counter()
+        train_stage_one(build_model(num_classes, loss=args.loss), train_data, val_data, num_train, label,
+                        args.loss)
+        stage_times.append(("stage 1 (frozen backbone)", time.perf_counter() - start))
+
+    # --------- STAGE 2 ----------
+    if args.fine_tune_blocks > 0:
+        if not os.path.exists(STAGE1_WEIGHTS_PATH):
+            print(f"[ERROR] No stage-1 checkpoint at {STAGE1_WEIGHTS_PATH}, run stage 1 first.")
+            return
+        precision = pick_precision(args.precision)
+        start = time.perf_counter()
+        fine_tune(num_classes, train_data, val_data, num_train, args.fine_tune_blocks, precision, label,
+                  args.loss)
+        stage_times.append((f"stage 2 (top {args.fine_tune_blocks} blocks, {precision})",
+                            time.perf_counter() - start))
+
+    print_stage_times(stage_times)
 
 
 if __name__ == "__main__":
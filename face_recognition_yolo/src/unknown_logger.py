@@ -0,0 +1,175 @@
+import os
+import time
+import queue
+import threading
+from datetime import datetime
+
+import cv2
+
+# -------------------------------------------------
+# ASYNCHRONOUS, RATE-LIMITED UNKNOWN-FACE LOGGER
+# -------------------------------------------------
+# The frame loop only calls submit(), which never blocks: it drops the face
+# if the same track was logged less than `dedup_window` seconds ago or if
+# the queue is full. Faces without a track (--no-tracking, the Haar script)
+# are deduplicated by box overlap with recently logged faces and limited to
+# one per `untracked_interval` seconds. Everything is scoped by `source`
+# (e.g. the camera index), since every camera numbers its tracks from 1.
+# A background thread encodes the JPEGs and appends the log lines to
+# unknown_log.txt in batches.
+
+
+def box_iou(a, b):
+    """IoU of two (x1, y1, x2, y2) boxes."""
+    iw = min(a[2], b[2]) - max(a[0], b[0])
+    ih = min(a[3], b[3]) - max(a[1], b[1])
+    if iw <= 0 or ih <= 0:
+        return 0.0
+    inter = iw * ih
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+class UnknownFaceLogger:
+    def __init__(self, log_dir, dedup_window=10.0, queue_size=32, flush_every=2.0, max_batch=50,
+                 untracked_interval=1.0, untracked_iou=0.3):
+        """
+        log_dir      : folder for unknown_*.jpg and unknown_log.txt
+        dedup_window : seconds before the same track (or the same spot, for
+                       untracked faces) may be logged again
+        untracked_interval: minimum seconds between two untracked faces
+        untracked_iou: box overlap that counts as the same untracked face
+        queue_size   : faces waiting for the writer; extra faces are dropped
+        flush_every  : seconds between log-file appends
+        max_batch    : flush earlier once this many lines are pending
+        """
+        self.log_dir = log_dir
+        self.log_file = os.path.join(log_dir, "unknown_log.txt")
+        self.dedup_window = dedup_window
+        self.flush_every = flush_every
+        self.max_batch = max_batch
+        self.untracked_interval = untracked_interval
+        self.untracked_iou = untracked_iou
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._last_logged = {}  # (source, track_id) -> time of last accepted face
+        self._recent_boxes = []  # [(source, box, time)] of accepted untracked faces
+        self._last_untracked = {}  # source -> time of last accepted untracked face
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.submitted = 0
+        self.deduplicated = 0
+        self.dropped = 0
+        self.written = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="unknown-logger", daemon=True)
+                self._thread.start()
+
+    def submit(self, face_img, best_sim, track_id=None, box=None, source=None):
+        """
+        Queue an unknown face for logging. Returns True if it was accepted.
+        box   : (x1, y1, x2, y2) in the frame, used to deduplicate untracked faces.
+        source: camera / stream the face came from; track ids and boxes
+                are only compared within the same source.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if track_id is not None:
+                duplicate = self._seen_track((source, track_id), now)
+            else:
+                duplicate = self._seen_untracked(source, box, now)
+            if duplicate:
+                self.deduplicated += 1
+                return False
+
+            ts = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+            try:
+                # copy: the crop is a view into a frame the caller keeps drawing on
+                self._queue.put_nowait((ts, face_img.copy(), best_sim, track_id, source))
+            except queue.Full:
+                # not remembered, so the next frame of this face can still get in
+                self.dropped += 1
+                return False
+            self._remember(track_id, source, box, now)
+            self.submitted += 1
+
+        self.start()
+        return True
+
+    def _seen_track(self, key, now):
+        """True if `key` = (source, track_id) was logged within dedup_window."""
+        last = self._last_logged.get(key)
+        return last is not None and now - last < self.dedup_window
+
+    def _seen_untracked(self, source, box, now):
+        """Rate limit + box-overlap dedup for faces without a track id, per source."""
+        last = self._last_untracked.get(source)
+        if last is not None and now - last < self.untracked_interval:
+            return True
+        cutoff = now - self.dedup_window
+        self._recent_boxes = [r for r in self._recent_boxes if r[2] >= cutoff]
+        return box is not None and any(
+            src == source and box_iou(box, b) >= self.untracked_iou
+            for src, b, _ in self._recent_boxes
+        )
+
+    def _remember(self, track_id, source, box, now):
+        """Start the dedup window of a face that made it into the queue."""
+        if track_id is not None:
+            self._last_logged[(source, track_id)] = now
+            # forget tracks that have not been seen for a while
+            if len(self._last_logged) > 256:
+                cutoff = now - self.dedup_window
+                self._last_logged = {k: t for k, t in self._last_logged.items() if t >= cutoff}
+            return
+        if box is not None:
+            self._recent_boxes.append((source, tuple(box), now))
+        self._last_untracked[source] = now
+
+    def _run(self):
+        pending = []
+        last_flush = time.monotonic()
+
+        while True:
+            try:
+                item = self._queue.get(timeout=0.2)
+            except queue.Empty:
+                item = None
+
+            if item is not None:
+                ts, face_img, best_sim, track_id, source = item
+                img_path = os.path.join(self.log_dir, f"unknown_{ts}.jpg")
+                cv2.imwrite(img_path, face_img)
+                line = f"{ts}, best_sim={best_sim:.4f}, file={img_path}"
+                if source is not None:
+                    line += f", source={source}"
+                if track_id is not None:
+                    line += f", track={track_id}"
+                pending.append(line + "\n")
+
+            now = time.monotonic()
+            if pending and (len(pending) >= self.max_batch or now - last_flush >= self.flush_every):
+                self._flush(pending)
+                pending = []
+                last_flush = now
+
+            if self._stop.is_set() and item is None and self._queue.empty():
+                if pending:
+                    self._flush(pending)
+                break
+
+    def _flush(self, lines):
+        with open(self.log_file, "a") as f:
+            f.writelines(lines)
+        self.written += len(lines)
+
+    def close(self, timeout=5.0):
+        """Write everything still queued, then stop the writer thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
@@ -0,0 +1,119 @@
+import os
+import threading
+
+import cv2
+import numpy as np
+
+from detection import nms
+
+# -------------------------------------------------
+# YOLOv3 FACE DETECTOR (cv2.dnn, CPU)
+# -------------------------------------------------
+# Runs yolo/yolov3-face.cfg (one class: "face") through OpenCV's Darknet
+# importer. The weights are not part of the repository; put the Darknet
+# file trained with this cfg (e.g. yolov3-wider_16000.weights) in yolo/.
+#
+# Every image is letterbox-free resized to input_size x input_size
+# (a multiple of 32; 320 is faster, 608 finds smaller faces), a list of
+# images goes through the network as ONE blobFromImages batch, and the
+# boxes are filtered with vectorized NMS (detection.nms).
+
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))  # face_recognition_yolo/
+YOLO_DIR = os.path.join(BASE_DIR, "yolo")
+YOLO_CFG_PATH = os.path.join(YOLO_DIR, "yolov3-face.cfg")
+YOLO_WEIGHTS_PATH = os.path.join(YOLO_DIR, "yolov3-wider_16000.weights")
+
+
+class YoloFaceDetector:
+    """Detection backend for the Darknet YOLOv3 face model."""
+
+    name = "yolo"
+
+    def __init__(self, cfg_path=YOLO_CFG_PATH, weights_path=YOLO_WEIGHTS_PATH, input_size=416,
+                 conf_threshold=0.5, nms_threshold=0.4, min_size=20):
+        """
+        input_size    : network input (multiple of 32)
+        conf_threshold: minimum class score (OpenCV's region layer already
+                        multiplies the class probabilities by objectness)
+        nms_threshold : IoU above which the weaker of two boxes is dropped
+        min_size      : minimum face size in pixels of the input image
+        """
+        if input_size % 32 != 0:
+            raise ValueError(f"YOLO input size must be a multiple of 32, got {input_size}.")
+        self.cfg_path = cfg_path
+        self.weights_path = weights_path
+        self.input_size = input_size
+        self.conf_threshold = conf_threshold
+        self.nms_threshold = nms_threshold
+        self.min_size = min_size
+        self._net = None
+        self._output_names = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Read the network (once). Raises FileNotFoundError without the weights."""
+        with self._lock:
+            if self._net is None:
+                for path in (self.cfg_path, self.weights_path):
+                    if not os.path.exists(path):
+                        raise FileNotFoundError(f"YOLO face model file not found: {path}")
+                net = cv2.dnn.readNetFromDarknet(self.cfg_path, self.weights_path)
+                net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+                net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+                self._output_names = net.getUnconnectedOutLayersNames()
+                self._net = net
+        return self._net
+
+    def detect(self, image, scale=1.0):
+        """(N, 4) int (x, y, w, h) faces in one BGR image."""
+        return self.detect_batch([image], scale)[0]
+
+    def detect_batch(self, images, scale=1.0):
+        """
+        Faces in several BGR images with one forward pass.
+        `scale` is accepted for interface compatibility: every image is
+        resized to input_size anyway, so input_size is the speed knob.
+        """
+        if len(images) == 0:
+            return []
+        images = [cv2.cvtColor(im, cv2.COLOR_GRAY2BGR) if im.ndim == 2 else im for im in images]
+
+        net = self.load()
+        size = (self.input_size, self.input_size)
+        blob = cv2.dnn.blobFromImages(images, 1.0 / 255.0, size, swapRB=True, crop=False)
+        with self._lock:  # one forward at a time per network
+            net.setInput(blob)
+            outputs = net.forward(self._output_names)
+
+        # each output: (B, rows, 5 + classes) or (rows, 5 + classes) for B == 1
+        n = len(images)
+        dets = np.concatenate([out.reshape(n, -1, out.shape[-1]) for out in outputs], axis=1)
+        return [self._decode(dets[i], images[i].shape[:2]) for i in range(n)]
+
+    def _decode(self, det, image_shape):
+        """Rows of (cx, cy, w, h, objectness, class scores...) in [0, 1] -> pixel boxes after NMS."""
+        # columns 5+ are already objectness x class probability (as in OpenCV's YOLO sample)
+        scores = det[:, 5:].max(axis=1)
+        det = det[scores >= self.conf_threshold]
+        scores = scores[scores >= self.conf_threshold]
+        if len(det) == 0:
+            return np.zeros((0, 4), dtype=np.int32)
+
+        height, width = image_shape
+        w = det[:, 2] * width
+        h = det[:, 3] * height
+        x = det[:, 0] * width - w / 2
+        y = det[:, 1] * height - h / 2
+
+        # clip to the image
+        x1 = np.clip(x, 0, width - 1)
+        y1 = np.clip(y, 0, height - 1)
+        x2 = np.clip(x + w, 0, width)
+        y2 = np.clip(y + h, 0, height)
+        boxes = np.stack([x1, y1, x2 - x1, y2 - y1], axis=1)
+
+        big = (boxes[:, 2] >= self.min_size) & (boxes[:, 3] >= self.min_size)
+        boxes, scores = boxes[big], scores[big]
+
+        keep = nms(boxes, scores, self.nms_threshold)
+        return np.round(boxes[keep]).astype(np.int32)